@@ -1,3 +1,37 @@
 from django.contrib import admin
 
-# Register your models here.
+from . import answer_cache
+from .models import CachedAnswer, ChatSession, ViewCounter
+
+
+@admin.register(CachedAnswer)
+class CachedAnswerAdmin(admin.ModelAdmin):
+    list_display = ('question', 'provider', 'kb_version', 'pinned', 'created_at')
+    list_filter = ('pinned', 'provider', 'kb_version')
+    search_fields = ('question', 'reply')
+    actions = ['invalidate_all']
+
+    @admin.action(description="Invalidate the whole answer cache")
+    def invalidate_all(self, request, queryset):
+        deleted = answer_cache.invalidate()
+        self.message_user(request, f"Removed {deleted} cached answers.")
+
+    def delete_model(self, request, obj):
+        answer_cache.forget(obj.key)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for key in queryset.values_list('key', flat=True):
+            answer_cache.forget(key)
+        super().delete_queryset(request, queryset)
+
+
+@admin.register(ChatSession)
+class ChatSessionAdmin(admin.ModelAdmin):
+    list_display = ('session_id', 'updated_at')
+    search_fields = ('session_id',)
+
+
+@admin.register(ViewCounter)
+class ViewCounterAdmin(admin.ModelAdmin):
+    list_display = ('count', 'last_updated')
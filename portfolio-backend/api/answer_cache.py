@@ -0,0 +1,295 @@
+"""
+Two-tier exact-match answer cache.
+
+Answers are keyed on the normalized question, a digest of the conversation
+history and the knowledge-base/prompt version, so editing the knowledge base
+or the persona invalidates every entry at once. Lookups go to an in-process
+LRU first and then to the ``CachedAnswer`` table, which survives restarts and
+serverless cold starts. A hit skips the provider cascade entirely.
+
+Only conversations with at most ``ANSWER_CACHE_MAX_HISTORY`` earlier turns are
+cached; by default that's the opening question, which is where the repeats are.
+Opening questions that miss both exact tiers are also matched against
+paraphrases in ``api.semantic_cache``.
+
+Answers stored by ``manage.py warm_answers`` are pinned: they don't expire
+after ``ANSWER_CACHE_DB_TTL``, only when the knowledge-base version changes,
+and each process loads them into the semantic tier on its first lookup.
+
+Rows that can no longer be served (expired, or from another knowledge-base
+version) are deleted at most every ``ANSWER_CACHE_PURGE_SECONDS`` when an
+answer is stored, or by ``manage.py clear_answer_cache --expired``.
+"""
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.db.models import Q
+from django.utils import timezone
+
+from . import metrics, prompts, semantic_cache
+from .knowledge_base import KNOWLEDGE_BASE
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+KB_VERSION = hashlib.sha256(f"{prompts.PROMPTS_CONFIG}\n{KNOWLEDGE_BASE}".encode()).hexdigest()[:12]
+
+_memory = LRUCache(
+    maxsize=getattr(settings, 'ANSWER_CACHE_SIZE', 512),
+    ttl=getattr(settings, 'ANSWER_CACHE_MEMORY_TTL', 300),
+)
+_stats = {'memory_hits': 0, 'db_hits': 0, 'semantic_hits': 0, 'misses': 0, 'stores': 0}
+_stats_lock = threading.Lock()
+_last_purge = time.monotonic()
+_purge_lock = threading.Lock()
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_question(text):
+    """Case-, punctuation- and whitespace-insensitive form of a question."""
+    return _SPACES.sub(" ", _PUNCTUATION.sub(" ", text.lower())).strip()
+
+
+def cache_key(messages):
+    """Key for the assembled provider messages, or None when they shouldn't be cached."""
+    if not getattr(settings, 'ANSWER_CACHE_ENABLED', True):
+        return None
+    history = [(m['role'], m['content']) for m in messages[1:-1]]
+    if len(history) > getattr(settings, 'ANSWER_CACHE_MAX_HISTORY', 0):
+        return None
+    history_digest = hashlib.sha256(json.dumps(history).encode()).hexdigest()
+    question = normalize_question(messages[-1]['content'])
+    return hashlib.sha256(f"{KB_VERSION}\0{history_digest}\0{question}".encode()).hexdigest()
+
+
+_LOOKUP_RESULTS = {'memory_hits': 'memory_hit', 'db_hits': 'db_hit', 'semantic_hits': 'semantic_hit', 'misses': 'miss'}
+
+
+def _count(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+    if stat in _LOOKUP_RESULTS:
+        metrics.CACHE_LOOKUPS.inc(_LOOKUP_RESULTS[stat])
+
+
+def _fresh_since():
+    return timezone.now() - timedelta(seconds=getattr(settings, 'ANSWER_CACHE_DB_TTL', 7 * 24 * 3600))
+
+
+def _queryset(key):
+    from .models import CachedAnswer
+    return CachedAnswer.objects.filter(Q(created_at__gte=_fresh_since()) | Q(pinned=True),
+                                       key=key, kb_version=KB_VERSION)
+
+
+_pinned_loaded = False
+_pinned_lock = threading.Lock()
+
+
+def _load_pinned():
+    """Add this KB version's pre-warmed answers to the semantic tier, once per process."""
+    global _pinned_loaded
+    if _pinned_loaded:
+        return
+    with _pinned_lock:
+        if _pinned_loaded:
+            return
+        cache = semantic_cache.get_cache()
+        if cache is not None:
+            from .models import CachedAnswer
+            try:
+                rows = list(CachedAnswer.objects.filter(kb_version=KB_VERSION, pinned=True)
+                            .values_list('question', 'reply', 'provider'))
+            except DatabaseError as e:
+                logger.warning(f"Could not load pre-warmed answers: {e}")
+                return  # try again on the next lookup
+            for question, reply, provider in rows:
+                cache.add(question, {'reply': reply, 'provider': provider}, pinned=True)
+        _pinned_loaded = True
+
+
+def _remember(key, row):
+    answer = {'reply': row.reply, 'provider': row.provider}
+    _memory.set(key, answer)
+    _count('db_hits')
+    return answer
+
+
+def _is_opening_question(messages):
+    return len(messages) == 2
+
+
+def _semantic_lookup(key, messages):
+    cache = semantic_cache.get_cache()
+    if cache is not None and _is_opening_question(messages):
+        answer, similarity = cache.lookup(messages[-1]['content'])
+        if answer is not None:
+            logger.info(f"Semantic cache hit (similarity {similarity:.2f})")
+            _memory.set(key, answer)
+            _count('semantic_hits')
+            return answer
+    _count('misses')
+    return None
+
+
+def lookup(key, messages):
+    """Cached ``{'reply', 'provider'}`` for ``key`` (built from ``messages``), or None."""
+    if key is None:
+        return None
+    answer = _memory.get(key)
+    if answer is not None:
+        _count('memory_hits')
+        return answer
+    try:
+        row = _queryset(key).first()
+    except DatabaseError as e:
+        logger.warning(f"Answer cache lookup failed: {e}")
+        row = None
+    if row is not None:
+        return _remember(key, row)
+    _load_pinned()
+    return _semantic_lookup(key, messages)
+
+
+async def alookup(key, messages):
+    if key is None:
+        return None
+    answer = _memory.get(key)
+    if answer is not None:
+        _count('memory_hits')
+        return answer
+    try:
+        row = await _queryset(key).afirst()
+    except DatabaseError as e:
+        logger.warning(f"Answer cache lookup failed: {e}")
+        row = None
+    if row is not None:
+        return _remember(key, row)
+    if not _pinned_loaded:
+        await sync_to_async(_load_pinned)()
+    return _semantic_lookup(key, messages)
+
+
+def _row_defaults(messages, reply, provider, pinned=False):
+    return {
+        'kb_version': KB_VERSION,
+        'question': messages[-1]['content'],
+        'reply': reply,
+        'provider': provider,
+        'created_at': timezone.now(),
+        'pinned': pinned,
+    }
+
+
+def _remember_answer(key, messages, reply, provider, pinned=False):
+    answer = {'reply': reply, 'provider': provider}
+    _memory.set(key, answer)
+    cache = semantic_cache.get_cache()
+    if cache is not None and _is_opening_question(messages):
+        cache.add(messages[-1]['content'], answer, pinned=pinned)
+    _count('stores')
+
+
+def store(key, messages, reply, provider, pinned=False):
+    if key is None or not reply:
+        return
+    from .models import CachedAnswer
+    _remember_answer(key, messages, reply, provider, pinned)
+    try:
+        CachedAnswer.objects.update_or_create(key=key, defaults=_row_defaults(messages, reply, provider, pinned))
+    except DatabaseError as e:
+        logger.warning(f"Answer cache store failed: {e}")
+        return
+    _maybe_purge()
+
+
+async def astore(key, messages, reply, provider):
+    if key is None or not reply:
+        return
+    from .models import CachedAnswer
+    _remember_answer(key, messages, reply, provider)
+    try:
+        await CachedAnswer.objects.aupdate_or_create(key=key, defaults=_row_defaults(messages, reply, provider))
+    except DatabaseError as e:
+        logger.warning(f"Answer cache store failed: {e}")
+        return
+    await sync_to_async(_maybe_purge)()
+
+
+def _maybe_purge():
+    global _last_purge
+    with _purge_lock:
+        if time.monotonic() - _last_purge < getattr(settings, 'ANSWER_CACHE_PURGE_SECONDS', 3600):
+            return
+        _last_purge = time.monotonic()
+    purge()
+
+
+def purge():
+    """Delete the rows no lookup can return any more; returns how many."""
+    from .models import CachedAnswer
+    try:
+        deleted, _ = CachedAnswer.objects.exclude(
+            Q(created_at__gte=_fresh_since()) | Q(pinned=True), kb_version=KB_VERSION,
+        ).delete()
+    except DatabaseError as e:
+        logger.warning(f"Answer cache purge failed: {e}")
+        return 0
+    return deleted
+
+
+def forget(key):
+    """Drop one entry from this process's memory tier (used when a row is deleted)."""
+    _memory.pop(key)
+
+
+def invalidate():
+    """Delete every persisted answer and clear this process's memory tier.
+
+    Other workers drop their memory copies within ``ANSWER_CACHE_MEMORY_TTL``.
+    """
+    global _pinned_loaded
+    from .models import CachedAnswer
+    deleted, _ = CachedAnswer.objects.all().delete()
+    _memory.clear()
+    semantic_cache.reset()
+    _pinned_loaded = False
+    return deleted
+
+
+def stats():
+    with _stats_lock:
+        data = dict(_stats)
+    lookups = data['memory_hits'] + data['db_hits'] + data['semantic_hits'] + data['misses']
+    data['hit_ratio'] = round((data['memory_hits'] + data['db_hits'] + data['semantic_hits']) / lookups, 3) if lookups else 0.0
+    data['memory_entries'] = len(_memory)
+    data['semantic_entries'] = semantic_cache.entries()
+    data['kb_version'] = KB_VERSION
+    return data
+
+
+def is_pinned(key):
+    """True if ``key`` has a pre-warmed answer for the current knowledge base."""
+    from .models import CachedAnswer
+    return CachedAnswer.objects.filter(key=key, kb_version=KB_VERSION, pinned=True).exists()
+
+
+def reset():
+    """Clear the memory tiers and counters (tests)."""
+    global _pinned_loaded
+    _memory.clear()
+    semantic_cache.reset()
+    _pinned_loaded = False
+    with _stats_lock:
+        for stat in _stats:
+            _stats[stat] = 0
@@ -1,6 +1,16 @@
+import threading
+
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        if getattr(settings, 'LLM_HTTP_WARMUP', False):
+            from . import clients, providers
+            # Don't hold up worker boot on slow handshakes.
+            threading.Thread(target=clients.warm_up, args=(providers.PROVIDER_ORIGINS,),
+                             name='llm-warmup', daemon=True).start()
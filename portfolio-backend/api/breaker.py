@@ -0,0 +1,139 @@
+"""
+Per-provider circuit breakers for the fallback cascade.
+
+A breaker watches the outcome of the last ``BREAKER_WINDOW`` calls. Once at
+least ``BREAKER_MIN_CALLS`` have been seen and the failure rate reaches
+``BREAKER_FAILURE_RATE`` it opens, and the cascade skips that provider for
+``BREAKER_OPEN_SECONDS``. After that it lets ``BREAKER_HALF_OPEN_PROBES``
+requests through: one success closes it again, a failure re-opens it.
+
+State lives in the process, shared by every request and both the sync and
+async views.
+"""
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+from .deadline import DeadlineExceeded
+from .hedging import LostRace
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpen(Exception):
+    """Raised when every option behind a breaker is currently open."""
+
+
+def counts_as_failure(error):
+    """Only errors that say something about provider health trip the breaker.
+
+    Missing API keys (ValueError), a spent request budget, a hedged call
+    cancelled because the other one answered, and ordinary 4xx client errors
+    don't; 5xx, 408/429, timeouts and connection errors do.
+    """
+    if isinstance(error, (ValueError, CircuitOpen, DeadlineExceeded, LostRace)):
+        return False
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is not None and status < 500 and status not in (408, 429):
+        return False
+    return True
+
+
+class CircuitBreaker:
+    def __init__(self, name):
+        self.name = name
+        self.failure_rate = getattr(settings, 'BREAKER_FAILURE_RATE', 0.5)
+        self.min_calls = getattr(settings, 'BREAKER_MIN_CALLS', 5)
+        self.open_seconds = getattr(settings, 'BREAKER_OPEN_SECONDS', 30)
+        self.half_open_probes = getattr(settings, 'BREAKER_HALF_OPEN_PROBES', 1)
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self._outcomes = deque(maxlen=getattr(settings, 'BREAKER_WINDOW', 20))
+        self._failures = 0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Whether a call may go out now. Every allowed call must be followed by :meth:`record`."""
+        with self._lock:
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    return False
+                self.state = HALF_OPEN
+                self._probes = 0
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    return False
+                self._probes += 1
+            return True
+
+    def record(self, error=None):
+        """Record the outcome of an allowed call (``error=None`` means success)."""
+        failed = error is not None and counts_as_failure(error)
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._probes = max(0, self._probes - 1)
+                if error is None:
+                    self._close()
+                elif failed:
+                    self._open()
+                return
+            if error is not None and not failed:
+                return
+            if len(self._outcomes) == self._outcomes.maxlen and self._outcomes[0]:
+                self._failures -= 1
+            self._outcomes.append(failed)
+            self._failures += failed
+            if (self.state == CLOSED and len(self._outcomes) >= self.min_calls
+                    and self._failures / len(self._outcomes) >= self.failure_rate):
+                self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+
+    def _close(self):
+        self.state = CLOSED
+        self._outcomes.clear()
+        self._failures = 0
+
+    def snapshot(self):
+        with self._lock:
+            calls = len(self._outcomes)
+            data = {
+                'state': self.state,
+                'calls': calls,
+                'failure_rate': round(self._failures / calls, 3) if calls else 0.0,
+            }
+            if self.state == OPEN:
+                data['retry_in'] = round(max(0.0, self.open_seconds - (time.monotonic() - self.opened_at)), 1)
+            return data
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get(name):
+    """The shared breaker for a provider (``"Groq"``) or OpenRouter model (``"OpenRouter/<model>"``)."""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def snapshot_all():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+def reset_all():
+    with _breakers_lock:
+        _breakers.clear()
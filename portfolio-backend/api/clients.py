@@ -0,0 +1,148 @@
+"""
+Pooled HTTP sessions for the upstream LLM providers.
+
+Each provider host gets one long-lived ``requests.Session`` so chat turns reuse
+keep-alive connections instead of paying DNS + TCP + TLS on every call. The
+async path (ASGI) gets the same treatment with one ``httpx.AsyncClient`` per
+host and event loop.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# event loop -> {origin: httpx.AsyncClient}; httpx pools can't be shared across loops.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _new_session():
+    import requests  # on the first provider call, not at cold start
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=getattr(settings, 'LLM_HTTP_POOL_CONNECTIONS', 1),
+        pool_maxsize=getattr(settings, 'LLM_HTTP_POOL_MAXSIZE', 10),
+        max_retries=0,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session(url):
+    """Return the shared session for the host serving ``url``."""
+    origin = _origin(url)
+    session = _sessions.get(origin)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(origin)
+            if session is None:
+                session = _new_session()
+                _sessions[origin] = session
+    return session
+
+
+def get_timeout(read=None):
+    """(connect, read) timeout tuple; ``read`` (e.g. a remaining budget) can only shorten the configured one."""
+    connect = getattr(settings, 'LLM_HTTP_CONNECT_TIMEOUT', 5)
+    configured = getattr(settings, 'LLM_HTTP_READ_TIMEOUT', 30)
+    read = configured if read is None else min(read, configured)
+    return (min(connect, read), read)
+
+
+def _is_serialized(payload):
+    return isinstance(payload, (bytes, str))
+
+
+def post(url, headers, payload, timeout=None, stream=False):
+    """POST a JSON payload through the pooled session for ``url``'s host.
+
+    ``payload`` is a dict or an already-serialized body (see ``api.payloads``).
+    """
+    body = {'data': payload} if _is_serialized(payload) else {'json': payload}
+    return get_session(url).post(
+        url,
+        headers=headers,
+        timeout=get_timeout(timeout),
+        stream=stream,
+        **body,
+    )
+
+
+def get_async_client(url):
+    """Return the shared ``httpx.AsyncClient`` for ``url``'s host on the running loop."""
+    import httpx  # only the ASGI path needs it
+
+    per_loop = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    origin = _origin(url)
+    client = per_loop.get(origin)
+    if client is None:
+        client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=getattr(settings, 'LLM_HTTP_ASYNC_MAX_CONNECTIONS', 500),
+            max_keepalive_connections=getattr(settings, 'LLM_HTTP_POOL_MAXSIZE', 10),
+        ))
+        per_loop[origin] = client
+    return client
+
+
+async def apost(url, headers, payload, timeout=None):
+    """Async twin of :func:`post`; returns an ``httpx.Response``."""
+    import httpx
+
+    connect, read = get_timeout(timeout)
+    body = {'content': payload} if _is_serialized(payload) else {'json': payload}
+    return await get_async_client(url).post(
+        url,
+        headers=headers,
+        timeout=httpx.Timeout(read, connect=connect),
+        **body,
+    )
+
+
+def astream(url, headers, payload, timeout=None):
+    """Async context manager POSTing ``payload`` and yielding the streamed ``httpx.Response``."""
+    import httpx
+
+    connect, read = get_timeout(timeout)
+    body = {'content': payload} if _is_serialized(payload) else {'json': payload}
+    return get_async_client(url).stream(
+        "POST",
+        url,
+        headers=headers,
+        timeout=httpx.Timeout(read, connect=connect),
+        **body,
+    )
+
+
+def warm_up(origins):
+    """Open one connection per provider host so the first chat turn skips the handshake."""
+    import requests
+
+    for origin in origins:
+        try:
+            # Not streamed, so the body is consumed and the socket goes back to the pool.
+            get_session(origin).head(origin, timeout=get_timeout(), allow_redirects=False)
+        except requests.RequestException as e:
+            logger.debug(f"Warm-up of {origin} failed: {e}")
+
+
+def close_all():
+    """Close every pooled session (tests, worker shutdown)."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
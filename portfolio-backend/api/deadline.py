@@ -0,0 +1,50 @@
+"""
+End-to-end time budget for one chat request.
+
+The cascade hands each provider attempt only what is left of the budget, and
+stops trying once less than ``CHAT_MIN_ATTEMPT_SECONDS`` remain, so a request
+never takes much longer than ``CHAT_DEADLINE_SECONDS`` however many providers
+fail.
+"""
+import time
+
+from django.conf import settings
+
+
+class DeadlineExceeded(Exception):
+    """Not enough budget left for another provider attempt."""
+
+
+class Deadline:
+    def __init__(self, seconds=None):
+        if seconds is None:
+            seconds = getattr(settings, 'CHAT_DEADLINE_SECONDS', 25)
+        self.seconds = seconds
+        self.min_attempt = getattr(settings, 'CHAT_MIN_ATTEMPT_SECONDS', 2)
+        self.started = time.monotonic()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        return max(0.0, self.seconds - self.elapsed())
+
+    def can_attempt(self):
+        return self.remaining() >= self.min_attempt
+
+    def attempt_timeout(self):
+        """Timeout for the next upstream call; raises if it couldn't finish in time."""
+        if not self.can_attempt():
+            raise DeadlineExceeded(f"{self.remaining():.1f}s left of the {self.seconds}s budget")
+        return self.remaining()
+
+    def as_dict(self):
+        return {
+            'deadline_ms': round(self.seconds * 1000),
+            'used_ms': round(self.elapsed() * 1000),
+        }
+
+
+def attempt_timeout(deadline):
+    """Read timeout for one upstream call: the configured default without a deadline."""
+    return deadline.attempt_timeout() if deadline is not None else None
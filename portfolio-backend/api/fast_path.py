@@ -0,0 +1,110 @@
+"""
+Answers to "what are your skills?" and "what projects have you built?" without
+a provider call.
+
+Both replies use the ``intro::data`` formats that ``PROMPTS_CONFIG`` asks the
+model for and the frontend renders as cards: ``Category:a,b|Category2:c`` for
+skills and ``Name;description;URL|...`` for projects. The data is parsed once
+from the *Technical Skills* and *Projects* sections of the knowledge base, so
+the reply always matches it and always parses.
+
+Only questions that are plainly asking for the whole list take this path:
+after dropping filler words ("what", "are", "your", ...) nothing but the topic
+words may remain. "What skills did you use in Smart Nutri?" still goes to the
+providers.
+"""
+import re
+
+from django.conf import settings
+
+from .answer_cache import normalize_question
+from .knowledge_base import KNOWLEDGE_BASE
+from .retrieval import split_sections
+
+PROVIDER = 'Knowledge base'
+MAX_WORDS = 12
+
+SKILLS_INTRO = "Here's my toolkit, from the languages I write every day to the tools I ship with"
+PROJECTS_INTRO = "Here are a few projects I'm proud of! Tap any card to see the details"
+
+_FILLER = {
+    'a', 'about', 'all', 'any', 'are', 'can', 'could', 'core', 'developed', 'do', 'done', 'few', 'give',
+    'have', 'i', 'is', 'key', 'know', 'list', 'main', 'made', 'me', 'my', 'of', 'on', 'please', 's',
+    'see', 'share', 'show', 'some', 'technical', 'tell', 'the', 'top', 'what', 'whats', 'which',
+    'worked', 'built', 'you', 'your', 'yours',
+}
+# intent -> (words that may remain besides filler, substring one of them must contain)
+# The substrings are the ones script.js looks for before rendering the cards.
+_INTENTS = {
+    'skills': ({'skill', 'skills', 'skillset', 'tech', 'technology', 'technologies', 'stack', 'techstack'},
+               ('skill', 'tech')),
+    'projects': ({'project', 'projects'}, ('project',)),
+}
+
+
+def _field(text, reserved):
+    """``text`` with the format's separator characters replaced, so it can't break the payload."""
+    return re.sub(f"[{re.escape(reserved)}]", " ", text).strip()
+
+
+def _parse(kb):
+    skills, projects = [], []
+    _, chunks = split_sections(kb)
+    for chunk in chunks:
+        if chunk.section == 'Technical Skills':
+            for line in chunk.text.splitlines():
+                category, _, items = line.strip().lstrip('- ').partition(':')
+                if items:
+                    skills.append((category.strip(), [item.strip() for item in items.split(',') if item.strip()]))
+        elif chunk.section == 'Projects':
+            lines = [line.strip().lstrip('- ') for line in chunk.text.splitlines() if line.strip()]
+            name = re.sub(r"^\d+\.\s*", "", lines[0]).rstrip(':')
+            url = next((re.search(r"https?://\S+", line).group() for line in lines if "http" in line), "")
+            description = next((line for line in lines[1:] if "http" not in line), "")
+            projects.append((name, description, url))
+    return skills, projects
+
+
+SKILLS, PROJECTS = _parse(KNOWLEDGE_BASE)
+
+
+def render_skills(skills=SKILLS):
+    return "|".join(
+        f"{_field(category, ':|')}:{','.join(_field(item, ',|') for item in items)}"
+        for category, items in skills
+    )
+
+
+def render_projects(projects=PROJECTS):
+    return "|".join(
+        ";".join(_field(part, ';|') for part in project)
+        for project in projects
+    )
+
+
+_REPLIES = {
+    'skills': f"{SKILLS_INTRO}::{render_skills()}" if SKILLS else None,
+    'projects': f"{PROJECTS_INTRO}::{render_projects()}" if PROJECTS else None,
+}
+
+
+def intent(question):
+    """``'skills'``, ``'projects'`` or None for a question asking for the whole list."""
+    words = normalize_question(question).split()
+    if not words or len(words) > MAX_WORDS:
+        return None
+    topic = {word for word in words if word not in _FILLER}
+    for name, (vocabulary, required) in _INTENTS.items():
+        if topic and topic <= vocabulary and any(part in word for word in topic for part in required):
+            return name
+    return None
+
+
+def answer(question):
+    """``{'reply', 'provider'}`` rendered from the knowledge base, or None."""
+    if not getattr(settings, 'FAST_PATH_ENABLED', True):
+        return None
+    reply = _REPLIES.get(intent(question))
+    if reply is None:
+        return None
+    return {'reply': reply, 'provider': PROVIDER}
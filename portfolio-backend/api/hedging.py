@@ -0,0 +1,250 @@
+"""
+Hedged provider calls.
+
+Most Groq answers take a second or two, but the odd one takes 20 s while the
+next provider would have answered in two, and those set the p99. With
+``HEDGING_ENABLED`` on, a provider call that hasn't returned after its hedge
+delay gets a second call to the next healthy provider in the cascade, with
+the same messages. The first successful reply wins. The async views cancel
+the other call; a sync call can't be interrupted, so it runs to its own
+attempt timeout in its thread and its reply is dropped.
+
+The hedge delay is the ``HEDGE_PERCENTILE`` of the provider's last
+``HEDGE_WINDOW`` successful call times, or ``HEDGE_DELAY_SECONDS`` until
+``HEDGE_MIN_SAMPLES`` have been seen. So only the slowest few percent of calls
+get hedged.
+
+Hedges spend provider quota, so they are rationed by a budget: every hedged
+cascade call adds ``HEDGE_BUDGET_RATIO`` of a hedge, up to
+``HEDGE_BUDGET_BURST``, and each hedge spends one. At most about
+``HEDGE_BUDGET_RATIO`` extra upstream calls per call are made however slow
+the providers get. ``chat_hedges_total`` counts the outcomes.
+
+Sync calls run on a pool of ``HEDGE_MAX_THREADS`` threads, and a losing call
+holds its thread until its own timeout. So the hedge delay is counted from
+when the primary call starts running, not from when it was queued, and while
+every pool thread is taken calls run in the request thread without a hedge
+(``pool_full``). Size the pool to a bit over twice the server's request
+threads for every slow call to get a hedge.
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+from collections import deque
+from concurrent import futures
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'primary'
+HEDGE = 'hedge'
+
+_lock = threading.Lock()
+_latencies = {}  # provider -> deque of successful call seconds
+_executor = None
+_busy = 0  # sync calls submitted to the pool and not yet finished
+
+
+class LostRace(Exception):
+    """The other call of a hedged pair answered first. Not a sign of provider health."""
+
+
+class AllFailed(Exception):
+    """Both calls of a hedged pair failed; ``errors`` is ``[primary_error, hedge_error]``."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(str(e) for e in errors))
+        self.errors = errors
+
+
+def enabled():
+    return getattr(settings, 'HEDGING_ENABLED', False)
+
+
+def record(name, seconds):
+    """A successful call to ``name`` took ``seconds``."""
+    with _lock:
+        samples = _latencies.get(name)
+        if samples is None:
+            samples = _latencies[name] = deque(maxlen=getattr(settings, 'HEDGE_WINDOW', 200))
+        samples.append(seconds)
+
+
+def delay(name):
+    """Seconds to wait for ``name`` before hedging."""
+    with _lock:
+        samples = sorted(_latencies.get(name, ()))
+    if len(samples) < getattr(settings, 'HEDGE_MIN_SAMPLES', 20):
+        return getattr(settings, 'HEDGE_DELAY_SECONDS', 5.0)
+    rank = getattr(settings, 'HEDGE_PERCENTILE', 95) / 100 * (len(samples) - 1)
+    return samples[round(rank)]
+
+
+class _Budget:
+    def __init__(self):
+        self.tokens = None  # starts full on first use, once settings are loaded
+        self._lock = threading.Lock()
+
+    def _burst(self):
+        return getattr(settings, 'HEDGE_BUDGET_BURST', 5)
+
+    def deposit(self):
+        with self._lock:
+            tokens = self._burst() if self.tokens is None else self.tokens
+            self.tokens = min(self._burst(), tokens + getattr(settings, 'HEDGE_BUDGET_RATIO', 0.1))
+
+    def withdraw(self):
+        with self._lock:
+            if self.tokens is None or self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+    def refund(self):
+        with self._lock:
+            self.tokens += 1
+
+
+_budget = _Budget()
+
+
+def _hedge(backup):
+    """The hedge call from ``backup()``, or None without budget or a provider to hedge with."""
+    if not _budget.withdraw():
+        metrics.HEDGES.inc('no_budget')
+        return None
+    hedge = backup()
+    if hedge is None:
+        _budget.refund()
+        metrics.HEDGES.inc('no_backup')
+    return hedge
+
+
+def _won(role):
+    metrics.HEDGES.inc('hedge_won' if role == HEDGE else 'primary_won')
+
+
+# === Sync views ===
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = futures.ThreadPoolExecutor(
+                max_workers=_max_threads(), thread_name_prefix='hedge',
+            )
+        return _executor
+
+
+def _max_threads():
+    return getattr(settings, 'HEDGE_MAX_THREADS', 32)
+
+
+def _saturated():
+    with _lock:
+        return _busy >= _max_threads()
+
+
+def _finished(future):
+    global _busy
+    with _lock:
+        _busy -= 1
+
+
+def _submit(func):
+    global _busy
+    with _lock:
+        _busy += 1
+    # The copied context keeps the request's trace (timing spans) in the worker thread
+    future = _pool().submit(contextvars.copy_context().run, func)
+    future.add_done_callback(_finished)
+    return future
+
+
+def race(primary, backup, wait):
+    """``primary()``, raced against a hedge if it hasn't returned after ``wait`` seconds.
+
+    ``backup()`` returns the hedge callable, or None if there is nothing to
+    hedge with. Returns the first successful result. Raises the primary's
+    error if no hedge was sent, or :class:`AllFailed` if both failed.
+    """
+    _budget.deposit()
+    if _saturated():
+        metrics.HEDGES.inc('pool_full')
+        return primary()
+    started = threading.Event()
+
+    def run_primary():
+        started.set()
+        return primary()
+
+    first = _submit(run_primary)
+    started.wait()  # the delay runs from the call's start, not from its wait for a thread
+    try:
+        return first.result(timeout=wait)
+    except futures.TimeoutError:
+        pass
+    if _saturated():
+        metrics.HEDGES.inc('pool_full')
+        return first.result()
+    hedge = _hedge(backup)
+    if hedge is None:
+        return first.result()
+
+    running = {first: PRIMARY, _submit(hedge): HEDGE}
+    errors = {}
+    while running:
+        done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+        for future in done:
+            role = running.pop(future)
+            if future.exception() is None:
+                _won(role)
+                return future.result()  # the other call keeps its thread until its own timeout
+            errors[role] = future.exception()
+    metrics.HEDGES.inc('both_failed')
+    raise AllFailed([errors[PRIMARY], errors[HEDGE]])
+
+
+# === Async views ===
+async def arace(primary, backup, wait):
+    """Async twin of :func:`race`: ``primary``, ``backup()`` and its result are coroutine functions.
+
+    The losing call is cancelled.
+    """
+    _budget.deposit()
+    first = asyncio.ensure_future(primary())
+    running = {first: PRIMARY}
+    try:
+        done, _ = await asyncio.wait({first}, timeout=wait)
+        if not done:
+            hedge = _hedge(backup)
+            if hedge is not None:
+                running[asyncio.ensure_future(hedge())] = HEDGE
+        errors = {}
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                role = running.pop(task)
+                if task.exception() is None:
+                    if errors or running:
+                        _won(role)
+                    return task.result()
+                errors[role] = task.exception()
+    finally:
+        for task in running:
+            task.cancel()  # the loser, or both if this request was cancelled
+    if len(errors) == 1:
+        raise errors[PRIMARY]
+    metrics.HEDGES.inc('both_failed')
+    raise AllFailed([errors[PRIMARY], errors[HEDGE]])
+
+
+def reset():
+    """Forget the call times and refill the budget (tests)."""
+    with _lock:
+        _latencies.clear()
+    with _budget._lock:
+        _budget.tokens = None
@@ -0,0 +1,118 @@
+"""
+Token-budgeted conversation history.
+
+``MAX_HISTORY_TURNS`` bounds how many turns a client may send, not how big they
+are. Here the most recent turns are kept verbatim while they fit in
+``HISTORY_TOKEN_BUDGET`` (or a smaller per-provider budget from
+``HISTORY_PROVIDER_TOKEN_BUDGETS``); older turns are compressed into one
+running summary message of at most ``HISTORY_SUMMARY_TOKENS``. The prompt
+therefore stops growing however long a conversation runs.
+
+Summaries are extractive (the opening sentence of each turn), so they cost no
+extra provider call, and they are cached on the turns they cover: every new
+question in a long conversation re-sends the same old turns. They quote what
+the visitor sent, so they go in a ``user`` message: only the server writes
+system messages.
+"""
+import hashlib
+import json
+import re
+
+from django.conf import settings
+
+from .lru import LRUCache
+
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+SUMMARY_LINE_CHARS = 160
+
+_summaries = LRUCache(maxsize=256, ttl=3600)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+_SPACES = re.compile(r"\s+")
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English), without a tokenizer."""
+    return len(text) // 4 + 1
+
+
+def _message_tokens(message):
+    return estimate_tokens(message['content']) + 4  # role and separators
+
+
+def prompt_tokens(messages):
+    """Estimated prompt size of ``messages``."""
+    return sum(_message_tokens(message) for message in messages)
+
+
+def budget_for(provider_name=None):
+    budgets = getattr(settings, 'HISTORY_PROVIDER_TOKEN_BUDGETS', {})
+    default = getattr(settings, 'HISTORY_TOKEN_BUDGET', 1500)
+    return min(budgets.get(provider_name, default), default)
+
+
+def _summary_line(message):
+    # Structured replies ("intro::Category:a,b|...") are summarized by their intro.
+    text = _SPACES.sub(" ", message['content'].split("::")[0]).strip()
+    text = _SENTENCE_END.split(text, 1)[0]
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS].rstrip() + "..."
+    speaker = "Me" if message['role'] == 'assistant' else "Visitor"
+    return f"- {speaker}: {text}"
+
+
+def summarize(turns, previous=None):
+    """Summary message covering ``turns`` (appended to an earlier ``previous`` summary).
+
+    The newest lines are kept when it would exceed ``HISTORY_SUMMARY_TOKENS``.
+    """
+    key = hashlib.sha256(json.dumps([previous, turns]).encode()).hexdigest()
+    summary = _summaries.get(key)
+    if summary is not None:
+        return summary
+
+    lines = previous['content'].split("\n")[1:] if previous else []
+    lines += [_summary_line(turn) for turn in turns]
+    limit = getattr(settings, 'HISTORY_SUMMARY_TOKENS', 300)
+    used = estimate_tokens(SUMMARY_HEADER)
+    kept = []
+    for line in reversed(lines):
+        used += estimate_tokens(line)
+        if used > limit:
+            break
+        kept.append(line)
+    summary = {"role": "user", "content": "\n".join([SUMMARY_HEADER, *reversed(kept)])}
+    _summaries.set(key, summary)
+    return summary
+
+
+def is_summary(message):
+    return message['role'] == 'user' and message['content'].startswith(SUMMARY_HEADER)
+
+
+def fit(messages, provider_name=None):
+    """``messages`` with the history trimmed to the provider's budget.
+
+    ``messages`` is ``[system, summary?, *turns, question]``. Returns the list
+    unchanged when it already fits.
+    """
+    head = 2 if len(messages) > 2 and is_summary(messages[1]) else 1
+    turns = messages[head:-1]
+    budget = budget_for(provider_name)
+
+    used = 0
+    start = len(turns)
+    while start > 0:
+        cost = _message_tokens(turns[start - 1])
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+
+    if start == 0:
+        return messages
+    previous = messages[1] if head == 2 else None
+    return [messages[0], summarize(turns[:start], previous), *turns[start:], messages[-1]]
+
+
+def reset():
+    _summaries.clear()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api import answer_cache
+
+
+class Command(BaseCommand):
+    help = "Delete every cached chat answer (persistent tier and this process's memory tier)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expired', action='store_true',
+                            help="only delete answers that can no longer be served (expired or from an old knowledge base)")
+
+    def handle(self, *args, **options):
+        if options['expired']:
+            deleted = answer_cache.purge()
+            self.stdout.write(self.style.SUCCESS(f"Removed {deleted} expired cached answers."))
+            return
+        deleted = answer_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} cached answers."))
@@ -0,0 +1,83 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import answer_cache, fast_path, router, views
+from api.deadline import Deadline
+
+
+def _read_questions(path):
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate answers to the canonical opening questions and pin them in the answer cache "
+        "for the current knowledge-base version, so chats asking them are served without a provider call."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', metavar='FILE',
+                            help="one question per line ('#' comments); default: WARM_ANSWER_QUESTIONS")
+        parser.add_argument('--concurrency', type=int,
+                            default=getattr(settings, 'WARM_ANSWERS_CONCURRENCY', 2),
+                            help="questions generated at once")
+        parser.add_argument('--per-minute', type=float,
+                            default=getattr(settings, 'WARM_ANSWERS_PER_MINUTE', 20),
+                            help="questions started per minute, to stay within provider quotas (0 = no limit)")
+        parser.add_argument('--force', action='store_true',
+                            help="regenerate questions that already have a pinned answer")
+
+    def handle(self, *args, **options):
+        if options['questions']:
+            questions = _read_questions(options['questions'])
+        else:
+            questions = list(getattr(settings, 'WARM_ANSWER_QUESTIONS', []))
+
+        jobs, skipped, direct = [], 0, 0
+        for question in questions:
+            if fast_path.answer(question) is not None:
+                # Answered from the knowledge base before the cache is consulted
+                direct += 1
+                continue
+            route = router.route(question)
+            if route is not None and route.answer is not None:
+                # Has a canned answer; a pinned one would be served instead of it
+                direct += 1
+                continue
+            messages = views.prompt_messages(question)
+            key = answer_cache.cache_key(messages)
+            if key is None:
+                raise CommandError("The answer cache is disabled (ANSWER_CACHE_ENABLED=0).")
+            if not options['force'] and answer_cache.is_pinned(key):
+                skipped += 1
+                continue
+            jobs.append((question, messages, key))
+
+        interval = 60 / options['per_minute'] if options['per_minute'] > 0 else 0
+        warmed, failed = 0, 0
+        with ThreadPoolExecutor(max_workers=max(1, options['concurrency'])) as pool:
+            futures = {}
+            for i, (question, messages, key) in enumerate(jobs):
+                if i and interval:
+                    time.sleep(interval)
+                # The budget starts when the job runs, not while it waits for a thread
+                futures[pool.submit(lambda m=messages: views.generate_answer(m, Deadline()))] = (question, messages, key)
+
+            for future in as_completed(futures):
+                question, messages, key = futures[future]
+                try:
+                    reply, provider = future.result()
+                except views.AllProvidersFailed as e:
+                    failed += 1
+                    self.stderr.write(self.style.WARNING(f"Failed: {question} ({e})"))
+                    continue
+                answer_cache.store(key, messages, reply, provider, pinned=True)
+                warmed += 1
+                self.stdout.write(f"Warmed: {question} ({provider})")
+
+        summary = f"Warmed {warmed}, already warm {skipped}, failed {failed}, answered directly {direct} (knowledge base {answer_cache.KB_VERSION})."
+        self.stdout.write(self.style.SUCCESS(summary) if not failed else self.style.WARNING(summary))
@@ -0,0 +1,276 @@
+"""
+In-process metrics for the chat pipeline, served at ``/api/metrics`` in the
+Prometheus text format.
+
+Updates are lock-free on the hot path: every thread (the event loop counts as
+one) writes to its own dict of values, and a scrape sums those dicts. Only the
+first update from a new thread takes a lock, to register its dict. The dicts
+of threads that have finished are folded into one retired total and dropped,
+so thread churn doesn't grow memory or slow scrapes.
+
+Each worker process has its own registry. With ``METRICS_DIR`` set, every
+worker also writes its totals to ``<METRICS_DIR>/metrics-<pid>.json`` every
+``METRICS_FLUSH_SECONDS`` and on every scrape, and a scrape returns the sum of
+all those files, whichever worker answers it. Files of workers that have
+exited are kept so counters don't go backwards; clear the directory on deploy.
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_metrics = {}  # name -> metric, in registration order
+_local = threading.local()
+_shards = []  # (thread, its {(name, label values): value}) for every live thread that has written
+_retired = {}  # totals of threads that have finished
+_shards_lock = threading.Lock()
+_flusher = None
+
+
+def _shard():
+    shard = getattr(_local, 'values', None)
+    if shard is None:
+        shard = _local.values = {}
+        with _shards_lock:
+            _retire_finished()
+            _shards.append((threading.current_thread(), shard))
+        _start_flusher()
+    return shard
+
+
+def _merge_into(totals, shard):
+    for key, value in list(shard.items()):
+        metric = _metrics.get(key[0])
+        if metric is not None:
+            totals[key] = metric._merge(totals.get(key), value)
+
+
+def _retire_finished():
+    """Fold the shards of finished threads into ``_retired``. Call with ``_shards_lock`` held."""
+    finished = [shard for thread, shard in _shards if not thread.is_alive()]
+    if finished:
+        _shards[:] = [(thread, shard) for thread, shard in _shards if thread.is_alive()]
+        for shard in finished:
+            _merge_into(_retired, shard)
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        _metrics[name] = self
+
+    def inc(self, *label_values, amount=1):
+        shard = _shard()
+        key = (self.name, label_values)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _merge(self, total, value):
+        return (total or 0) + value
+
+    def _samples(self, label_values, value):
+        yield self.name, _labels(self.labels, label_values), value
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25)):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        _metrics[name] = self
+
+    def observe(self, value, *label_values):
+        shard = _shard()
+        key = (self.name, label_values)
+        counts = shard.get(key)
+        if counts is None:
+            # one slot per bucket, then +Inf, sum and count
+            counts = shard[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def _merge(self, total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+    def _samples(self, label_values, counts):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), counts):
+            cumulative += count
+            le = bound if bound == '+Inf' else _number(bound)
+            yield f"{self.name}_bucket", _labels((*self.labels, 'le'), (*label_values, le)), cumulative
+        yield f"{self.name}_sum", _labels(self.labels, label_values), counts[-2]
+        yield f"{self.name}_count", _labels(self.labels, label_values), counts[-1]
+
+
+# === The chat pipeline's metrics ===
+REQUESTS = Counter('api_requests_total', "API responses by endpoint and HTTP status.", ('endpoint', 'status'))
+PROVIDER_LATENCY = Histogram(
+    'llm_provider_latency_seconds', "Provider call duration (to the first token when streaming).",
+    ('provider', 'outcome'),
+)
+PROVIDER_FAILURES = Counter(
+    'llm_provider_failures_total', "Failed provider calls by error class.", ('provider', 'error'),
+)
+CASCADE_DEPTH = Histogram(
+    'chat_cascade_depth', "Providers called for one chat request, including the one that answered.",
+    ('outcome',), buckets=(1, 2, 3, 4, 5),
+)
+CACHE_LOOKUPS = Counter('answer_cache_lookups_total', "Answer cache lookups by result.", ('result',))
+RATE_LIMITED = Counter('rate_limit_rejections_total', "Requests rejected by the rate limiter.", ('endpoint',))
+SINGLE_FLIGHT = Counter(
+    'chat_single_flight_total', "Provider-bound chats that led a cascade or waited on an identical one.", ('role',),
+)
+PROVIDER_EXPLORATIONS = Counter(
+    'provider_explorations_total', "Chats that tried a provider or model out of ranking order to re-measure it.",
+    ('provider',),
+)
+HEDGES = Counter(
+    'chat_hedges_total', "Slow provider calls by hedge outcome (which call won, or why none was sent).", ('outcome',),
+)
+QUOTA_SKIPS = Counter(
+    'provider_quota_skips_total', "Provider or model calls skipped because its rate-limit quota was spent.",
+    ('provider',),
+)
+ROUTES = Counter('chat_routes_total', "Chat questions by routed intent and model tier.", ('intent', 'tier'))
+ROUTE_LATENCY = Histogram(
+    'chat_route_latency_seconds', "Time to a provider's answer (first token when streaming) by route.",
+    ('intent', 'tier'),
+)
+
+CACHE_HITS = ('memory_hit', 'db_hit', 'semantic_hit')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+# === Collection ===
+def snapshot():
+    """This process's totals: ``{(name, label values): value}``."""
+    with _shards_lock:
+        _retire_finished()
+        shards = [shard for _, shard in _shards]
+        totals = {}
+        _merge_into(totals, _retired)
+    for shard in shards:
+        _merge_into(totals, shard)
+    return totals
+
+
+def _worker_file():
+    return os.path.join(settings.METRICS_DIR, f"metrics-{os.getpid()}.json")
+
+
+def write_snapshot():
+    """Write this worker's totals to ``METRICS_DIR`` (no-op when unset)."""
+    if not getattr(settings, 'METRICS_DIR', ''):
+        return
+    path = _worker_file()
+    data = [[name, list(labels), value] for (name, labels), value in snapshot().items()]
+    try:
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(data, f)
+        os.replace(f"{path}.tmp", path)  # readers never see a half-written file
+    except OSError as e:
+        logger.warning(f"Could not write metrics snapshot: {e}")
+
+
+def _all_workers():
+    totals = {}
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, 'metrics-*.json')):
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Skipping metrics file {path}: {e}")
+            continue
+        for name, labels, value in data:
+            metric = _metrics.get(name)
+            if metric is not None:
+                key = (name, tuple(labels))
+                totals[key] = metric._merge(totals.get(key), value)
+    return totals
+
+
+def _flush_forever():
+    while True:
+        time.sleep(getattr(settings, 'METRICS_FLUSH_SECONDS', 15))
+        write_snapshot()
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is None and getattr(settings, 'METRICS_DIR', ''):
+        with _shards_lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_forever, name='metrics-flush', daemon=True)
+                _flusher.start()
+
+
+def collect():
+    """Totals across every worker when ``METRICS_DIR`` is set, else this process's."""
+    if getattr(settings, 'METRICS_DIR', ''):
+        write_snapshot()
+        return _all_workers()
+    return snapshot()
+
+
+def render():
+    """Prometheus text exposition of :func:`collect`."""
+    totals = collect()
+    by_metric = {}
+    for (name, label_values), value in sorted(totals.items(), key=lambda item: item[0]):
+        by_metric.setdefault(name, []).append((label_values, value))
+
+    lines = []
+    for name, metric in _metrics.items():
+        lines.append(f"# HELP {name} {metric.documentation}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for label_values, value in by_metric.get(name, []):
+            for sample, labels, sample_value in metric._samples(label_values, value):
+                lines.append(f"{sample}{labels} {_number(sample_value)}")
+
+    lookups = {labels[0]: value for (name, labels), value in totals.items() if name == CACHE_LOOKUPS.name}
+    total = sum(lookups.values())
+    hits = sum(lookups.get(result, 0) for result in CACHE_HITS)
+    lines.append("# HELP answer_cache_hit_ratio Share of answer cache lookups served from any tier.")
+    lines.append("# TYPE answer_cache_hit_ratio gauge")
+    lines.append(f"answer_cache_hit_ratio {_number(hits / total if total else 0.0)}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Zero every value in this process (tests)."""
+    with _shards_lock:
+        for _, shard in _shards:
+            shard.clear()
+        _retired.clear()
@@ -0,0 +1,83 @@
+"""
+Middleware for ``/api/`` endpoints: request metrics (``api/metrics.py``) and
+phase timing / profiling (``api/timing.py``). Both work under WSGI and ASGI.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from . import metrics, timing
+
+
+class _ApiMiddleware:
+    """Calls ``before(request)`` and ``after(request, response, state)`` around /api/ requests."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
+        state = self.before(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.cleanup(state)
+        return self.after(request, response, state)
+
+    async def __acall__(self, request):
+        if not request.path.startswith('/api/'):
+            return await self.get_response(request)
+        state = self.before(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.cleanup(state)
+        return self.after(request, response, state)
+
+    def before(self, request):
+        return None
+
+    def cleanup(self, state):
+        pass
+
+    def after(self, request, response, state):
+        return response
+
+
+class MetricsMiddleware(_ApiMiddleware):
+    def after(self, request, response, state):
+        match = request.resolver_match
+        metrics.REQUESTS.inc(match.url_name if match else 'unmatched', response.status_code)
+        return response
+
+
+class TimingMiddleware(_ApiMiddleware):
+    """Server-Timing header, sampled trace log and admin-only cProfile capture."""
+
+    def before(self, request):
+        profiler = timing.start_profile() if timing.wants_profile(request) else None
+        token = timing.start()
+        return token, timing.current(), profiler
+
+    def cleanup(self, state):
+        token, _, profiler = state
+        if profiler is not None:
+            profiler.disable()
+        timing.finish(token)
+
+    def after(self, request, response, state):
+        _, trace, profiler = state
+        if getattr(settings, 'SERVER_TIMING_ENABLED', True):
+            response['Server-Timing'] = trace.server_timing()
+        if timing.should_log():
+            timing.log_trace(request, response, trace)
+        if profiler is not None:
+            response['X-Profile-File'] = timing.save_profile(profiler, request)
+        return response
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_ratelimitcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cachedanswer',
+            name='pinned',
+            field=models.BooleanField(default=False),
+        ),
+    ]
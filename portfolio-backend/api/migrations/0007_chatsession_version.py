@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_chatsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1 +1,48 @@
 from django.db import models
+
+
+class ViewCounter(models.Model):
+    """Portfolio page views; written in batches by api/view_counter.py."""
+    count = models.IntegerField(default=0)
+    last_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.count} views"
+
+
+class CachedAnswer(models.Model):
+    """Persistent tier of the answer cache (see api/answer_cache.py)."""
+    key = models.CharField(max_length=64, unique=True)
+    kb_version = models.CharField(max_length=16, db_index=True)
+    question = models.TextField()
+    reply = models.TextField()
+    provider = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+    pinned = models.BooleanField(default=False)  # pre-warmed: kept until the knowledge base changes
+
+    def __str__(self):
+        return self.question[:50]
+
+
+class ChatSession(models.Model):
+    """Server-side conversation turns, so clients only send the new question (see api/sessions.py)."""
+    session_id = models.CharField(max_length=64, unique=True)
+    turns = models.TextField(default='[]')  # JSON list of {role, content}
+    version = models.PositiveIntegerField(default=0)  # bumped on every write; the client id ends in it
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return self.session_id
+
+
+class RateLimitCounter(models.Model):
+    """Per-client request count for one rate-limit window (database backend of api/ratelimit.py)."""
+    key = models.CharField(max_length=32)
+    window = models.BigIntegerField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'window'], name='unique_rate_limit_window'),
+        ]
+        indexes = [models.Index(fields=['window'])]
@@ -0,0 +1,455 @@
+"""
+Adapters for the upstream LLM providers.
+
+Every provider has a sync ``call_*`` (WSGI) and an async ``acall_*`` (ASGI)
+adapter. Both build the same request and parse the same response; only the
+transport in ``api.clients`` differs. The OpenAI-compatible providers also
+have ``stream_*`` / ``astream_*`` generators yielding reply text as it arrives.
+The optional ``route`` (:mod:`.router`) sets the reply limit, and Groq's model
+for the small tier. Each call first takes its share of the provider's quota
+(:mod:`.quota`), and every response's rate-limit headers are read before its
+status is checked.
+"""
+import os
+import json
+import logging
+import time
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from . import breaker, clients, quota, ranking
+from .payloads import CohereBody, HuggingFaceBody, OpenAIBody
+from .deadline import attempt_timeout
+from .router import SMALL
+
+logger = logging.getLogger(__name__)
+
+
+def _base_url(setting, default):
+    # Overridable so load tests can point the providers at local stubs
+    return (getattr(settings, setting, '') or default).rstrip('/')
+
+
+GROQ_URL = f"{_base_url('GROQ_BASE_URL', 'https://api.groq.com/openai/v1')}/chat/completions"
+OPENROUTER_URL = f"{_base_url('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')}/chat/completions"
+TOGETHER_URL = f"{_base_url('TOGETHER_BASE_URL', 'https://api.together.xyz/v1')}/chat/completions"
+HUGGINGFACE_URL = (f"{_base_url('HUGGINGFACE_BASE_URL', 'https://api-inference.huggingface.co')}"
+                   "/models/mistralai/Mistral-7B-Instruct-v0.2")
+COHERE_URL = f"{_base_url('COHERE_BASE_URL', 'https://api.cohere.ai')}/v1/chat"
+
+# Hosts we talk to; used for warm-up at worker boot.
+PROVIDER_ORIGINS = list(dict.fromkeys(
+    f"{urlsplit(url).scheme}://{urlsplit(url).netloc}"
+    for url in (GROQ_URL, OPENROUTER_URL, TOGETHER_URL, HUGGINGFACE_URL, COHERE_URL)
+))
+
+OPENROUTER_FREE_MODELS = [
+    "meta-llama/llama-3.1-8b-instruct:free",
+    "mistralai/mistral-7b-instruct:free",
+    "google/gemma-2-9b-it:free",
+]
+
+
+def _auth_headers(env_var):
+    api_key = os.environ.get(env_var)
+    if not api_key:
+        raise ValueError(f"{env_var} not configured")
+
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+
+
+def _max_tokens(route, body):
+    """Reply limit for ``body``: the route's limit capped at the provider's own. None leaves it to the provider."""
+    if route is None or route.max_tokens is None:
+        return None
+    if body.max_tokens is None:  # no fixed limit (Cohere): the route's applies as is
+        return route.max_tokens
+    return min(body.max_tokens, route.max_tokens)
+
+
+def _reserve(name, messages, max_tokens):
+    """Spend ``name``'s quota for this call; raises ``quota.QuotaExhausted`` if it would be rejected."""
+    quota.reserve(name, quota.estimate_tokens(messages, max_tokens))
+
+
+def _check(name, resp):
+    """Read ``name``'s rate-limit headers off ``resp``, then raise for an error status."""
+    quota.observe(name, resp)
+    resp.raise_for_status()
+
+
+def _openai_reply(data):
+    return data["choices"][0]["message"]["content"]
+
+
+# === GROQ API (Primary) ===
+GROQ_BODY = OpenAIBody(model="llama-3.3-70b-versatile", temperature=0.7, max_tokens=2048)
+GROQ_SMALL_BODY = OpenAIBody(
+    model=getattr(settings, 'ROUTER_SMALL_MODEL', "llama-3.1-8b-instant"), temperature=0.7, max_tokens=2048,
+)
+
+
+def _groq_body(route):
+    return GROQ_SMALL_BODY if route is not None and route.tier == SMALL else GROQ_BODY
+
+
+def call_groq(messages, deadline=None, route=None):
+    """Primary: Groq API - Fast and free"""
+    headers = _auth_headers('GROQ_API_KEY')
+    timeout = attempt_timeout(deadline)  # before spending quota: raises once the deadline has passed
+    limit = _max_tokens(route, _groq_body(route))
+    _reserve('Groq', messages, limit)
+    body = _groq_body(route).render(messages, max_tokens=limit)
+    resp = clients.post(GROQ_URL, headers, body, timeout)
+    _check('Groq', resp)
+    return _openai_reply(resp.json())
+
+
+async def acall_groq(messages, deadline=None, route=None):
+    headers = _auth_headers('GROQ_API_KEY')
+    timeout = attempt_timeout(deadline)
+    limit = _max_tokens(route, _groq_body(route))
+    _reserve('Groq', messages, limit)
+    body = _groq_body(route).render(messages, max_tokens=limit)
+    resp = await clients.apost(GROQ_URL, headers, body, timeout)
+    _check('Groq', resp)
+    return _openai_reply(resp.json())
+
+
+# === OpenRouter API (Fallback 1) ===
+OPENROUTER_BODIES = {model: OpenAIBody(model=model, max_tokens=2048) for model in OPENROUTER_FREE_MODELS}
+
+
+def openrouter_model_name(model):
+    """The name a free model's breaker and ranking are kept under."""
+    return f"OpenRouter/{model}"
+
+
+def _ranked_models():
+    return ranking.order(OPENROUTER_FREE_MODELS, name=openrouter_model_name)
+
+
+def _model_available(model, model_breaker, messages, route):
+    """Whether the model's breaker lets a call through and it has quota left (which the call then spends)."""
+    if not model_breaker.allow():
+        return False
+    try:
+        _reserve(openrouter_model_name(model), messages, _max_tokens(route, OPENROUTER_BODIES[model]))
+    except quota.QuotaExhausted as e:
+        model_breaker.record(e)  # hands back a half-open probe; not a failure
+        logger.info(f"Skipping OpenRouter model: {e}")
+        return False
+    return True
+
+
+def has_quota(provider_name):
+    """Whether a cascade provider has quota for a call; OpenRouter has while any free model does."""
+    if provider_name == "OpenRouter":
+        return any(quota.available(openrouter_model_name(model)) for model in OPENROUTER_FREE_MODELS)
+    return quota.available(provider_name)
+
+
+def _model_failed(model, model_breaker, started, e):
+    model_breaker.record(e)
+    ranking.record(openrouter_model_name(model), time.monotonic() - started, e)
+    logger.warning(f"OpenRouter model {model} failed: {e}")
+
+
+def _model_answered(model, model_breaker, started):
+    model_breaker.record()
+    ranking.record(openrouter_model_name(model), time.monotonic() - started)
+
+
+def call_openrouter(messages, deadline=None, route=None):
+    """Fallback 1: OpenRouter with free models"""
+    headers = _auth_headers('OPENROUTER_API_KEY')
+
+    skipped = 0
+    for model in _ranked_models():
+        timeout = attempt_timeout(deadline)
+        model_breaker = breaker.get(openrouter_model_name(model))
+        if not _model_available(model, model_breaker, messages, route):
+            skipped += 1
+            continue
+        started = time.monotonic()
+        try:
+            body = OPENROUTER_BODIES[model].render(messages, max_tokens=_max_tokens(route, OPENROUTER_BODIES[model]))
+            resp = clients.post(OPENROUTER_URL, headers, body, timeout)
+            _check(openrouter_model_name(model), resp)
+            answer = _openai_reply(resp.json())
+        except Exception as e:
+            _model_failed(model, model_breaker, started, e)
+            continue
+        _model_answered(model, model_breaker, started)
+        return answer
+
+    if skipped == len(OPENROUTER_FREE_MODELS):
+        raise breaker.CircuitOpen("All OpenRouter free models are circuit-open or out of quota")
+    raise Exception("All OpenRouter free models failed")
+
+
+async def acall_openrouter(messages, deadline=None, route=None):
+    headers = _auth_headers('OPENROUTER_API_KEY')
+
+    skipped = 0
+    for model in _ranked_models():
+        timeout = attempt_timeout(deadline)
+        model_breaker = breaker.get(openrouter_model_name(model))
+        if not _model_available(model, model_breaker, messages, route):
+            skipped += 1
+            continue
+        started = time.monotonic()
+        try:
+            body = OPENROUTER_BODIES[model].render(messages, max_tokens=_max_tokens(route, OPENROUTER_BODIES[model]))
+            resp = await clients.apost(OPENROUTER_URL, headers, body, timeout)
+            _check(openrouter_model_name(model), resp)
+            answer = _openai_reply(resp.json())
+        except Exception as e:
+            _model_failed(model, model_breaker, started, e)
+            continue
+        _model_answered(model, model_breaker, started)
+        return answer
+
+    if skipped == len(OPENROUTER_FREE_MODELS):
+        raise breaker.CircuitOpen("All OpenRouter free models are circuit-open or out of quota")
+    raise Exception("All OpenRouter free models failed")
+
+
+# === Together AI (Fallback 2) ===
+TOGETHER_BODY = OpenAIBody(model="meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo", max_tokens=2048, temperature=0.7)
+
+
+def call_together(messages, deadline=None, route=None):
+    """Fallback 2: Together AI"""
+    headers = _auth_headers('TOGETHER_API_KEY')
+    timeout = attempt_timeout(deadline)
+    limit = _max_tokens(route, TOGETHER_BODY)
+    _reserve('Together AI', messages, limit)
+    body = TOGETHER_BODY.render(messages, max_tokens=limit)
+    resp = clients.post(TOGETHER_URL, headers, body, timeout)
+    _check('Together AI', resp)
+    return _openai_reply(resp.json())
+
+
+async def acall_together(messages, deadline=None, route=None):
+    headers = _auth_headers('TOGETHER_API_KEY')
+    timeout = attempt_timeout(deadline)
+    limit = _max_tokens(route, TOGETHER_BODY)
+    _reserve('Together AI', messages, limit)
+    body = TOGETHER_BODY.render(messages, max_tokens=limit)
+    resp = await clients.apost(TOGETHER_URL, headers, body, timeout)
+    _check('Together AI', resp)
+    return _openai_reply(resp.json())
+
+
+# === Hugging Face (Fallback 3) ===
+HUGGINGFACE_BODY = HuggingFaceBody(max_new_tokens=1024, temperature=0.7, return_full_text=False)
+
+
+def _huggingface_reply(data):
+    if isinstance(data, list) and len(data) > 0:
+        return data[0].get("generated_text", "")
+    return str(data)
+
+
+def call_huggingface(messages, deadline=None, route=None):
+    """Fallback 3: Hugging Face Inference API"""
+    headers = _auth_headers('HUGGINGFACE_API_KEY')
+    timeout = attempt_timeout(deadline)
+    limit = _max_tokens(route, HUGGINGFACE_BODY)
+    _reserve('Hugging Face', messages, limit)
+    body = HUGGINGFACE_BODY.render(messages, max_tokens=limit)
+    resp = clients.post(HUGGINGFACE_URL, headers, body, timeout)
+    _check('Hugging Face', resp)
+    return _huggingface_reply(resp.json())
+
+
+async def acall_huggingface(messages, deadline=None, route=None):
+    headers = _auth_headers('HUGGINGFACE_API_KEY')
+    timeout = attempt_timeout(deadline)
+    limit = _max_tokens(route, HUGGINGFACE_BODY)
+    _reserve('Hugging Face', messages, limit)
+    body = HUGGINGFACE_BODY.render(messages, max_tokens=limit)
+    resp = await clients.apost(HUGGINGFACE_URL, headers, body, timeout)
+    _check('Hugging Face', resp)
+    return _huggingface_reply(resp.json())
+
+
+# === Cohere (Fallback 4) ===
+COHERE_BODY = CohereBody(model="command-r-plus", temperature=0.7)
+
+
+def call_cohere(messages, deadline=None, route=None):
+    """Fallback 4: Cohere API"""
+    headers = _auth_headers('COHERE_API_KEY')
+    timeout = attempt_timeout(deadline)
+    limit = _max_tokens(route, COHERE_BODY)
+    _reserve('Cohere', messages, limit)
+    body = COHERE_BODY.render(messages, max_tokens=limit)
+    resp = clients.post(COHERE_URL, headers, body, timeout)
+    _check('Cohere', resp)
+    return resp.json()["text"]
+
+
+async def acall_cohere(messages, deadline=None, route=None):
+    headers = _auth_headers('COHERE_API_KEY')
+    timeout = attempt_timeout(deadline)
+    limit = _max_tokens(route, COHERE_BODY)
+    _reserve('Cohere', messages, limit)
+    body = COHERE_BODY.render(messages, max_tokens=limit)
+    resp = await clients.apost(COHERE_URL, headers, body, timeout)
+    _check('Cohere', resp)
+    return resp.json()["text"]
+
+
+# === Streaming (OpenAI-compatible providers) ===
+# Only the time to the first token is bounded by the request deadline; after
+# that the read timeout bounds the gap between chunks.
+_STREAM_DONE = object()
+
+
+def _openai_delta(line):
+    """Text carried by one SSE line of a streamed completion, or _STREAM_DONE."""
+    if not line or not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return _STREAM_DONE
+    choices = json.loads(data).get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content")
+
+
+def _stream_openai(name, url, headers, body, timeout):
+    resp = clients.post(url, headers, body, timeout, stream=True)
+    with resp:
+        _check(name, resp)
+        finished = False
+        # Read to the end even after [DONE] so the connection goes back to the pool.
+        for line in resp.iter_lines(decode_unicode=True):
+            delta = None if finished else _openai_delta(line)
+            if delta is _STREAM_DONE:
+                finished = True
+            elif delta:
+                yield delta
+
+
+async def _astream_openai(name, url, headers, body, timeout):
+    async with clients.astream(url, headers, body, timeout) as resp:
+        _check(name, resp)
+        finished = False
+        async for line in resp.aiter_lines():
+            delta = None if finished else _openai_delta(line)
+            if delta is _STREAM_DONE:
+                finished = True
+            elif delta:
+                yield delta
+
+
+def stream_groq(messages, deadline=None, route=None):
+    headers = _auth_headers('GROQ_API_KEY')
+    timeout = attempt_timeout(deadline)
+    limit = _max_tokens(route, _groq_body(route))
+    _reserve('Groq', messages, limit)
+    body = _groq_body(route).render(messages, stream=True, max_tokens=limit)
+    yield from _stream_openai('Groq', GROQ_URL, headers, body, timeout)
+
+
+async def astream_groq(messages, deadline=None, route=None):
+    headers = _auth_headers('GROQ_API_KEY')
+    timeout = attempt_timeout(deadline)
+    limit = _max_tokens(route, _groq_body(route))
+    _reserve('Groq', messages, limit)
+    body = _groq_body(route).render(messages, stream=True, max_tokens=limit)
+    async for delta in _astream_openai('Groq', GROQ_URL, headers, body, timeout):
+        yield delta
+
+
+def stream_together(messages, deadline=None, route=None):
+    headers = _auth_headers('TOGETHER_API_KEY')
+    timeout = attempt_timeout(deadline)
+    limit = _max_tokens(route, TOGETHER_BODY)
+    _reserve('Together AI', messages, limit)
+    body = TOGETHER_BODY.render(messages, stream=True, max_tokens=limit)
+    yield from _stream_openai('Together AI', TOGETHER_URL, headers, body, timeout)
+
+
+async def astream_together(messages, deadline=None, route=None):
+    headers = _auth_headers('TOGETHER_API_KEY')
+    timeout = attempt_timeout(deadline)
+    limit = _max_tokens(route, TOGETHER_BODY)
+    _reserve('Together AI', messages, limit)
+    body = TOGETHER_BODY.render(messages, stream=True, max_tokens=limit)
+    async for delta in _astream_openai('Together AI', TOGETHER_URL, headers, body, timeout):
+        yield delta
+
+
+def stream_openrouter(messages, deadline=None, route=None):
+    """Falls through the free models until one produces its first token."""
+    headers = _auth_headers('OPENROUTER_API_KEY')
+
+    skipped = 0
+    for model in _ranked_models():
+        timeout = attempt_timeout(deadline)
+        model_breaker = breaker.get(openrouter_model_name(model))
+        if not _model_available(model, model_breaker, messages, route):
+            skipped += 1
+            continue
+        started = time.monotonic()
+        body = OPENROUTER_BODIES[model].render(
+            messages, stream=True, max_tokens=_max_tokens(route, OPENROUTER_BODIES[model]),
+        )
+        chunks = _stream_openai(openrouter_model_name(model), OPENROUTER_URL, headers, body, timeout)
+        try:
+            try:
+                first = next(chunks)
+            except Exception as e:
+                _model_failed(model, model_breaker, started, e)
+                continue
+            _model_answered(model, model_breaker, started)
+            yield first
+            yield from chunks
+            return
+        finally:
+            chunks.close()  # also when the reader stops early: releases the HTTP stream
+
+    if skipped == len(OPENROUTER_FREE_MODELS):
+        raise breaker.CircuitOpen("All OpenRouter free models are circuit-open or out of quota")
+    raise Exception("All OpenRouter free models failed")
+
+
+async def astream_openrouter(messages, deadline=None, route=None):
+    headers = _auth_headers('OPENROUTER_API_KEY')
+
+    skipped = 0
+    for model in _ranked_models():
+        timeout = attempt_timeout(deadline)
+        model_breaker = breaker.get(openrouter_model_name(model))
+        if not _model_available(model, model_breaker, messages, route):
+            skipped += 1
+            continue
+        started = time.monotonic()
+        body = OPENROUTER_BODIES[model].render(
+            messages, stream=True, max_tokens=_max_tokens(route, OPENROUTER_BODIES[model]),
+        )
+        chunks = _astream_openai(openrouter_model_name(model), OPENROUTER_URL, headers, body, timeout)
+        try:
+            try:
+                first = await chunks.__anext__()
+            except Exception as e:
+                _model_failed(model, model_breaker, started, e)
+                continue
+            _model_answered(model, model_breaker, started)
+            yield first
+            async for delta in chunks:
+                yield delta
+            return
+        finally:
+            await chunks.aclose()  # an async generator isn't closed when dropped, only when collected
+
+    if skipped == len(OPENROUTER_FREE_MODELS):
+        raise breaker.CircuitOpen("All OpenRouter free models are circuit-open or out of quota")
+    raise Exception("All OpenRouter free models failed")
@@ -0,0 +1,218 @@
+"""
+Provider rate limits, as the providers report them.
+
+Groq, OpenRouter's free models and the others limit requests and tokens per
+minute (or per day). A 429 used to count as just another failed call, and the
+next chat sent another request to a provider that had said when to come back.
+Now every provider response is read for:
+
+- ``Retry-After`` on a 429 or 503: no calls until then (``QUOTA_DEFAULT_RETRY_AFTER``
+  seconds for a 429 without one);
+- ``x-ratelimit-remaining-requests`` / ``-tokens`` and their ``-reset-``
+  headers (Groq, Together AI), or ``x-ratelimit-remaining`` / ``-reset``
+  (OpenRouter): what is left in the current window.
+
+Before a call, :func:`reserve` takes one request and the estimated tokens
+(prompt plus reply limit) off what is left. A provider that would go below
+``QUOTA_RESERVE_REQUESTS`` requests, or doesn't have the tokens, is skipped
+with :class:`QuotaExhausted` before it starts rejecting calls; the cascade
+treats that like an open circuit. The next response's headers correct the
+estimate, and a window's count is forgotten once it resets.
+
+``QUOTA_ENABLED=0`` turns all of this off. Limits are tracked per provider
+and per OpenRouter model, in the process. Other workers spend the same quota,
+which is what the reserve is for.
+"""
+import logging
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from django.conf import settings
+
+from . import metrics
+from .breaker import CircuitOpen
+from .history import prompt_tokens
+
+logger = logging.getLogger(__name__)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNIT_SECONDS = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+
+_lock = threading.Lock()
+_quotas = {}  # name -> _Quota
+
+
+class QuotaExhausted(CircuitOpen):
+    """The provider has said, or its quota headers say, that it would reject a call now."""
+
+
+class _Quota:
+    def __init__(self):
+        self.blocked_until = 0.0  # monotonic
+        self.requests = None  # left in the current window, if the provider said
+        self.requests_reset = 0.0
+        self.tokens = None
+        self.tokens_reset = 0.0
+
+    def snapshot(self, now):
+        data = {}
+        if self.blocked_until > now:
+            data['retry_in'] = round(self.blocked_until - now, 1)
+        if self.requests is not None and self.requests_reset > now:
+            data['requests_left'] = self.requests
+            data['requests_reset_in'] = round(self.requests_reset - now, 1)
+        if self.tokens is not None and self.tokens_reset > now:
+            data['tokens_left'] = self.tokens
+            data['tokens_reset_in'] = round(self.tokens_reset - now, 1)
+        return data
+
+
+def enabled():
+    return getattr(settings, 'QUOTA_ENABLED', True)
+
+
+def estimate_tokens(messages, max_tokens=None):
+    """Tokens a call will count against the quota: the prompt plus the reply limit."""
+    return prompt_tokens(messages) + (max_tokens or getattr(settings, 'QUOTA_REPLY_TOKENS', 500))
+
+
+def _refusal(quota, tokens, now):
+    """Why a call of about ``tokens`` would be rejected now, or None. Forgets windows that have reset."""
+    if quota.requests is not None and quota.requests_reset <= now:
+        quota.requests = None
+    if quota.tokens is not None and quota.tokens_reset <= now:
+        quota.tokens = None
+
+    if quota.blocked_until > now:
+        return f"rate limited for {quota.blocked_until - now:.0f}s more"
+    if quota.requests is not None and quota.requests <= getattr(settings, 'QUOTA_RESERVE_REQUESTS', 1):
+        return f"{quota.requests} requests left for {quota.requests_reset - now:.0f}s"
+    if quota.tokens is not None and quota.tokens < tokens:
+        return f"{quota.tokens} tokens left for {quota.tokens_reset - now:.0f}s, needs about {tokens}"
+    return None
+
+
+def available(name, tokens=0):
+    """Whether ``name`` has quota for a call, without spending any."""
+    if not enabled():
+        return True
+    with _lock:
+        quota = _quotas.get(name)
+        return quota is None or _refusal(quota, tokens, time.monotonic()) is None
+
+
+def reserve(name, tokens):
+    """Count one call of about ``tokens`` against ``name``; raises :class:`QuotaExhausted` if it would be rejected."""
+    if not enabled():
+        return
+    with _lock:
+        quota = _quotas.get(name)
+        if quota is None:
+            return
+        reason = _refusal(quota, tokens, time.monotonic())
+        if reason is None:
+            if quota.requests is not None:
+                quota.requests -= 1
+            if quota.tokens is not None:
+                quota.tokens -= tokens
+            return
+    metrics.QUOTA_SKIPS.inc(name)
+    raise QuotaExhausted(f"{name}: {reason}")
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a ``Retry-After`` value (seconds or an HTTP date), or None."""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - (time.time() if now is None else now))
+
+
+def parse_reset(value, now=None):
+    """Seconds until a rate-limit window resets, from ``"1m30.5s"``, ``"250ms"``, seconds or an epoch time."""
+    if not isinstance(value, str) or not value.strip():
+        return None
+    value = value.strip()
+    try:
+        number = float(value)
+    except ValueError:
+        parts = _DURATION_PART.findall(value)
+        if not parts or "".join(amount + unit for amount, unit in parts) != value:
+            return None
+        return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in parts)
+    now = time.time() if now is None else now
+    if number > 1e12:  # epoch milliseconds (OpenRouter)
+        return max(0.0, number / 1000 - now)
+    if number > 1e9:  # epoch seconds
+        return max(0.0, number - now)
+    return number
+
+
+def _count(value):
+    if not isinstance(value, str):
+        return None
+    try:
+        return max(0, int(float(value)))
+    except ValueError:
+        return None
+
+
+def observe(name, response):
+    """Update ``name``'s quota from a provider response (any status)."""
+    headers = getattr(response, 'headers', None)
+    if headers is None or not enabled():
+        return
+    status = getattr(response, 'status_code', None)
+    now = time.monotonic()
+    window = getattr(settings, 'QUOTA_DEFAULT_WINDOW', 60)
+
+    retry_after = None
+    if status in (429, 503):
+        retry_after = parse_retry_after(headers.get('retry-after'))
+        if retry_after is None and status == 429:
+            retry_after = getattr(settings, 'QUOTA_DEFAULT_RETRY_AFTER', 10)
+
+    requests_left = _count(headers.get('x-ratelimit-remaining-requests'))
+    requests_reset = parse_reset(headers.get('x-ratelimit-reset-requests'))
+    if requests_left is None:  # OpenRouter reports one request limit
+        requests_left = _count(headers.get('x-ratelimit-remaining'))
+        requests_reset = parse_reset(headers.get('x-ratelimit-reset'))
+    tokens_left = _count(headers.get('x-ratelimit-remaining-tokens'))
+    tokens_reset = parse_reset(headers.get('x-ratelimit-reset-tokens'))
+
+    if retry_after is None and requests_left is None and tokens_left is None:
+        return
+    with _lock:
+        quota = _quotas.setdefault(name, _Quota())
+        if retry_after is not None:
+            quota.blocked_until = max(quota.blocked_until, now + retry_after)
+            logger.warning(f"{name} rate limited (HTTP {status}), not calling it for {retry_after:.0f}s")
+        if requests_left is not None:
+            quota.requests = requests_left
+            quota.requests_reset = now + (window if requests_reset is None else requests_reset)
+        if tokens_left is not None:
+            quota.tokens = tokens_left
+            quota.tokens_reset = now + (window if tokens_reset is None else tokens_reset)
+
+
+def snapshot():
+    """What is known about each provider's quota right now (health endpoint)."""
+    now = time.monotonic()
+    with _lock:
+        return {name: data for name, quota in _quotas.items() if (data := quota.snapshot(now))}
+
+
+def reset():
+    """Forget every quota (tests)."""
+    with _lock:
+        _quotas.clear()
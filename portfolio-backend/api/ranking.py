@@ -0,0 +1,131 @@
+"""
+Adaptive provider order for the fallback cascade.
+
+The cascade used to try Groq, OpenRouter, Together AI, Hugging Face and Cohere
+in that order, even while Groq was slow and Together fast. Every attempt now
+updates an exponentially weighted moving average (``PROVIDER_RANKING_ALPHA``)
+of how long the attempt took and whether it succeeded, per provider and per
+OpenRouter model. Candidates are tried by expected time to success,
+``attempt seconds / success rate``, the order that minimizes the expected
+wait when falling through a list until one answers.
+
+A provider without samples scores ``PROVIDER_RANKING_PRIOR_SECONDS``, and ties
+keep the configured order, so a fresh process starts with the static order.
+Unconfigured providers (missing API key), circuit-open ones and client errors
+don't count.
+
+A provider that was slow once is rarely tried again while the ones ahead of
+it answer, so it would never be seen to recover. With probability
+``PROVIDER_RANKING_EXPLORE_RATE`` a request tries first the candidate whose
+last sample is the oldest, once that is over ``PROVIDER_RANKING_EXPLORE_AFTER``
+seconds old. Its circuit breaker still applies.
+
+State lives in the process, like the circuit breakers.
+"""
+import logging
+import operator
+import random
+import threading
+import time
+
+from django.conf import settings
+
+from . import metrics
+from .breaker import counts_as_failure
+
+logger = logging.getLogger(__name__)
+
+MIN_SUCCESS_RATE = 0.05  # keeps the score finite for a provider that always fails
+
+_lock = threading.Lock()
+_stats = {}  # name -> _Stats
+
+
+class _Stats:
+    def __init__(self, seconds, success):
+        self.seconds = seconds
+        self.success = success
+        self.samples = 1
+        self.updated_at = time.monotonic()
+
+    def update(self, seconds, success, alpha):
+        self.seconds += alpha * (seconds - self.seconds)
+        self.success += alpha * (success - self.success)
+        self.samples += 1
+        self.updated_at = time.monotonic()
+
+    def score(self):
+        return self.seconds / max(self.success, MIN_SUCCESS_RATE)
+
+
+def enabled():
+    return getattr(settings, 'PROVIDER_RANKING_ENABLED', True)
+
+
+def record(name, seconds, error=None):
+    """Fold one attempt at ``name`` (``"Groq"``, ``"OpenRouter/<model>"``) into its averages."""
+    if error is not None and not counts_as_failure(error):
+        return
+    success = 1.0 if error is None else 0.0
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            _stats[name] = _Stats(seconds, success)
+        else:
+            stats.update(seconds, success, getattr(settings, 'PROVIDER_RANKING_ALPHA', 0.2))
+
+
+def _score(name):
+    stats = _stats.get(name)
+    if stats is None:
+        return getattr(settings, 'PROVIDER_RANKING_PRIOR_SECONDS', 3.0)
+    return stats.score()
+
+
+def _stalest(names):
+    """The sampled candidate not tried for the longest, if that's over ``PROVIDER_RANKING_EXPLORE_AFTER``."""
+    cutoff = time.monotonic() - getattr(settings, 'PROVIDER_RANKING_EXPLORE_AFTER', 60)
+    stale = [name for name in names if name in _stats and _stats[name].updated_at <= cutoff]
+    return min(stale, key=lambda name: _stats[name].updated_at, default=None)
+
+
+def order(items, name=operator.itemgetter(0)):
+    """``items`` by expected time to success; ``name(item)`` is the key they are tracked under.
+
+    The input order breaks ties. Returns the items unchanged with ranking off.
+    """
+    if not enabled():
+        return list(items)
+    with _lock:
+        ranked = sorted(items, key=lambda item: _score(name(item)))
+        if len(ranked) > 1 and random.random() < getattr(settings, 'PROVIDER_RANKING_EXPLORE_RATE', 0.05):
+            explore = _stalest([name(item) for item in ranked[1:]])
+            if explore is not None:
+                ranked.sort(key=lambda item: name(item) != explore)
+                metrics.PROVIDER_EXPLORATIONS.inc(explore)
+                logger.info(f"Exploring {explore} first")
+    return ranked
+
+
+def snapshot(names):
+    """The current order of ``names`` with each one's averages (health endpoint)."""
+    with _lock:
+        rows = []
+        for candidate in sorted(names, key=_score):
+            stats = _stats.get(candidate)
+            row = {'name': candidate, 'expected_seconds': round(_score(candidate), 3)}
+            if stats is not None:
+                row.update(
+                    attempt_seconds=round(stats.seconds, 3),
+                    success_rate=round(stats.success, 3),
+                    samples=stats.samples,
+                    last_sample_ago=round(time.monotonic() - stats.updated_at, 1),
+                )
+            rows.append(row)
+    return rows
+
+
+def reset():
+    """Forget every average (tests)."""
+    with _lock:
+        _stats.clear()
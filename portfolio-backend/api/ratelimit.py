@@ -0,0 +1,233 @@
+"""
+Per-client rate limiting for the chat endpoints.
+
+Two algorithms (``RATE_LIMIT_ALGORITHM``), both O(1) in time and memory per
+client, allowing ``RATE_LIMIT_MAX_REQUESTS`` per ``RATE_LIMIT_WINDOW`` seconds:
+
+- ``sliding_window`` (default): counts for the current and the previous fixed
+  window, the previous one weighted by how much of it the sliding window still
+  covers.
+- ``token_bucket``: tokens refill evenly over the window, so short bursts are
+  allowed as long as the average rate holds.
+
+State lives in one of three backends (``RATE_LIMIT_BACKEND``):
+
+- ``memory``: per process, in an LRU of at most ``RATE_LIMIT_MAX_KEYS`` clients
+  whose entries expire once a client has been idle for two windows.
+- ``cache``: a Django cache (``RATE_LIMIT_CACHE_ALIAS``) shared by every worker
+  using it. Increments are atomic on Redis/Memcached, best-effort elsewhere.
+- ``database``: the ``RateLimitCounter`` table (SQLite here), shared by every
+  worker on the host; increments are single ``UPDATE ... count + 1`` statements.
+
+The shared backends use the sliding window. Rejected requests aren't counted,
+and a failing shared backend lets requests through rather than blocking chat.
+"""
+import hashlib
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+PURGE_EVERY = 1000  # database backend: drop stale windows every this many hits
+
+
+def _window_estimate(previous, current, now, index, window):
+    """Requests in the sliding window ending now, from two fixed-window counts."""
+    overlap = 1 - (now - index * window) / window
+    return previous * overlap + current
+
+
+def sliding_window_hit(state, now, window, limit):
+    """``(limited, new_state)`` for a ``(window_index, current, previous)`` state."""
+    index = int(now // window)
+    current = previous = 0
+    if state is not None:
+        start, count, before = state
+        if start == index:
+            current, previous = count, before
+        elif start == index - 1:
+            previous = count
+    if _window_estimate(previous, current, now, index, window) >= limit:
+        return True, (index, current, previous)
+    return False, (index, current + 1, previous)
+
+
+def token_bucket_hit(state, now, window, limit):
+    """``(limited, new_state)`` for a ``(tokens, last_refill)`` state."""
+    tokens, last = state if state is not None else (limit, now)
+    tokens = min(limit, tokens + (now - last) * limit / window)
+    if tokens < 1:
+        return True, (tokens, now)
+    return False, (tokens - 1, now)
+
+
+ALGORITHMS = {
+    'sliding_window': sliding_window_hit,
+    'token_bucket': token_bucket_hit,
+}
+
+
+class MemoryLimiter:
+    shared = False
+
+    def __init__(self, limit, window, algorithm='sliding_window', max_keys=50000):
+        if algorithm not in ALGORITHMS:
+            raise ImproperlyConfigured(f"Unknown RATE_LIMIT_ALGORITHM {algorithm!r}")
+        self.limit = limit
+        self.window = window
+        self._hit = ALGORITHMS[algorithm]
+        self._state = LRUCache(maxsize=max_keys, ttl=2 * window)
+
+    def hit(self, key):
+        """Count a request from ``key``; True if it is over the limit."""
+        now = time.time()
+        return self._state.update(key, lambda state: self._hit(state, now, self.window, self.limit))
+
+    def clear(self):
+        self._state.clear()
+
+    def __len__(self):
+        return len(self._state)
+
+
+def _hashed(key):
+    # Client-supplied (X-Forwarded-For), so keep it short and cache-key safe
+    return hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
+
+
+class CacheLimiter:
+    shared = True
+
+    def __init__(self, limit, window, alias='default'):
+        self.limit = limit
+        self.window = window
+        self.alias = alias
+
+    def hit(self, key):
+        from django.core.cache import caches
+
+        cache = caches[self.alias]
+        now = time.time()
+        index = int(now // self.window)
+        prefix = f"ratelimit:{_hashed(key)}"
+        current_key, previous_key = f"{prefix}:{index}", f"{prefix}:{index - 1}"
+        try:
+            counts = cache.get_many([current_key, previous_key])
+            estimate = _window_estimate(counts.get(previous_key, 0), counts.get(current_key, 0),
+                                        now, index, self.window)
+            if estimate >= self.limit:
+                return True
+            if not cache.add(current_key, 1, timeout=2 * self.window):
+                cache.incr(current_key)
+        except Exception as e:
+            logger.warning(f"Rate limit cache unavailable, allowing request: {e}")
+        return False
+
+    def clear(self):
+        pass  # entries expire on their own
+
+
+class DatabaseLimiter:
+    shared = True
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._hits = 0
+        self._hits_lock = threading.Lock()
+
+    def hit(self, key):
+        from .models import RateLimitCounter
+
+        now = time.time()
+        index = int(now // self.window)
+        key = _hashed(key)
+        try:
+            counts = dict(RateLimitCounter.objects.filter(key=key, window__in=(index - 1, index))
+                          .values_list('window', 'count'))
+            estimate = _window_estimate(counts.get(index - 1, 0), counts.get(index, 0), now, index, self.window)
+            if estimate >= self.limit:
+                return True
+            counters = RateLimitCounter.objects.filter(key=key, window=index)
+            if not counters.update(count=F('count') + 1):
+                try:
+                    with transaction.atomic():
+                        RateLimitCounter.objects.create(key=key, window=index, count=1)
+                except IntegrityError:  # another worker created it first
+                    counters.update(count=F('count') + 1)
+            self._maybe_purge(index)
+        except DatabaseError as e:
+            logger.warning(f"Rate limit table unavailable, allowing request: {e}")
+        return False
+
+    def _maybe_purge(self, index):
+        with self._hits_lock:
+            self._hits += 1
+            if self._hits % PURGE_EVERY:
+                return
+        from .models import RateLimitCounter
+        RateLimitCounter.objects.filter(window__lt=index - 1).delete()
+
+    def clear(self):
+        from .models import RateLimitCounter
+        RateLimitCounter.objects.all().delete()
+
+
+def _build_limiter():
+    limit = getattr(settings, 'RATE_LIMIT_MAX_REQUESTS', 20)
+    window = getattr(settings, 'RATE_LIMIT_WINDOW', 60)
+    backend = getattr(settings, 'RATE_LIMIT_BACKEND', 'memory')
+    if backend == 'memory':
+        return MemoryLimiter(
+            limit, window,
+            algorithm=getattr(settings, 'RATE_LIMIT_ALGORITHM', 'sliding_window'),
+            max_keys=getattr(settings, 'RATE_LIMIT_MAX_KEYS', 50000),
+        )
+    if backend == 'cache':
+        return CacheLimiter(limit, window, alias=getattr(settings, 'RATE_LIMIT_CACHE_ALIAS', 'default'))
+    if backend == 'database':
+        return DatabaseLimiter(limit, window)
+    raise ImproperlyConfigured(f"Unknown RATE_LIMIT_BACKEND {backend!r}")
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = _build_limiter()
+    return _limiter
+
+
+def is_rate_limited(key):
+    return get_limiter().hit(key)
+
+
+async def ais_rate_limited(key):
+    limiter = get_limiter()
+    if limiter.shared:
+        # Cache and database clients block, and Django's ORM refuses to run on the event loop
+        return await sync_to_async(limiter.hit)(key)
+    return limiter.hit(key)
+
+
+def reset():
+    """Forget every client and rebuild the limiter from settings (tests)."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is not None:
+            _limiter.clear()
+        _limiter = None
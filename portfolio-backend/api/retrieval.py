@@ -0,0 +1,169 @@
+"""
+Section-level retrieval over the knowledge base.
+
+``KNOWLEDGE_BASE`` is split into chunks at import: one per ``##`` section, and
+one per numbered entry in sections that have them (work experience, projects).
+An in-memory BM25 index over those chunks picks the ``KB_RETRIEVAL_TOP_K``
+most relevant ones for a question, so the system prompt only carries what the
+answer needs. The title line and the ``KB_ALWAYS_INCLUDE`` sections are always
+sent, and a question that matches nothing (e.g. "tell me about yourself") gets
+the whole knowledge base, as before.
+"""
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+
+from .knowledge_base import KNOWLEDGE_BASE
+
+K1 = 1.5
+B = 0.75
+
+# Words visitors use for a section that its text doesn't contain. Indexed with
+# the section, never sent to the provider.
+SECTION_KEYWORDS = {
+    'Profile': "summary background",
+    'Personal Information': "age old born live hometown family parents hobby hobbies free time languages speak",
+    'Education': "study studied college university degree school graduate graduation marks cgpa qualification",
+    'Technical Skills': "skills skill tech stack technologies tools frameworks know programming coding",
+    'Work Experience': "work worked job jobs company companies employer experience career internship role",
+    'Projects': "project projects built build made developed portfolio github",
+    'Professional Goals': "goals goal future plans aspire aspiration looking hire hiring open roles career",
+    'Achievements': "achievements awards certifications certificates accomplishments proud leetcode",
+    'Contact Information': "contact reach email mail phone call linkedin connect hire available",
+}
+
+STOPWORDS = frozenset("""
+a an and are as at be by can could did do does for from had has have how i in is it me my of on or
+about please tell that the this to was what when where which who why will with would you your yourself
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9+#]+")
+_NUMBERED_ENTRY = re.compile(r"^\d+\.\s", re.MULTILINE)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class Chunk:
+    def __init__(self, section, heading, text, order):
+        self.section = section  # section name without "##" and ":"
+        self.heading = heading  # the "## Section:" line
+        self.text = text
+        self.order = order  # position in the knowledge base
+
+
+def split_sections(kb):
+    """``(title, [Chunk])``: the text before the first ``##`` and the section/entry chunks."""
+    parts = re.split(r"^(## .*)$", kb.strip(), flags=re.MULTILINE)
+    title = parts[0].strip()
+    chunks = []
+    for heading, body in zip(parts[1::2], parts[2::2]):
+        section = heading[3:].strip().rstrip(':')
+        body = body.strip()
+        starts = [m.start() for m in _NUMBERED_ENTRY.finditer(body)]
+        if starts:
+            intro = body[:starts[0]].strip()
+            if intro:
+                chunks.append(Chunk(section, heading, intro, len(chunks)))
+            for start, end in zip(starts, starts[1:] + [len(body)]):
+                chunks.append(Chunk(section, heading, body[start:end].strip(), len(chunks)))
+        else:
+            chunks.append(Chunk(section, heading, body, len(chunks)))
+    return title, chunks
+
+
+class BM25Index:
+    def __init__(self, documents):
+        self.doc_freqs = [Counter(tokenize(doc)) for doc in documents]
+        self.doc_lengths = [sum(freqs.values()) for freqs in self.doc_freqs]
+        self.avg_length = sum(self.doc_lengths) / len(documents) if documents else 0
+        df = Counter(term for freqs in self.doc_freqs for term in freqs)
+        n = len(documents)
+        self.idf = {term: math.log(1 + (n - count + 0.5) / (count + 0.5)) for term, count in df.items()}
+
+    def scores(self, query):
+        terms = [t for t in set(tokenize(query)) if t in self.idf]
+        scores = []
+        for freqs, length in zip(self.doc_freqs, self.doc_lengths):
+            score = 0.0
+            norm = K1 * (1 - B + B * length / self.avg_length)
+            for term in terms:
+                tf = freqs.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (K1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+
+TITLE, CHUNKS = split_sections(KNOWLEDGE_BASE)
+_index = BM25Index([
+    f"{chunk.section} {SECTION_KEYWORDS.get(chunk.section, '')} {chunk.text}" for chunk in CHUNKS
+])
+
+
+def _always_included():
+    names = getattr(settings, 'KB_ALWAYS_INCLUDE', ['Profile'])
+    return {name.strip().lower() for name in names if name.strip()}
+
+
+def select_chunks(query, top_k=None):
+    """The chunks to send for ``query``, in knowledge-base order (all of them if nothing matches)."""
+    if top_k is None:
+        top_k = getattr(settings, 'KB_RETRIEVAL_TOP_K', 4)
+    scores = _index.scores(query)
+    ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: -scores[i])
+    if not ranked:
+        return list(CHUNKS)
+    always = _always_included()
+    chosen = set(ranked[:top_k])
+    chosen.update(c.order for c in CHUNKS if c.section.lower() in always)
+    return [c for c in CHUNKS if c.order in chosen]
+
+
+def section_scores(query):
+    """``{section: summed BM25 score of its chunks}`` for the sections ``query`` matches."""
+    by_section = {}
+    for chunk, score in zip(CHUNKS, _index.scores(query)):
+        if score > 0:
+            by_section[chunk.section] = by_section.get(chunk.section, 0.0) + score
+    return by_section
+
+
+def render(chunks):
+    """Knowledge-base text for ``chunks``, keeping each section heading once."""
+    lines = [TITLE]
+    heading = None
+    for chunk in chunks:
+        if chunk.heading != heading:
+            heading = chunk.heading
+            lines.append(f"\n{heading}")
+        lines.append(chunk.text)
+    return "\n".join(lines) + "\n"
+
+
+def relevant_chunks(question, context=""):
+    """Positions of the chunks to send for a question, or None for the whole knowledge base.
+
+    ``context`` (the previous question) helps with follow-ups.
+    """
+    if not getattr(settings, 'KB_RETRIEVAL_ENABLED', True):
+        return None
+    chunks = select_chunks(f"{question} {context}")
+    if len(chunks) == len(CHUNKS):
+        return None
+    return tuple(c.order for c in chunks)
+
+
+def knowledge_text(chunk_ids):
+    """Knowledge-base text for :func:`relevant_chunks`' result."""
+    if chunk_ids is None:
+        return KNOWLEDGE_BASE
+    return render([CHUNKS[i] for i in chunk_ids])
+
+
+def relevant_knowledge(question, context=""):
+    """Knowledge-base text for a question."""
+    return knowledge_text(relevant_chunks(question, context))
@@ -0,0 +1,166 @@
+"""
+Intent routing: how much model a question needs.
+
+Every question used to get the large Groq model and a 2048-token limit, "hi"
+included. :func:`route` classifies the question locally (weighted n-gram cues
+plus the BM25 section scores of :mod:`.retrieval`) into one of:
+
+- ``contact``: answered from the *Contact Information* section, no provider;
+- ``greeting``: small talk, small model tier, short reply;
+- ``factual``: a short question about one thing, small model tier;
+- ``open``: everything else, the large model and the full reply length.
+
+The small tier swaps Groq's model for ``ROUTER_SMALL_MODEL``; the other
+providers keep theirs. ``ROUTER_MAX_TOKENS`` sets the reply limit per intent
+for every provider.
+
+Each decision is logged and counted in ``chat_routes_total``, and
+``chat_route_latency_seconds`` times the answers per route, so the cues and
+limits can be tuned against what they cost.
+"""
+import logging
+
+from django.conf import settings
+
+from . import metrics
+from .answer_cache import normalize_question
+from .fast_path import PROVIDER
+from .retrieval import CHUNKS, section_scores
+
+logger = logging.getLogger(__name__)
+
+SMALL = 'small'
+LARGE = 'large'
+TIERS = {'greeting': SMALL, 'factual': SMALL, 'open': LARGE}
+DEFAULT_MAX_TOKENS = {'greeting': 150, 'factual': 400, 'open': 2048}
+FOCUS = 0.6  # share of the BM25 score in one section that makes a question a lookup
+
+# intent -> {word n-gram: weight}, matched on the normalized question
+_CUES = {
+    'greeting': {
+        'hi': 2, 'hii': 2, 'hello': 2, 'hey': 2, 'yo': 1, 'hola': 2, 'namaste': 2, 'good morning': 2,
+        'good afternoon': 2, 'good evening': 2, 'how are you': 2, 'what s up': 2, 'nice to meet you': 2,
+        'thanks': 2, 'thank you': 2, 'bye': 2, 'goodbye': 2, 'ok': 1, 'okay': 1, 'cool': 1, 'great': 1,
+        'nice': 1, 'awesome': 1,
+    },
+    'contact': {
+        'contact': 3, 'email': 3, 'e mail': 3, 'mail': 2, 'phone': 3, 'number': 1, 'reach': 2, 'reach out': 1,
+        'get in touch': 3, 'linkedin': 2, 'call': 1, 'connect': 1,
+    },
+    'factual': {
+        'what is': 1, 'what s': 1, 'what was': 1, 'where': 1.5, 'when': 1.5, 'which': 1, 'who': 1,
+        'how old': 2, 'how many': 1.5, 'how long': 1.5, 'do you': 0.5, 'are you': 0.5, 'did you': 0.5,
+        'your age': 2, 'your name': 2, 'name of': 1,
+    },
+    'open': {
+        'why': 2, 'how did': 1.5, 'how do': 1.5, 'how would': 1.5, 'explain': 2, 'describe': 2,
+        'tell me about': 1.5, 'tell me more': 2, 'walk me through': 2, 'what do you think': 2, 'think': 1,
+        'opinion': 2, 'compare': 2, 'difference': 1.5, 'advice': 2, 'challenge': 1.5, 'challenges': 1.5,
+        'approach': 1.5, 'learned': 1.5, 'story': 2, 'yourself': 1.5, 'elaborate': 2, 'in detail': 2,
+        'in depth': 2, 'more about': 1.5,
+    },
+}
+_LONGEST_CUE = max(len(cue.split()) for cues in _CUES.values() for cue in cues)
+
+
+def _contact_details():
+    details = {}
+    for chunk in CHUNKS:
+        if chunk.section == 'Contact Information':
+            for line in chunk.text.splitlines():
+                key, _, value = line.strip().lstrip('- ').partition(':')
+                if value.strip():
+                    details[key.strip().lower()] = value.strip()
+    return details
+
+
+def _contact_reply(details):
+    if 'email' not in details:
+        return None
+    reach = f"You can reach me at {details['email']}"
+    if 'phone' in details:
+        reach += f" or {details['phone']}"
+    profiles = [f"{name} ({details[name.lower()]})" for name in ('LinkedIn', 'GitHub') if name.lower() in details]
+    also = f" I'm also on {' and '.join(profiles)}." if profiles else ""
+    return f"{reach}.{also} Looking forward to hearing from you!"
+
+
+CONTACT_REPLY = _contact_reply(_contact_details())
+
+
+class Route:
+    """Where a question goes: model ``tier``, reply ``max_tokens``, or a ready ``answer``."""
+
+    def __init__(self, intent, tier=LARGE, max_tokens=None, answer=None):
+        self.intent = intent
+        self.tier = tier
+        self.max_tokens = max_tokens
+        self.answer = answer  # {'reply', 'provider'} for a templated intent
+
+    def as_dict(self):
+        return {'intent': self.intent, 'tier': self.tier, 'max_tokens': self.max_tokens}
+
+
+def _ngrams(words):
+    for size in range(1, _LONGEST_CUE + 1):
+        for i in range(len(words) - size + 1):
+            yield " ".join(words[i:i + size])
+
+
+def cue_scores(words):
+    """``{intent: summed weight of its cues}`` for the normalized question words."""
+    scores = dict.fromkeys(_CUES, 0.0)
+    for gram in _ngrams(words):
+        for intent, cues in _CUES.items():
+            scores[intent] += cues.get(gram, 0)
+    return scores
+
+
+def section_focus(question):
+    """``(section, share)``: the knowledge-base section the question matches most, and its share of the score."""
+    by_section = section_scores(question)
+    if not by_section:
+        return None, 0.0
+    section = max(by_section, key=by_section.get)
+    return section, by_section[section] / sum(by_section.values())
+
+
+def classify(question):
+    """``'contact'``, ``'greeting'``, ``'factual'`` or ``'open'``."""
+    words = normalize_question(question).split()
+    if not words or len(words) > getattr(settings, 'ROUTER_MAX_WORDS', 12):
+        return 'open'
+    scores = cue_scores(words)
+    section, share = section_focus(question)
+    if scores['contact'] >= 2 and scores['contact'] > scores['open'] and section == 'Contact Information':
+        return 'contact'
+    if scores['greeting'] and section is None and not scores['open']:
+        return 'greeting'
+    if share >= FOCUS:
+        scores['factual'] += 1
+    if scores['factual'] > scores['open']:
+        return 'factual'
+    return 'open'
+
+
+def route(question):
+    """The :class:`Route` for a question, or None with the router off (provider defaults)."""
+    if not getattr(settings, 'ROUTER_ENABLED', True):
+        return None
+    intent = classify(question)
+    if intent == 'contact' and CONTACT_REPLY:
+        chosen = Route(intent, tier='template', answer={'reply': CONTACT_REPLY, 'provider': PROVIDER})
+    else:
+        if intent == 'contact':
+            intent = 'factual'
+        limits = getattr(settings, 'ROUTER_MAX_TOKENS', DEFAULT_MAX_TOKENS)
+        chosen = Route(intent, TIERS[intent], limits.get(intent, DEFAULT_MAX_TOKENS[intent]))
+    metrics.ROUTES.inc(chosen.intent, chosen.tier)
+    logger.info(f"Routed as {chosen.intent} (tier {chosen.tier}, max_tokens {chosen.max_tokens})")
+    return chosen
+
+
+def record_answer(chosen, seconds):
+    """Time to the answer for a routed question (to the first token when streaming)."""
+    if chosen is not None:
+        metrics.ROUTE_LATENCY.observe(seconds, chosen.intent, chosen.tier)
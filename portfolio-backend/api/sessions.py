@@ -0,0 +1,180 @@
+"""
+Server-side conversation sessions.
+
+Clients used to resend the whole conversation with every question, and every
+request re-parsed and re-normalized up to ``MAX_HISTORY_TURNS`` turns. A
+client that sends ``session_id`` (``null`` to start one) gets an id back with
+the reply, and from then on only needs to send the new question and the
+latest id it got: the normalized turns are kept here.
+
+Sessions live in an in-process LRU (``CHAT_SESSION_MEMORY_SIZE`` of them) and
+are written through to the ``ChatSession`` table, so a session evicted from
+memory, or started on another worker, is read back from SQLite. Each write
+bumps the session's version, and the id the client sees ends in it
+(``<session>.<version>``); a worker whose memory copy has a different version
+is behind another worker and reads the database instead. (The turn count
+won't do: it stops changing once ``CHAT_SESSION_MAX_TURNS`` is reached.) Both
+tiers expire a session ``CHAT_SESSION_TTL`` seconds after its last question, and
+expired rows are deleted at most every ``CHAT_SESSION_PURGE_SECONDS``.
+
+An unknown or expired id gets a fresh session (``expired`` set), seeded with
+whatever ``history`` the client sent. A client that sent only the id has lost
+its context that way, so the views answer it with 409 ``session_expired`` and
+it resends the question with the full history.
+"""
+import json
+import logging
+import re
+import secrets
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils import timezone
+
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+_CLIENT_ID = re.compile(r"^([A-Za-z0-9_-]{16,64})\.(\d+)$")
+
+_memory = LRUCache(
+    maxsize=getattr(settings, 'CHAT_SESSION_MEMORY_SIZE', 5000),
+    ttl=getattr(settings, 'CHAT_SESSION_TTL', 24 * 3600),
+)
+_last_purge = time.monotonic()
+_purge_lock = threading.Lock()
+
+
+class Session:
+    def __init__(self, session_id, turns=None, expired=False, version=0):
+        self.id = session_id
+        self.turns = turns  # normalized {role, content} turns, or None for a new session
+        self.version = version  # writes so far
+        self.expired = expired  # the client sent an id this server doesn't (or no longer) know
+
+    @property
+    def is_new(self):
+        return self.turns is None
+
+    @property
+    def client_id(self):
+        """What the client sends back next time."""
+        return f"{self.id}.{self.version}"
+
+    def _after(self, question, reply):
+        turns = [*(self.turns or ()), {'role': 'user', 'content': question}, {'role': 'assistant', 'content': reply}]
+        return turns[-getattr(settings, 'CHAT_SESSION_MAX_TURNS', 50):]
+
+    def record(self, question, reply):
+        """Add one question and its reply to the session."""
+        self.turns = self._after(question, reply)
+        self.version += 1
+        _memory.set(self.id, (self.version, tuple(self.turns)))
+        _persist(self.id, self.turns, self.version)
+
+    async def arecord(self, question, reply):
+        self.turns = self._after(question, reply)
+        self.version += 1
+        _memory.set(self.id, (self.version, tuple(self.turns)))
+        await sync_to_async(_persist)(self.id, self.turns, self.version)
+
+
+def _new_id():
+    return secrets.token_urlsafe(16)
+
+
+def _ttl():
+    return getattr(settings, 'CHAT_SESSION_TTL', 24 * 3600)
+
+
+def _from_memory(client_id):
+    """``(session_id, (version, turns))``: the stored state if memory has the client's version, else None.
+
+    ``session_id`` is None for a missing or malformed client id.
+    """
+    match = _CLIENT_ID.match(client_id) if isinstance(client_id, str) else None
+    if match is None:
+        return None, None
+    session_id, version = match[1], int(match[2])
+    stored = _memory.get(session_id)
+    if stored is not None and stored[0] == version:
+        return session_id, (version, list(stored[1]))
+    return session_id, None
+
+
+def _from_database(session_id):
+    from .models import ChatSession
+    try:
+        row = ChatSession.objects.filter(
+            session_id=session_id, updated_at__gte=timezone.now() - timedelta(seconds=_ttl()),
+        ).first()
+    except DatabaseError as e:
+        logger.warning(f"Session lookup failed: {e}")
+        return None
+    if row is None:
+        return None
+    turns = json.loads(row.turns)
+    _memory.set(session_id, (row.version, tuple(turns)))
+    return row.version, turns
+
+
+def load(client_id):
+    """The :class:`Session` for a client-sent id; unknown, expired or invalid ids get a new one."""
+    session_id, stored = _from_memory(client_id)
+    if session_id is not None and stored is None:
+        stored = _from_database(session_id)
+    return _session(session_id, stored, client_id)
+
+
+async def aload(client_id):
+    session_id, stored = _from_memory(client_id)
+    if session_id is not None and stored is None:
+        stored = await sync_to_async(_from_database)(session_id)
+    return _session(session_id, stored, client_id)
+
+
+def _session(session_id, stored, client_id):
+    if stored is not None:
+        version, turns = stored
+        return Session(session_id, turns, version=version)
+    return Session(_new_id(), expired=client_id is not None)
+
+
+def _persist(session_id, turns, version):
+    from .models import ChatSession
+    try:
+        ChatSession.objects.update_or_create(session_id=session_id,
+                                             defaults={'turns': json.dumps(turns), 'version': version})
+    except DatabaseError as e:
+        logger.warning(f"Session store failed: {e}")  # still in memory
+        return
+    _maybe_purge()
+
+
+def _maybe_purge():
+    global _last_purge
+    with _purge_lock:
+        if time.monotonic() - _last_purge < getattr(settings, 'CHAT_SESSION_PURGE_SECONDS', 3600):
+            return
+        _last_purge = time.monotonic()
+    purge()
+
+
+def purge():
+    """Delete the sessions whose TTL ran out; returns how many."""
+    from .models import ChatSession
+    try:
+        deleted, _ = ChatSession.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=_ttl())).delete()
+    except DatabaseError as e:
+        logger.warning(f"Session purge failed: {e}")
+        return 0
+    return deleted
+
+
+def reset():
+    """Clear the memory tier (tests)."""
+    _memory.clear()
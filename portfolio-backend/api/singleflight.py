@@ -0,0 +1,282 @@
+"""
+Single-flight: concurrent identical chats share one provider cascade.
+
+When the portfolio link gets shared, many visitors send the same suggested
+question within seconds, and each request would start its own identical
+upstream call. Requests are keyed on the fully assembled provider messages
+plus the router's tier and reply limit. The first one (the leader) runs the
+cascade, and the ones that arrive while it is in flight wait for its outcome:
+the same reply, or the same error. A waiter gives up with :class:`WaitTimeout`
+when its own request budget runs out.
+
+Streams are shared the same way: the leader's events are recorded as they are
+produced and every waiter replays them from the start. If the leader's client
+disconnects while others are waiting, the sync leader reads the rest of the
+upstream stream for them; the async one runs as its own task anyway.
+
+Only requests in the same process are coalesced. Set ``SINGLE_FLIGHT_ENABLED``
+to 0 to turn it off.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_calls = {}  # key -> _Call (sync views)
+_streams = {}  # key -> _Stream (sync stream view)
+_tasks = {}  # key -> asyncio.Task (async view)
+_astreams = {}  # key -> _AsyncStream (async stream view)
+
+
+class WaitTimeout(Exception):
+    """The shared call didn't finish within the waiting request's budget."""
+
+
+def key(messages, route=None):
+    """Key for the assembled provider messages, or None with single-flight off."""
+    if not getattr(settings, 'SINGLE_FLIGHT_ENABLED', True):
+        return None
+    limits = route.as_dict() if route is not None else None
+    return hashlib.sha256(json.dumps([messages, limits], sort_keys=True).encode()).hexdigest()
+
+
+def _count(leader):
+    metrics.SINGLE_FLIGHT.inc('leader' if leader else 'follower')
+
+
+def _join(flights, flight_key, factory):
+    """``(flight, is_leader)``: the flight in progress for the key, or a new one led by the caller."""
+    with _lock:
+        flight = flights.get(flight_key)
+        leader = flight is None
+        if leader:
+            flight = flights[flight_key] = factory()
+        else:
+            flight.waiters += 1
+    _count(leader)
+    return flight, leader
+
+
+def _leave(flights, flight_key, flight):
+    """Stop new requests from joining; returns how many joined."""
+    with _lock:
+        if flights.get(flight_key) is flight:
+            del flights[flight_key]
+        return flight.waiters
+
+
+# === Sync views ===
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+def do(flight_key, func, timeout=None):
+    """``func()``, run once for every concurrent caller with the same key."""
+    if flight_key is None:
+        return func()
+    call, leader = _join(_calls, flight_key, _Call)
+    if not leader:
+        if not call.done.wait(timeout):
+            raise WaitTimeout("Timed out waiting for an identical request")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = func()
+        return call.result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        _leave(_calls, flight_key, call)
+        call.done.set()
+
+
+class _Stream:
+    def __init__(self):
+        self.events = []
+        self.finished = False
+        self.changed = threading.Condition()
+        self.waiters = 0
+
+    def publish(self, event):
+        with self.changed:
+            self.events.append(event)
+            self.changed.notify_all()
+
+    def finish(self):
+        with self.changed:
+            self.finished = True
+            self.changed.notify_all()
+
+    def replay(self, first_timeout, gap_timeout):
+        sent = 0
+        while True:
+            with self.changed:
+                ready = self.changed.wait_for(lambda: len(self.events) > sent or self.finished,
+                                              first_timeout if sent == 0 else gap_timeout)
+                if not ready:
+                    raise WaitTimeout("Timed out waiting for an identical stream")
+                new = self.events[sent:]
+                finished = self.finished
+            sent += len(new)
+            yield from new
+            if finished:
+                return
+
+
+def _gap_timeout():
+    # The leader's own reads wait at most this long between two chunks
+    return getattr(settings, 'LLM_HTTP_READ_TIMEOUT', 30)
+
+
+def stream(flight_key, events, first_timeout=None):
+    """The items of ``events()``, produced once for every concurrent caller with the same key.
+
+    A waiter raises :class:`WaitTimeout` after ``first_timeout`` without the
+    first item, or ``LLM_HTTP_READ_TIMEOUT`` between two.
+    """
+    if flight_key is None:
+        yield from events()
+        return
+    flight, leader = _join(_streams, flight_key, _Stream)
+    if not leader:
+        yield from flight.replay(first_timeout, _gap_timeout())
+        return
+
+    source = events()
+    try:
+        for event in source:
+            flight.publish(event)
+            yield event
+    finally:
+        if _leave(_streams, flight_key, flight) and not flight.finished:
+            _drain(source, flight)
+        source.close()
+        flight.finish()
+
+
+def _drain(source, flight):
+    # The leader's client went away; the others still want the rest
+    try:
+        for event in source:
+            flight.publish(event)
+    except Exception as e:
+        logger.warning(f"Shared stream broke off: {e}")
+
+
+# === Async views ===
+def _forget_task(flight_key, task):
+    if _tasks.get(flight_key) is task:
+        del _tasks[flight_key]
+    if not task.cancelled():
+        task.exception()  # retrieved, even if every waiter timed out
+
+
+async def ado(flight_key, afunc, timeout=None):
+    """``await afunc()``, run once (as a task) for every concurrent caller with the same key.
+
+    The task outlives a caller that times out or disconnects, so the others
+    still get its result.
+    """
+    if flight_key is None:
+        return await afunc()
+    loop = asyncio.get_running_loop()
+    task = _tasks.get(flight_key)
+    leader = task is None or task.get_loop() is not loop
+    if leader:
+        task = _tasks[flight_key] = loop.create_task(afunc())
+        task.add_done_callback(lambda done: _forget_task(flight_key, done))
+    _count(leader)
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        raise WaitTimeout("Timed out waiting for an identical request") from None
+
+
+class _AsyncStream:
+    def __init__(self, loop):
+        self.loop = loop
+        self.events = []
+        self.finished = False
+        self.changed = asyncio.Event()
+        self.producer = None
+
+    def publish(self, event):
+        self.events.append(event)
+        self._notify()
+
+    def finish(self):
+        self.finished = True
+        self._notify()
+
+    def _notify(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def replay(self, first_timeout, gap_timeout):
+        sent = 0
+        while True:
+            if sent < len(self.events):
+                event = self.events[sent]
+                sent += 1
+                yield event
+            elif self.finished:
+                return
+            else:
+                try:
+                    await asyncio.wait_for(self.changed.wait(), first_timeout if sent == 0 else gap_timeout)
+                except asyncio.TimeoutError:
+                    raise WaitTimeout("Timed out waiting for an identical stream") from None
+
+
+async def _produce(flight_key, flight, events):
+    try:
+        async for event in events:
+            flight.publish(event)
+    except Exception as e:
+        logger.warning(f"Shared stream broke off: {e}")
+    finally:
+        if _astreams.get(flight_key) is flight:
+            del _astreams[flight_key]
+        flight.finish()
+
+
+async def astream(flight_key, events, first_timeout=None):
+    """Async twin of :func:`stream`; ``events()`` returns an async iterator.
+
+    The producer runs as its own task, so the stream completes (and gets
+    cached) even if the client that started it disconnects.
+    """
+    if flight_key is None:
+        async for event in events():
+            yield event
+        return
+    loop = asyncio.get_running_loop()
+    flight = _astreams.get(flight_key)
+    leader = flight is None or flight.loop is not loop
+    if leader:
+        flight = _astreams[flight_key] = _AsyncStream(loop)
+        flight.producer = loop.create_task(_produce(flight_key, flight, events()))  # keep a reference
+    _count(leader)
+    async for event in flight.replay(first_timeout, _gap_timeout()):
+        yield event
+
+
+def in_flight():
+    """Keys being computed right now, by kind (health checks and tests)."""
+    with _lock:
+        return {'calls': len(_calls), 'streams': len(_streams), 'tasks': len(_tasks), 'async_streams': len(_astreams)}
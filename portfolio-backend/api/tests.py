@@ -1,13 +1,38 @@
 import json
-from unittest.mock import patch, MagicMock
-from django.test import TestCase, RequestFactory
+import asyncio
+import time
+import unittest
+from unittest.mock import patch, MagicMock, AsyncMock
+import httpx
+import requests
+from django.test import TestCase, RequestFactory, override_settings
+from django.conf import settings
 from api.views import (
-    chat_view, get_client_ip, is_rate_limited,
-    _rate_limit_cache, RATE_LIMIT_MAX_REQUESTS,
+    achat_view, chat_stream_view, chat_view, get_client_ip,
     MAX_QUESTION_LENGTH,
 )
-from api import prompts
+from api import (
+    answer_cache, breaker, clients, fast_path, hedging, history, metrics, payloads, prompts, providers,
+    quota, ranking, ratelimit, retrieval, router, semantic_cache, sessions, singleflight, view_counter,
+)
+from api.ratelimit import is_rate_limited
+from api.deadline import Deadline, DeadlineExceeded
 from api.knowledge_base import KNOWLEDGE_BASE
+from api.models import CachedAnswer, ChatSession, ViewCounter
+
+
+class StateTestCase(TestCase):
+    """Resets process-wide state (rate limits, breakers, provider ranking, answer cache) before and after each test."""
+
+    def setUp(self):
+        self._reset()
+        self.addCleanup(self._reset)
+
+    def _reset(self):
+        ratelimit.reset()
+        breaker.reset_all()
+        ranking.reset()
+        answer_cache.reset()
 
 
 class KnowledgeBaseTest(TestCase):
@@ -70,27 +95,109 @@ class GetClientIpTest(TestCase):
         self.assertEqual(get_client_ip(request), '192.168.1.1')
 
 
-class RateLimitTest(TestCase):
+class RateLimitTest(StateTestCase):
     """Test the in-memory rate limiter."""
 
-    def setUp(self):
-        _rate_limit_cache.clear()
-
     def test_allows_requests_under_limit(self):
-        for _ in range(RATE_LIMIT_MAX_REQUESTS - 1):
+        for _ in range(settings.RATE_LIMIT_MAX_REQUESTS - 1):
             self.assertFalse(is_rate_limited('test-ip'))
 
     def test_blocks_at_limit(self):
-        for _ in range(RATE_LIMIT_MAX_REQUESTS):
+        for _ in range(settings.RATE_LIMIT_MAX_REQUESTS):
             is_rate_limited('rate-test-ip')
         self.assertTrue(is_rate_limited('rate-test-ip'))
 
     def test_different_ips_independent(self):
-        for _ in range(RATE_LIMIT_MAX_REQUESTS):
+        for _ in range(settings.RATE_LIMIT_MAX_REQUESTS):
             is_rate_limited('ip-a')
         self.assertTrue(is_rate_limited('ip-a'))
         self.assertFalse(is_rate_limited('ip-b'))
 
+    def test_sliding_window_weights_previous_window(self):
+        state = None
+        for _ in range(10):
+            limited, state = ratelimit.sliding_window_hit(state, 59.0, 60, 10)
+            self.assertFalse(limited)
+        # A quarter into the next window, 75% of the previous window still counts: 7.5 of 10
+        for _ in range(3):
+            limited, state = ratelimit.sliding_window_hit(state, 75.0, 60, 10)
+            self.assertFalse(limited)
+        limited, state = ratelimit.sliding_window_hit(state, 75.0, 60, 10)
+        self.assertTrue(limited)
+        self.assertFalse(ratelimit.sliding_window_hit(state, 240.0, 60, 10)[0])
+
+    def test_token_bucket_refills(self):
+        state = None
+        for _ in range(10):
+            limited, state = ratelimit.token_bucket_hit(state, 0.0, 60, 10)
+            self.assertFalse(limited)
+        self.assertTrue(ratelimit.token_bucket_hit(state, 0.0, 60, 10)[0])
+        self.assertFalse(ratelimit.token_bucket_hit(state, 6.0, 60, 10)[0])  # one token back after 6s
+
+    def test_token_bucket_algorithm_setting(self):
+        with self.settings(RATE_LIMIT_ALGORITHM='token_bucket', RATE_LIMIT_MAX_REQUESTS=2):
+            ratelimit.reset()
+            self.assertFalse(is_rate_limited('bucket-ip'))
+            self.assertFalse(is_rate_limited('bucket-ip'))
+            self.assertTrue(is_rate_limited('bucket-ip'))
+        ratelimit.reset()
+
+    def test_memory_is_bounded(self):
+        limiter = ratelimit.MemoryLimiter(limit=5, window=60, max_keys=100)
+        for i in range(1000):
+            limiter.hit(f'10.0.{i // 256}.{i % 256}')
+        self.assertEqual(len(limiter), 100)
+
+    def test_concurrent_hits_are_counted_exactly(self):
+        import threading
+        limiter = ratelimit.MemoryLimiter(limit=100, window=60)
+        allowed = []
+
+        def worker():
+            for _ in range(50):
+                if not limiter.hit('shared-ip'):
+                    allowed.append(1)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(allowed), 100)
+
+
+class SharedRateLimitTest(StateTestCase):
+    """Shared backends apply one limit across every worker."""
+
+    def _assert_shared(self, first, second):
+        self.assertFalse(first.hit('shared-ip'))
+        self.assertFalse(second.hit('shared-ip'))
+        self.assertFalse(first.hit('shared-ip'))
+        self.assertTrue(second.hit('shared-ip'))
+        self.assertFalse(first.hit('other-ip'))
+
+    def test_database_backend_is_shared(self):
+        self._assert_shared(ratelimit.DatabaseLimiter(3, 60), ratelimit.DatabaseLimiter(3, 60))
+
+    def test_cache_backend_is_shared(self):
+        from django.core.cache import cache
+        cache.clear()
+        self._assert_shared(ratelimit.CacheLimiter(3, 60), ratelimit.CacheLimiter(3, 60))
+
+    @patch('api.views.acall_groq', new_callable=AsyncMock, return_value='reply')
+    async def test_async_view_with_database_backend(self, mock_groq):
+        with self.settings(RATE_LIMIT_BACKEND='database', RATE_LIMIT_MAX_REQUESTS=1, ANSWER_CACHE_ENABLED=False):
+            ratelimit.reset()
+            statuses = []
+            for _ in range(2):
+                response = await self.async_client.post(
+                    '/api/chat/async/',
+                    data=json.dumps({'question': 'hello'}),
+                    content_type='application/json'
+                )
+                statuses.append(response.status_code)
+        self.assertEqual(statuses, [200, 429])
+
 
 class ChatViewMethodTest(TestCase):
     """Test HTTP method handling."""
@@ -106,12 +213,9 @@ class ChatViewMethodTest(TestCase):
         self.assertEqual(response.status_code, 405)
 
 
-class ChatViewValidationTest(TestCase):
+class ChatViewValidationTest(StateTestCase):
     """Test input validation on the chat endpoint."""
 
-    def setUp(self):
-        _rate_limit_cache.clear()
-
     def test_empty_body_returns_400(self):
         response = self.client.post(
             '/api/chat/',
@@ -168,15 +272,12 @@ class ChatViewValidationTest(TestCase):
         self.assertEqual(response.status_code, 200)
 
 
-class ChatViewRateLimitTest(TestCase):
+class ChatViewRateLimitTest(StateTestCase):
     """Test rate limiting on the chat endpoint."""
 
-    def setUp(self):
-        _rate_limit_cache.clear()
-
     def test_rate_limit_returns_429(self):
         # Fill up the rate limit
-        for _ in range(RATE_LIMIT_MAX_REQUESTS):
+        for _ in range(settings.RATE_LIMIT_MAX_REQUESTS):
             is_rate_limited('127.0.0.1')
 
         response = self.client.post(
@@ -189,12 +290,9 @@ class ChatViewRateLimitTest(TestCase):
         self.assertIn('Too many requests', data['error'])
 
 
-class ChatViewProviderTest(TestCase):
+class ChatViewProviderTest(StateTestCase):
     """Test the cascading provider fallback logic."""
 
-    def setUp(self):
-        _rate_limit_cache.clear()
-
     @patch('api.views.call_groq', return_value='Hello from Groq!')
     def test_successful_response(self, mock_groq):
         response = self.client.post(
@@ -220,6 +318,7 @@ class ChatViewProviderTest(TestCase):
         self.assertIn('Girish Saana', messages[0]['content'])
 
     @patch('api.views.call_groq', return_value='Hello from Groq!')
+    @override_settings(FAST_PATH_ENABLED=False)
     def test_user_question_is_last(self, mock_groq):
         """Verify the user's question is the last message."""
         self.client.post(
@@ -299,3 +398,1870 @@ class ChatViewProviderTest(TestCase):
         self.assertEqual(response.status_code, 503)
         data = json.loads(response.content)
         self.assertIn('unavailable', data['error'])
+
+
+class ProviderClientTest(TestCase):
+    """Test the pooled per-host HTTP sessions."""
+
+    def tearDown(self):
+        clients.close_all()
+
+    def test_same_host_shares_session(self):
+        a = clients.get_session('https://api.groq.com/openai/v1/chat/completions')
+        b = clients.get_session('https://api.groq.com/other')
+        self.assertIs(a, b)
+
+    def test_different_hosts_get_own_session(self):
+        a = clients.get_session('https://api.groq.com/openai/v1/chat/completions')
+        b = clients.get_session('https://openrouter.ai/api/v1/chat/completions')
+        self.assertIsNot(a, b)
+
+    def test_pool_size_from_settings(self):
+        with self.settings(LLM_HTTP_POOL_MAXSIZE=7):
+            session = clients.get_session('https://api.cohere.ai/v1/chat')
+        self.assertEqual(session.get_adapter('https://api.cohere.ai/v1/chat')._pool_maxsize, 7)
+
+    def test_separate_connect_and_read_timeouts(self):
+        with self.settings(LLM_HTTP_CONNECT_TIMEOUT=2, LLM_HTTP_READ_TIMEOUT=25):
+            self.assertEqual(clients.get_timeout(), (2, 25))
+            self.assertEqual(clients.get_timeout(10), (2, 10))
+            self.assertEqual(clients.get_timeout(1), (1, 1))
+
+    @patch.dict('os.environ', {'GROQ_API_KEY': 'test-key'})
+    def test_provider_call_uses_pooled_session(self):
+        from api.views import call_groq
+        session = MagicMock()
+        session.post.return_value.json.return_value = {
+            'choices': [{'message': {'content': 'pooled'}}]
+        }
+        with patch('api.clients.get_session', return_value=session) as get_session:
+            self.assertEqual(call_groq([{'role': 'user', 'content': 'hi'}]), 'pooled')
+        get_session.assert_called_once_with('https://api.groq.com/openai/v1/chat/completions')
+        self.assertIsInstance(session.post.call_args.kwargs['timeout'], tuple)
+
+    def test_warm_up_swallows_network_errors(self):
+        session = MagicMock()
+        session.head.side_effect = requests.ConnectionError('refused')
+        with patch('api.clients.get_session', return_value=session):
+            clients.warm_up(['https://api.groq.com'])
+        session.head.assert_called_once()
+
+    def test_base_urls_are_configurable(self):
+        self.assertEqual(providers._base_url('GROQ_BASE_URL', 'https://api.groq.com/openai/v1'),
+                         'https://api.groq.com/openai/v1')
+        with self.settings(GROQ_BASE_URL='http://127.0.0.1:8001/openai/v1/'):
+            self.assertEqual(providers._base_url('GROQ_BASE_URL', 'https://api.groq.com/openai/v1'),
+                             'http://127.0.0.1:8001/openai/v1')
+        self.assertIn('https://api.cohere.ai', providers.PROVIDER_ORIGINS)
+        self.assertEqual(len(providers.PROVIDER_ORIGINS), 5)
+
+
+class AsyncChatViewTest(StateTestCase):
+    """Test the ASGI chat view and async provider adapters."""
+
+    @patch('api.views.acall_groq', new_callable=AsyncMock, return_value='Hello async!')
+    async def test_successful_response(self, mock_groq):
+        response = await self.async_client.post(
+            '/api/chat/async/',
+            data=json.dumps({'question': 'Who are you?'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['reply'], 'Hello async!')
+        self.assertEqual(data['provider'], 'Groq')
+        messages = mock_groq.call_args[0][0]
+        self.assertEqual(messages[0]['role'], 'system')
+        self.assertEqual(messages[-1]['content'], 'Who are you?')
+
+    @patch('api.views.acall_cohere', new_callable=AsyncMock, return_value='Cohere reply')
+    @patch('api.views.acall_huggingface', new_callable=AsyncMock, side_effect=Exception('HF down'))
+    @patch('api.views.acall_together', new_callable=AsyncMock, side_effect=Exception('Together down'))
+    @patch('api.views.acall_openrouter', new_callable=AsyncMock, side_effect=Exception('OR down'))
+    @patch('api.views.acall_groq', new_callable=AsyncMock, side_effect=ValueError('No key'))
+    async def test_fallback_to_cohere(self, *mocks):
+        response = await self.async_client.post(
+            '/api/chat/async/',
+            data=json.dumps({'question': 'hello'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['provider'], 'Cohere')
+
+    async def test_validation_errors_match_sync_view(self):
+        response = await self.async_client.post(
+            '/api/chat/async/',
+            data='not json at all',
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        response = await self.async_client.get('/api/chat/async/')
+        self.assertEqual(response.status_code, 405)
+
+    @patch.dict('os.environ', {'GROQ_API_KEY': 'test-key'})
+    def test_concurrent_upstream_calls_overlap(self):
+        """Hundreds of in-flight calls should take about one upstream latency, not hundreds."""
+        async def handler(request):
+            await asyncio.sleep(0.05)
+            return httpx.Response(200, json={'choices': [{'message': {'content': 'ok'}}]})
+
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with patch('api.clients.get_async_client', return_value=client):
+                messages = [{'role': 'user', 'content': 'hi'}]
+                return await asyncio.gather(*(providers.acall_groq(messages) for _ in range(200)))
+
+        start = time.perf_counter()
+        replies = asyncio.run(run())
+        self.assertEqual(replies, ['ok'] * 200)
+        self.assertLess(time.perf_counter() - start, 2)
+
+    @patch.dict('os.environ', {'OPENROUTER_API_KEY': 'test-key'})
+    def test_async_openrouter_tries_next_model_on_error(self):
+        seen = []
+
+        def handler(request):
+            model = json.loads(request.content)['model']
+            seen.append(model)
+            if len(seen) == 1:
+                return httpx.Response(503)
+            return httpx.Response(200, json={'choices': [{'message': {'content': model}}]})
+
+        async def run():
+            client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+            with patch('api.clients.get_async_client', return_value=client):
+                return await providers.acall_openrouter([{'role': 'user', 'content': 'hi'}])
+
+        self.assertEqual(asyncio.run(run()), providers.OPENROUTER_FREE_MODELS[1])
+        self.assertEqual(seen, providers.OPENROUTER_FREE_MODELS[:2])
+
+
+class CircuitBreakerTest(StateTestCase):
+    """Test breaker state transitions and how the cascade uses them."""
+
+    def _http_error(self, status):
+        response = MagicMock(status_code=status)
+        return requests.HTTPError(f'{status} error', response=response)
+
+    def test_opens_at_failure_rate(self):
+        with self.settings(BREAKER_MIN_CALLS=4, BREAKER_FAILURE_RATE=0.5):
+            b = breaker.get('Test')
+        for error in (None, None, self._http_error(503)):
+            self.assertTrue(b.allow())
+            b.record(error)
+        self.assertEqual(b.state, breaker.CLOSED)
+        self.assertTrue(b.allow())
+        b.record(requests.Timeout('slow'))
+        self.assertEqual(b.state, breaker.OPEN)
+        self.assertFalse(b.allow())
+
+    def test_client_errors_and_missing_keys_do_not_count(self):
+        with self.settings(BREAKER_MIN_CALLS=2):
+            b = breaker.get('Test')
+        for error in (ValueError('No key'), self._http_error(400)) * 3:
+            b.allow()
+            b.record(error)
+        self.assertEqual(b.state, breaker.CLOSED)
+        self.assertEqual(b.snapshot()['calls'], 0)
+
+    def test_half_open_probe_closes_on_success(self):
+        with self.settings(BREAKER_MIN_CALLS=1, BREAKER_OPEN_SECONDS=0, BREAKER_HALF_OPEN_PROBES=1):
+            b = breaker.get('Test')
+        b.allow()
+        b.record(Exception('down'))
+        self.assertEqual(b.state, breaker.OPEN)
+        self.assertTrue(b.allow())  # probe
+        self.assertEqual(b.state, breaker.HALF_OPEN)
+        self.assertFalse(b.allow())  # only one probe at a time
+        b.record()
+        self.assertEqual(b.state, breaker.CLOSED)
+
+    def test_half_open_probe_reopens_on_failure(self):
+        with self.settings(BREAKER_MIN_CALLS=1, BREAKER_OPEN_SECONDS=0):
+            b = breaker.get('Test')
+        b.allow()
+        b.record(Exception('down'))
+        b.allow()
+        b.record(Exception('still down'))
+        self.assertEqual(b.state, breaker.OPEN)
+
+    @patch('api.views.call_together', return_value='Together reply')
+    @patch('api.views.call_openrouter', side_effect=Exception('OR down'))
+    @patch('api.views.call_groq', side_effect=Exception('Groq down'))
+    def test_cascade_skips_open_providers(self, mock_groq, mock_openrouter, mock_together):
+        with self.settings(BREAKER_MIN_CALLS=2, BREAKER_OPEN_SECONDS=60, ANSWER_CACHE_ENABLED=False,
+                           PROVIDER_RANKING_ENABLED=False):
+            for _ in range(4):
+                response = self.client.post(
+                    '/api/chat/',
+                    data=json.dumps({'question': 'hello'}),
+                    content_type='application/json'
+                )
+                self.assertEqual(json.loads(response.content)['provider'], 'Together AI')
+        self.assertEqual(mock_groq.call_count, 2)
+        self.assertEqual(mock_openrouter.call_count, 2)
+        self.assertEqual(mock_together.call_count, 4)
+
+    @patch.dict('os.environ', {'OPENROUTER_API_KEY': 'test-key'})
+    def test_openrouter_skips_open_models(self):
+        first, second = providers.OPENROUTER_FREE_MODELS[:2]
+        with self.settings(BREAKER_MIN_CALLS=1, BREAKER_OPEN_SECONDS=60):
+            first_breaker = breaker.get(f'OpenRouter/{first}')
+        first_breaker.allow()
+        first_breaker.record(Exception('down'))
+
+        session = MagicMock()
+        session.post.return_value.json.return_value = {'choices': [{'message': {'content': 'ok'}}]}
+        with patch('api.clients.get_session', return_value=session):
+            self.assertEqual(providers.call_openrouter([{'role': 'user', 'content': 'hi'}]), 'ok')
+        self.assertEqual(json.loads(session.post.call_args.kwargs['data'])['model'], second)
+
+    def test_health_endpoint(self):
+        with self.settings(BREAKER_MIN_CALLS=1):
+            groq_breaker = breaker.get('Groq')
+        groq_breaker.allow()
+        groq_breaker.record(Exception('down'))
+
+        response = self.client.get('/api/health/')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data['status'], 'degraded')
+        self.assertEqual(data['providers']['Groq']['state'], 'open')
+        self.assertEqual(data['providers']['Cohere']['state'], 'closed')
+        self.assertIn(f'OpenRouter/{providers.OPENROUTER_FREE_MODELS[0]}', data['providers'])
+
+
+class DeadlineTest(StateTestCase):
+    """Test the per-request time budget across the cascade."""
+
+    def _post(self, path='/api/chat/'):
+        return self.client.post(
+            path,
+            data=json.dumps({'question': 'hello'}),
+            content_type='application/json'
+        )
+
+    @patch('api.views.call_groq', return_value='Hello from Groq!')
+    def test_response_reports_budget(self, mock_groq):
+        with self.settings(CHAT_DEADLINE_SECONDS=10):
+            data = json.loads(self._post().content)
+        self.assertEqual(data['budget']['deadline_ms'], 10000)
+        self.assertGreaterEqual(data['budget']['used_ms'], 0)
+        self.assertIsInstance(mock_groq.call_args.kwargs['deadline'], Deadline)
+
+    @patch('api.views.call_openrouter', return_value='too late')
+    @patch('api.views.call_groq')
+    def test_skips_attempts_that_cannot_finish(self, mock_groq, mock_openrouter):
+        def slow_failure(messages, deadline=None, route=None):
+            time.sleep(0.15)
+            raise Exception('Groq timed out')
+        mock_groq.side_effect = slow_failure
+
+        with self.settings(CHAT_DEADLINE_SECONDS=0.2, CHAT_MIN_ATTEMPT_SECONDS=0.1):
+            response = self._post()
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('budget', json.loads(response.content))
+        mock_openrouter.assert_not_called()
+
+    def test_attempt_timeout_is_remaining_budget(self):
+        with self.settings(CHAT_MIN_ATTEMPT_SECONDS=1, LLM_HTTP_CONNECT_TIMEOUT=5, LLM_HTTP_READ_TIMEOUT=30):
+            deadline = Deadline(3)
+            connect, read = clients.get_timeout(deadline.attempt_timeout())
+            self.assertLessEqual(read, 3)
+            self.assertEqual(connect, read)
+            self.assertEqual(clients.get_timeout(Deadline(60).attempt_timeout()), (5, 30))
+            with self.assertRaises(DeadlineExceeded):
+                Deadline(0.5).attempt_timeout()
+
+    @patch('api.views.acall_openrouter', new_callable=AsyncMock, return_value='too late')
+    @patch('api.views.acall_groq')
+    async def test_async_budget_is_a_hard_bound(self, mock_groq, mock_openrouter):
+        async def hang(messages, deadline=None, route=None):
+            await asyncio.sleep(5)
+        mock_groq.side_effect = hang
+
+        start = time.perf_counter()
+        with self.settings(CHAT_DEADLINE_SECONDS=0.3, CHAT_MIN_ATTEMPT_SECONDS=0.1):
+            response = await self.async_client.post(
+                '/api/chat/async/',
+                data=json.dumps({'question': 'hello'}),
+                content_type='application/json'
+            )
+        self.assertLess(time.perf_counter() - start, 1)
+        self.assertEqual(response.status_code, 503)
+        mock_openrouter.assert_not_called()
+
+
+def _sse_events(body):
+    """Parse an SSE body into a list of (event, data) pairs."""
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+class ChatStreamViewTest(StateTestCase):
+    """Test the Server-Sent Events chat endpoint."""
+
+    def _stream(self):
+        response = self.client.post(
+            '/api/chat/stream/',
+            data=json.dumps({'question': 'hello'}),
+            content_type='application/json'
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return _sse_events(b''.join(response.streaming_content).decode())
+
+    @patch('api.views.stream_groq', return_value=iter(['Hel', 'lo!']))
+    def test_relays_tokens(self, mock_groq):
+        events = self._stream()
+        self.assertEqual(events[0], ('start', {'provider': 'Groq'}))
+        self.assertEqual([data['text'] for name, data in events if name == 'token'], ['Hel', 'lo!'])
+        self.assertEqual(events[-1][0], 'done')
+        self.assertIn('budget', events[-1][1])
+        self.assertEqual(mock_groq.call_args[0][0][-1]['content'], 'hello')
+
+    @patch('api.views.stream_openrouter', return_value=iter(['from OR']))
+    @patch('api.views.stream_groq', side_effect=Exception('Groq down'))
+    def test_falls_back_before_first_token(self, mock_groq, mock_openrouter):
+        events = self._stream()
+        self.assertEqual(events[0], ('start', {'provider': 'OpenRouter'}))
+        self.assertEqual(events[1], ('token', {'text': 'from OR'}))
+
+    @patch('api.views.call_huggingface', return_value='whole HF reply')
+    @patch('api.views.stream_together', side_effect=ValueError('No key'))
+    @patch('api.views.stream_openrouter', side_effect=ValueError('No key'))
+    @patch('api.views.stream_groq', side_effect=ValueError('No key'))
+    def test_non_streaming_provider_sends_whole_reply(self, *mocks):
+        events = self._stream()
+        self.assertEqual(events[0], ('start', {'provider': 'Hugging Face'}))
+        self.assertEqual(events[1], ('token', {'text': 'whole HF reply'}))
+
+    @patch('api.views.stream_openrouter')
+    @patch('api.views.stream_groq')
+    def test_no_fallback_after_first_token(self, mock_groq, mock_openrouter):
+        def broken(messages, deadline=None, route=None):
+            yield 'partial'
+            raise Exception('connection reset')
+        mock_groq.side_effect = broken
+        events = self._stream()
+        self.assertEqual(events[-1][0], 'error')
+        mock_openrouter.assert_not_called()
+
+    @patch('api.views.call_cohere', side_effect=Exception('Cohere down'))
+    @patch('api.views.call_huggingface', side_effect=Exception('HF down'))
+    @patch('api.views.stream_together', side_effect=Exception('Together down'))
+    @patch('api.views.stream_openrouter', side_effect=Exception('OR down'))
+    @patch('api.views.stream_groq', side_effect=Exception('Groq down'))
+    def test_all_providers_fail(self, *mocks):
+        events = self._stream()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0][0], 'error')
+        self.assertIn('unavailable', events[0][1]['error'])
+
+    def test_validation_errors_are_json(self):
+        response = self.client.post(
+            '/api/chat/stream/',
+            data=json.dumps({'question': ''}),
+            content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', json.loads(response.content))
+
+    @patch.dict('os.environ', {'GROQ_API_KEY': 'test-key'})
+    def test_parses_openai_stream_chunks(self):
+        lines = [
+            'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+            '',
+            'data: {"choices": [{"delta": {"content": "Hi"}}]}',
+            'data: {"choices": [{"delta": {"content": " there"}}]}',
+            'data: [DONE]',
+        ]
+        session = MagicMock()
+        session.post.return_value.iter_lines.return_value = iter(lines)
+        with patch('api.clients.get_session', return_value=session):
+            chunks = list(providers.stream_groq([{'role': 'user', 'content': 'hi'}]))
+        self.assertEqual(chunks, ['Hi', ' there'])
+        self.assertTrue(session.post.call_args.kwargs['stream'])
+        self.assertTrue(json.loads(session.post.call_args.kwargs['data'])['stream'])
+
+    async def test_async_stream_relays_tokens(self):
+        from django.test import AsyncRequestFactory
+        from api.views import achat_stream_view
+
+        async def groq_down(messages, deadline=None, route=None):
+            raise Exception('Groq down')
+            yield
+
+        async def openrouter(messages, deadline=None, route=None):
+            for text in ('async ', 'tokens'):
+                yield text
+
+        request = AsyncRequestFactory().post(
+            '/api/chat/stream/',
+            data=json.dumps({'question': 'hello'}),
+            content_type='application/json'
+        )
+        with patch('api.views.astream_groq', groq_down), patch('api.views.astream_openrouter', openrouter):
+            response = await achat_stream_view(request)
+            self.assertTrue(response.is_async)
+            body = b''.join([part async for part in response.streaming_content])
+        events = _sse_events(body.decode())
+        self.assertEqual(events[0], ('start', {'provider': 'OpenRouter'}))
+        self.assertEqual([data['text'] for name, data in events if name == 'token'], ['async ', 'tokens'])
+
+    @patch.dict('os.environ', {'OPENROUTER_API_KEY': 'test-key'})
+    async def test_abandoned_openrouter_stream_is_closed(self):
+        closed = []
+
+        async def model_stream(name, url, headers, body, timeout):
+            try:
+                for text in ('one', 'two', 'three'):
+                    yield text
+            finally:
+                closed.append(name)
+
+        with patch('api.providers._astream_openai', model_stream):
+            chunks = providers.astream_openrouter([{'role': 'user', 'content': 'hi'}])
+            self.assertEqual(await chunks.__anext__(), 'one')
+            await chunks.aclose()  # the visitor left mid-reply
+        self.assertEqual(len(closed), 1)
+
+
+class AnswerCacheTest(StateTestCase):
+    """Test the two-tier exact-match answer cache."""
+
+    def _post(self, question, history=None, path='/api/chat/'):
+        return self.client.post(
+            path,
+            data=json.dumps({'question': question, 'history': history or []}),
+            content_type='application/json'
+        )
+
+    @patch('api.views.call_groq', return_value='I am Girish!')
+    def test_repeat_question_skips_providers(self, mock_groq):
+        first = json.loads(self._post('Tell me about yourself').content)
+        second = json.loads(self._post('  tell me about YOURSELF?? ').content)
+        self.assertEqual(mock_groq.call_count, 1)
+        self.assertNotIn('cached', first)
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['reply'], 'I am Girish!')
+        self.assertEqual(second['provider'], 'Groq')
+        self.assertEqual(answer_cache.stats()['memory_hits'], 1)
+
+    @patch('api.views.call_groq', return_value='I am Girish!')
+    def test_persistent_tier_survives_memory_loss(self, mock_groq):
+        self._post('Tell me about yourself')
+        answer_cache.reset()  # e.g. a cold start
+        data = json.loads(self._post('Tell me about yourself').content)
+        self.assertTrue(data['cached'])
+        self.assertEqual(mock_groq.call_count, 1)
+        self.assertEqual(answer_cache.stats()['db_hits'], 1)
+
+    @patch('api.views.call_groq', return_value='reply')
+    def test_history_is_part_of_the_key(self, mock_groq):
+        with self.settings(ANSWER_CACHE_MAX_HISTORY=2):
+            self._post('why?', [{'role': 'user', 'content': 'a'}, {'role': 'assistant', 'content': 'b'}])
+            self._post('why?', [{'role': 'user', 'content': 'c'}, {'role': 'assistant', 'content': 'd'}])
+        self.assertEqual(mock_groq.call_count, 2)
+
+    @patch('api.views.call_groq', return_value='reply')
+    def test_long_conversations_are_not_cached(self, mock_groq):
+        history = [{'role': 'user', 'content': 'a'}, {'role': 'assistant', 'content': 'b'}]
+        self._post('why?', history)
+        self._post('why?', history)
+        self.assertEqual(mock_groq.call_count, 2)
+        self.assertIsNone(answer_cache.cache_key([{'role': 'system', 'content': ''}, *history,
+                                                  {'role': 'user', 'content': 'why?'}]))
+
+    @patch('api.views.call_groq', side_effect=Exception('Groq down'))
+    def test_failures_are_not_cached(self, mock_groq):
+        with patch('api.views.call_openrouter', side_effect=Exception('down')), \
+                patch('api.views.call_together', side_effect=Exception('down')), \
+                patch('api.views.call_huggingface', side_effect=Exception('down')), \
+                patch('api.views.call_cohere', side_effect=Exception('down')):
+            self._post('hello')
+            self._post('hello')
+        self.assertEqual(mock_groq.call_count, 2)
+
+    @patch('api.answer_cache.KB_VERSION', 'new-version')
+    def test_knowledge_base_version_is_part_of_the_key(self):
+        messages = [{'role': 'system', 'content': ''}, {'role': 'user', 'content': 'hi'}]
+        new_key = answer_cache.cache_key(messages)
+        with patch('api.answer_cache.KB_VERSION', 'old-version'):
+            self.assertNotEqual(answer_cache.cache_key(messages), new_key)
+
+    @patch('api.views.stream_groq', return_value=iter(['Hi ', 'there']))
+    def test_stream_stores_and_serves_cached_reply(self, mock_groq):
+        for _ in range(2):
+            response = self._post('hello', path='/api/chat/stream/')
+            events = _sse_events(b''.join(response.streaming_content).decode())
+        self.assertEqual(mock_groq.call_count, 1)
+        self.assertEqual(events[0][1], {'provider': 'Groq', 'cached': True})
+        self.assertEqual(events[1], ('token', {'text': 'Hi there'}))
+
+    @patch('api.views.call_groq', return_value='reply')
+    def test_invalidate_clears_both_tiers(self, mock_groq):
+        from django.core.management import call_command
+        from api.models import CachedAnswer
+        self._post('hello')
+        call_command('clear_answer_cache', stdout=MagicMock())
+        self.assertEqual(CachedAnswer.objects.count(), 0)
+        self._post('hello')
+        self.assertEqual(mock_groq.call_count, 2)
+
+    @override_settings(ANSWER_CACHE_DB_TTL=60)
+    def test_unservable_rows_are_purged(self):
+        from datetime import timedelta
+        from io import StringIO
+        from django.core.management import call_command
+        from django.utils import timezone
+        from api.models import CachedAnswer
+        messages = [{'role': 'system', 'content': 'x'}, {'role': 'user', 'content': 'q'}]
+        old = timezone.now() - timedelta(seconds=120)
+        for key, kb_version, created_at, pinned in [
+            ('fresh', answer_cache.KB_VERSION, timezone.now(), False),
+            ('pinned', answer_cache.KB_VERSION, old, True),
+            ('expired', answer_cache.KB_VERSION, old, False),
+            ('old-kb', 'previous', timezone.now(), True),
+        ]:
+            CachedAnswer.objects.create(key=key, kb_version=kb_version, question='q', reply='r',
+                                        provider='Groq', pinned=pinned)
+            CachedAnswer.objects.filter(key=key).update(created_at=created_at)  # auto_now_add on create
+        out = StringIO()
+        call_command('clear_answer_cache', '--expired', stdout=out)
+        self.assertIn('Removed 2 expired', out.getvalue())
+        self.assertEqual(sorted(CachedAnswer.objects.values_list('key', flat=True)), ['fresh', 'pinned'])
+
+        CachedAnswer.objects.filter(key='fresh').update(created_at=old)
+        with self.settings(ANSWER_CACHE_PURGE_SECONDS=0):
+            answer_cache.store('new', messages, 'reply', 'Groq')
+        self.assertEqual(sorted(CachedAnswer.objects.values_list('key', flat=True)), ['new', 'pinned'])
+
+    @patch('api.views.acall_groq', new_callable=AsyncMock, return_value='async reply')
+    async def test_async_view_uses_cache(self, mock_groq):
+        for _ in range(2):
+            response = await self.async_client.post(
+                '/api/chat/async/',
+                data=json.dumps({'question': 'hello'}),
+                content_type='application/json'
+            )
+        self.assertTrue(json.loads(response.content)['cached'])
+        self.assertEqual(mock_groq.call_count, 1)
+
+    def test_health_reports_counters(self):
+        data = json.loads(self.client.get('/api/health/').content)
+        self.assertIn('hit_ratio', data['answer_cache'])
+        self.assertEqual(data['answer_cache']['kb_version'], answer_cache.KB_VERSION)
+
+
+@unittest.skipIf(semantic_cache.numpy() is None, 'NumPy not installed')
+@override_settings(FAST_PATH_ENABLED=False)  # the questions below would be answered from the knowledge base
+class SemanticCacheTest(StateTestCase):
+    """Test the near-duplicate question tier."""
+
+    def _post(self, question, history=None):
+        return json.loads(self.client.post(
+            '/api/chat/',
+            data=json.dumps({'question': question, 'history': history or []}),
+            content_type='application/json'
+        ).content)
+
+    @patch('api.views.call_groq', return_value='Python, React, Django...')
+    def test_paraphrase_is_served_from_cache(self, mock_groq):
+        self._post('What technologies do you know?')
+        data = self._post('Which technologies are you skilled in')
+        self.assertTrue(data['cached'])
+        self.assertEqual(mock_groq.call_count, 1)
+        self.assertEqual(answer_cache.stats()['semantic_hits'], 1)
+
+    @patch('api.views.call_groq', return_value='reply')
+    def test_unrelated_question_misses(self, mock_groq):
+        self._post('What are your skills?')
+        data = self._post('What are your hobbies?')
+        self.assertNotIn('cached', data)
+        self.assertEqual(mock_groq.call_count, 2)
+
+    @patch('api.views.call_groq', return_value='reply')
+    def test_follow_ups_are_not_matched(self, mock_groq):
+        history = [{'role': 'user', 'content': 'hi'}, {'role': 'assistant', 'content': 'hello'}]
+        with self.settings(ANSWER_CACHE_MAX_HISTORY=2):
+            self._post('What technologies do you know?', history)
+            self._post('Which technologies are you skilled in', history)
+        self.assertEqual(mock_groq.call_count, 2)
+
+    def test_pinned_entries_survive_expiry_and_eviction(self):
+        cache = semantic_cache.SemanticCache(size=3, dim=64, threshold=0.99, ttl=60)
+        cache.add('pinned question', 'warm', pinned=True)
+        for i in range(5):
+            cache.add(f'question number {i}', i)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.lookup('question number 4')[0], 4)
+        with patch('api.semantic_cache.time.monotonic', return_value=time.monotonic() + 3600):
+            self.assertEqual(cache.lookup('pinned question')[0], 'warm')
+            self.assertIsNone(cache.lookup('question number 4')[0])
+
+    def test_memory_is_bounded(self):
+        cache = semantic_cache.SemanticCache(size=3, dim=64, threshold=0.99, ttl=60)
+        for i, word in enumerate(['python', 'django', 'react', 'postgres', 'cricket']):
+            cache.add(f'do you know {word}', {'reply': word})
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache._matrix.shape, (3, 64))
+        self.assertIsNone(cache.lookup('do you know python')[0])
+        self.assertEqual(cache.lookup('do you know cricket')[0], {'reply': 'cricket'})
+
+    def test_expired_entries_do_not_match(self):
+        cache = semantic_cache.SemanticCache(size=4, dim=64, threshold=0.9, ttl=0)
+        cache.add('what are your skills', {'reply': 'skills'})
+        self.assertIsNone(cache.lookup('what are your skills')[0])
+
+    def test_threshold_is_configurable(self):
+        with self.settings(SEMANTIC_CACHE_THRESHOLD=0.99):
+            semantic_cache.reset()
+            cache = semantic_cache.get_cache()
+        cache.add('What is your educational background?', {'reply': 'education'})
+        answer, similarity = cache.lookup('Tell me about your education')
+        self.assertIsNone(answer)
+        self.assertGreater(similarity, 0.5)
+
+    PARAPHRASES = [
+        ('what tech do you know', 'which technologies are you skilled in'),
+        ('Tell me about your work experience', 'What is your work experience?'),
+        ('What projects have you built?', 'Show me the projects you have made'),
+        ('What programming languages do you know?', 'Which programming languages do you use?'),
+        ('What are your achievements?', 'What have you achieved?'),
+        ('How can I contact you?', 'How could I contact you'),
+    ]
+    NEAR_MISSES = [
+        ('What projects have you built with React?', 'What projects have you built with Python?'),
+        ('What frontend frameworks do you know?', 'What backend frameworks do you know?'),
+        ('Tell me about your work experience', 'Tell me about your education'),
+        ('Where did you study?', 'Where do you live?'),
+        ('Do you know React?', 'Do you know Django?'),
+        ('What are your career goals?', 'What are your achievements?'),
+    ]
+
+    def test_paraphrases_match(self):
+        for cached, asked in self.PARAPHRASES:
+            cache = semantic_cache.get_cache()
+            cache.add(cached, cached)
+            with self.subTest(asked=asked):
+                self.assertEqual(cache.lookup(asked)[0], cached)
+            semantic_cache.reset()
+
+    def test_near_misses_do_not_match(self):
+        for cached, asked in self.NEAR_MISSES:
+            cache = semantic_cache.get_cache()
+            cache.add(cached, cached)
+            with self.subTest(asked=asked):
+                answer, similarity = cache.lookup(asked)
+                self.assertIsNone(answer)
+                self.assertLess(similarity, 0.7)
+            semantic_cache.reset()
+
+    def test_distinguishing_words_weigh_more(self):
+        weights = semantic_cache._weights()
+        self.assertGreater(weights[semantic_cache.stem('python')], weights[semantic_cache.stem('projects')])
+
+
+@override_settings(FAST_PATH_ENABLED=False, ROUTER_ENABLED=False)  # checks the prompt sent to the providers
+class RetrievalTest(StateTestCase):
+    """Only the knowledge-base sections relevant to the question go into the system prompt."""
+
+    def _system_prompt(self, question, history=None):
+        with patch('api.views.call_groq', return_value='reply') as mock_groq:
+            self.client.post(
+                '/api/chat/',
+                data=json.dumps({'question': question, 'history': history or []}),
+                content_type='application/json'
+            )
+        return mock_groq.call_args[0][0][0]['content']
+
+    def test_sections_and_numbered_entries_are_chunks(self):
+        sections = [c.section for c in retrieval.CHUNKS]
+        self.assertEqual(sections.count('Projects'), 3)
+        self.assertEqual(sections.count('Work Experience'), 3)
+        self.assertIn('Contact Information', sections)
+        self.assertTrue(retrieval.TITLE.startswith('# Girish Saana'))
+
+    def test_only_relevant_sections_are_sent(self):
+        system = self._system_prompt('What are your technical skills?')
+        self.assertIn('## Technical Skills:', system)
+        self.assertIn('## Profile:', system)
+        self.assertNotIn('girishsaana2513@gmail.com', system)
+        self.assertNotIn('Narayana Junior College', system)
+        self.assertLess(len(system), len(prompts.PROMPTS_CONFIG) + len(KNOWLEDGE_BASE))
+
+    def test_unmatched_question_gets_whole_knowledge_base(self):
+        system = self._system_prompt('Tell me about yourself')
+        self.assertIn(KNOWLEDGE_BASE.strip(), system)
+
+    def test_follow_up_uses_previous_question(self):
+        history = [
+            {'role': 'user', 'content': 'How can I contact you?'},
+            {'role': 'assistant', 'content': 'Drop me a line!'},
+        ]
+        system = self._system_prompt('And on LinkedIn?', history)
+        self.assertIn('girishsaana2513@gmail.com', system)
+
+    def test_always_include_is_configurable(self):
+        with self.settings(KB_ALWAYS_INCLUDE=['Profile', 'Contact Information']):
+            system = self._system_prompt('What are your technical skills?')
+        self.assertIn('## Technical Skills:', system)
+        self.assertIn('girishsaana2513@gmail.com', system)
+
+    def test_disabled_sends_whole_knowledge_base(self):
+        with self.settings(KB_RETRIEVAL_ENABLED=False):
+            system = self._system_prompt('What are your technical skills?')
+        self.assertIn(KNOWLEDGE_BASE, system)
+
+
+class HistoryBudgetTest(StateTestCase):
+    """Long conversations are trimmed to a token budget with a summary of older turns."""
+
+    def setUp(self):
+        super().setUp()
+        history.reset()
+
+    def _conversation(self, turns):
+        return [
+            {'role': 'user' if i % 2 == 0 else 'assistant',
+             'content': f'Turn {i} is about cricket. ' + 'More detail here. ' * 40}
+            for i in range(turns)
+        ]
+
+    def _messages(self, turns):
+        with patch('api.views.call_groq', return_value='reply') as mock_groq:
+            self.client.post(
+                '/api/chat/',
+                data=json.dumps({'question': 'What next?', 'history': self._conversation(turns)}),
+                content_type='application/json'
+            )
+        return mock_groq.call_args[0][0]
+
+    def test_normalize_history_accepts_both_shapes(self):
+        from api.views import normalize_history
+        turns = normalize_history([
+            {'role': 'user', 'content': 'hi'},
+            {'role': 'model', 'parts': [{'text': 'hello'}]},
+            {'role': 'user', 'content': ''},
+            'not a turn',
+        ])
+        self.assertEqual(turns, [{'role': 'user', 'content': 'hi'}, {'role': 'assistant', 'content': 'hello'}])
+
+    def test_short_history_is_sent_verbatim(self):
+        messages = self._messages(4)
+        self.assertEqual(len(messages), 6)
+        self.assertFalse(history.is_summary(messages[1]))
+
+    def test_older_turns_are_summarized(self):
+        messages = self._messages(30)
+        self.assertTrue(history.is_summary(messages[1]))
+        self.assertIn('- Visitor: Turn 0 is about cricket.', messages[1]['content'])
+        self.assertEqual(messages[-2]['content'], self._conversation(30)[-1]['content'])
+        self.assertEqual(messages[-1]['content'], 'What next?')
+        turns_tokens = sum(history.estimate_tokens(m['content']) for m in messages[2:-1])
+        self.assertLessEqual(turns_tokens, history.budget_for())
+
+    def test_prompt_size_stays_flat(self):
+        sizes = [sum(len(m['content']) for m in self._messages(n)) for n in (20, 50)]
+        self.assertLess(abs(sizes[0] - sizes[1]), 1000)
+
+    def test_provider_budget_trims_further(self):
+        messages = history.fit([{'role': 'system', 'content': 'persona'}, *self._conversation(30),
+                                {'role': 'user', 'content': 'What next?'}])
+        with self.settings(HISTORY_PROVIDER_TOKEN_BUDGETS={'Hugging Face': 300}):
+            small = history.fit(messages, 'Hugging Face')
+            self.assertIs(history.fit(messages, 'Groq'), messages)
+        self.assertLess(len(small), len(messages))
+        self.assertTrue(history.is_summary(small[1]))
+        self.assertIn('Turn 0', small[1]['content'])  # the earlier summary is carried over
+
+    def test_summary_uses_intro_of_structured_replies(self):
+        summary = history.summarize([
+            {'role': 'assistant', 'content': 'Here are my skills::Languages:Python,SQL|Databases:MySQL'},
+        ])
+        self.assertEqual(summary['content'], f"{history.SUMMARY_HEADER}\n- Me: Here are my skills")
+
+    def test_summary_is_cached(self):
+        turns = self._conversation(6)
+        self.assertIs(history.summarize(turns), history.summarize(turns))
+
+    def test_summary_is_not_a_system_message(self):
+        messages = self._messages(30)
+        self.assertEqual([m['role'] for m in messages].count('system'), 1)
+        self.assertEqual(messages[1]['role'], 'user')
+        payload = json.loads(providers.COHERE_BODY.render(messages))
+        self.assertNotIn(history.SUMMARY_HEADER, payload['preamble'])
+        self.assertTrue(payload['chat_history'][0]['message'].startswith(history.SUMMARY_HEADER))
+
+    def test_non_text_history_content_is_coerced_or_dropped(self):
+        with patch('api.views.call_groq', return_value='reply') as mock_groq:
+            response = self.client.post('/api/chat/', data=json.dumps({'question': 'What next?', 'history': [
+                {'role': 'user', 'content': 123},
+                {'role': 'assistant', 'content': {'text': 'nested'}},
+                {'role': 'user', 'parts': [{'text': ['a', 'list']}]},
+            ]}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_groq.call_args[0][0][1:-1], [{'role': 'user', 'content': '123'}])
+
+
+class PayloadTemplateTest(TestCase):
+    """Pre-serialized request bodies decode to the payloads each provider expects."""
+
+    def setUp(self):
+        payloads.reset()
+        self.system = payloads.system_prompt(retrieval.relevant_chunks('What are your skills?'))
+        self.messages = [
+            {'role': 'system', 'content': self.system},
+            {'role': 'user', 'content': 'Say "hi" \u2014 please\n'},
+            {'role': 'assistant', 'content': 'Hi! \U0001F3CF'},
+            {'role': 'user', 'content': 'What are your skills?'},
+        ]
+
+    def test_system_prompt_is_compiled_once(self):
+        again = payloads.system_prompt(retrieval.relevant_chunks('What are your skills?'))
+        self.assertIs(again, self.system)
+        self.assertEqual(self.system.json, json.dumps(str(self.system)))
+        self.assertIn('## Technical Skills:', self.system)
+        self.assertTrue(self.system.endswith(payloads.SYSTEM_PROMPT_SUFFIX))
+
+    def test_openai_body(self):
+        body = json.loads(providers.GROQ_BODY.render(self.messages))
+        self.assertEqual(body, {
+            'model': 'llama-3.3-70b-versatile', 'temperature': 0.7, 'max_tokens': 2048,
+            'messages': self.messages,
+        })
+        self.assertTrue(json.loads(providers.GROQ_BODY.render(self.messages, stream=True))['stream'])
+
+    def test_huggingface_body(self):
+        body = json.loads(providers.HUGGINGFACE_BODY.render(self.messages))
+        self.assertEqual(body['inputs'], "\n".join([
+            f"[Instructions]\n{self.system}",
+            'user: Say "hi" \u2014 please\n',
+            'assistant: Hi! \U0001F3CF',
+            'user: What are your skills?',
+        ]))
+        self.assertEqual(body['parameters']['max_new_tokens'], 1024)
+
+    def test_cohere_body(self):
+        body = json.loads(providers.COHERE_BODY.render(self.messages))
+        self.assertEqual(body, {
+            'message': 'What are your skills?',
+            'preamble': str(self.system),
+            'chat_history': [
+                {'role': 'USER', 'message': 'Say "hi" \u2014 please\n'},
+                {'role': 'CHATBOT', 'message': 'Hi! \U0001F3CF'},
+            ],
+            'model': 'command-r-plus',
+            'temperature': 0.7,
+        })
+
+
+class ViewCounterTest(TestCase):
+    """Page views are buffered in memory and written in batches."""
+
+    def setUp(self):
+        view_counter.reset()
+
+    def tearDown(self):
+        view_counter.reset()
+
+    def _views(self, method='post', ip='127.0.0.1'):
+        response = getattr(self.client, method)('/api/views/', REMOTE_ADDR=ip)
+        return response.status_code, json.loads(response.content).get('views')
+
+    def test_views_are_batched(self):
+        with self.settings(VIEW_COUNTER_FLUSH_SIZE=3):
+            self.assertEqual(self._views(ip='10.0.0.1'), (200, 1))
+            self.assertEqual(self._views(ip='10.0.0.2'), (200, 2))
+            self.assertFalse(ViewCounter.objects.exists())
+            self.assertEqual(self._views(ip='10.0.0.3'), (200, 3))
+        self.assertEqual(ViewCounter.objects.get().count, 3)
+        self.assertEqual(view_counter.get_buffer().pending, 0)
+
+    def test_get_does_not_count(self):
+        ViewCounter.objects.create(pk=view_counter.COUNTER_ID, count=41)
+        self.assertEqual(self._views('get'), (200, 41))
+        self.assertEqual(self._views(), (200, 42))
+
+    def test_client_counts_once_per_window(self):
+        self.assertEqual(self._views(), (200, 1))
+        self.assertEqual(self._views(), (200, 1))
+        self.assertEqual(self._views(ip='10.0.0.9'), (200, 2))
+
+    def test_flush_is_one_update(self):
+        ViewCounter.objects.create(pk=view_counter.COUNTER_ID, count=10)
+        buffer = view_counter.ViewBuffer(flush_size=100, flush_seconds=60)
+        for _ in range(25):
+            buffer.add()
+        with self.assertNumQueries(1):
+            self.assertEqual(buffer.flush(), 25)
+        self.assertEqual(ViewCounter.objects.get().count, 35)
+
+    def test_timer_flushes_pending_views(self):
+        buffer = view_counter.ViewBuffer(flush_size=100, flush_seconds=0.05)
+        with patch('api.view_counter._persist') as persist, patch('api.view_counter.connections'):
+            buffer.add()
+            buffer.add()
+            time.sleep(0.3)
+        persist.assert_called_once_with(2)
+        self.assertEqual(buffer.pending, 0)
+
+    def test_failed_flush_keeps_views(self):
+        from django.db import OperationalError
+        buffer = view_counter.ViewBuffer(flush_size=100, flush_seconds=60)
+        buffer.add()
+        with patch('api.view_counter._persist', side_effect=OperationalError('database is locked')):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.pending, 1)
+        buffer.cancel()
+
+    def test_other_methods_rejected(self):
+        self.assertEqual(self._views('put')[0], 405)
+
+
+class MetricsTest(StateTestCase):
+    """Prometheus counters for requests, providers, the cache and the rate limiter."""
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def _chat(self, question='Who are you?'):
+        return self.client.post(
+            '/api/chat/',
+            data=json.dumps({'question': question}),
+            content_type='application/json'
+        )
+
+    def _scrape(self):
+        response = self.client.get('/api/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    @patch('api.views.call_groq', return_value='Hello from Groq!')
+    def test_requests_counted_by_status(self, mock_groq):
+        self._chat()
+        self.client.get('/api/chat/')
+        text = self._scrape()
+        self.assertIn('api_requests_total{endpoint="chat",status="200"} 1', text)
+        self.assertIn('api_requests_total{endpoint="chat",status="405"} 1', text)
+        self.assertIn('llm_provider_latency_seconds_count{provider="Groq",outcome="success"} 1', text)
+        self.assertIn('chat_cascade_depth_bucket{outcome="success",le="1"} 1', text)
+
+    @patch('api.views.call_openrouter', return_value='Hello from OpenRouter!')
+    @patch('api.views.call_groq', side_effect=httpx.ReadTimeout('slow'))
+    def test_fallback_counts_failure_and_depth(self, mock_groq, mock_openrouter):
+        self._chat()
+        text = self._scrape()
+        self.assertIn('llm_provider_failures_total{provider="Groq",error="ReadTimeout"} 1', text)
+        self.assertIn('chat_cascade_depth_bucket{outcome="success",le="1"} 0', text)
+        self.assertIn('chat_cascade_depth_bucket{outcome="success",le="2"} 1', text)
+
+    def test_rate_limit_rejections_counted(self):
+        for _ in range(settings.RATE_LIMIT_MAX_REQUESTS):
+            is_rate_limited('127.0.0.1')
+        self._chat()
+        self.assertIn('rate_limit_rejections_total{endpoint="chat"} 1', self._scrape())
+
+    @patch('api.views.call_groq', return_value='I am Girish!')
+    def test_cache_hit_ratio(self, mock_groq):
+        self._chat('Tell me about yourself')
+        self._chat('Tell me about yourself')
+        text = self._scrape()
+        self.assertIn('answer_cache_lookups_total{result="memory_hit"} 1', text)
+        self.assertIn('answer_cache_hit_ratio 0.5', text)
+
+    def test_workers_are_summed(self):
+        import tempfile
+        metrics.RATE_LIMITED.inc('chat')
+        with tempfile.TemporaryDirectory() as directory, self.settings(METRICS_DIR=directory):
+            with open(f"{directory}/metrics-999999.json", 'w') as f:
+                json.dump([['rate_limit_rejections_total', ['chat'], 4]], f)
+            text = metrics.render()
+        self.assertIn('rate_limit_rejections_total{endpoint="chat"} 5', text)
+
+    def test_finished_threads_are_folded_into_the_totals(self):
+        import threading
+        for _ in range(10):
+            thread = threading.Thread(target=lambda: (metrics.RATE_LIMITED.inc('chat'),
+                                                      metrics.CASCADE_DEPTH.observe(1, 'answered')))
+            thread.start()
+            thread.join()
+        totals = metrics.snapshot()
+        self.assertEqual(totals[(metrics.RATE_LIMITED.name, ('chat',))], 10)
+        self.assertEqual(totals[(metrics.CASCADE_DEPTH.name, ('answered',))][-1], 10)
+        self.assertTrue(all(thread.is_alive() for thread, _ in metrics._shards))
+
+
+
+class TimingTest(StateTestCase):
+    """Server-Timing spans, sampled trace logs and admin-only profiling."""
+
+    def _chat(self, path='/api/chat/', **headers):
+        return self.client.post(
+            path,
+            data=json.dumps({'question': 'Who are you?', 'history': [{'role': 'user', 'content': 'hi'}]}),
+            content_type='application/json',
+            headers=headers,
+        )
+
+    def _spans(self, response):
+        return [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+
+    @patch('api.views.call_openrouter', return_value='Hello!')
+    @patch('api.views.call_groq', side_effect=Exception('Groq down'))
+    def test_server_timing_has_every_phase(self, mock_groq, mock_openrouter):
+        response = self._chat()
+        self.assertEqual(self._spans(response), ['parse', 'history', 'prompt', 'fast-path', 'cache', 'route', 'groq', 'openrouter', 'total'])
+        self.assertRegex(response['Server-Timing'], r'groq;desc="Groq";dur=\d+\.\d')
+
+    @patch('api.views.acall_groq', new_callable=AsyncMock, return_value='Hello!')
+    def test_async_view_is_timed(self, mock_groq):
+        response = self._chat('/api/chat/async/')
+        self.assertEqual(self._spans(response), ['parse', 'history', 'prompt', 'fast-path', 'cache', 'route', 'groq', 'total'])
+
+    def test_other_paths_untouched(self):
+        self.assertNotIn('Server-Timing', self.client.get('/admin/login/'))
+
+    @patch('api.views.call_groq', return_value='Hello!')
+    def test_sampled_trace_log(self, mock_groq):
+        with self.settings(TRACE_SAMPLE_RATE=1.0), self.assertLogs('api.trace', 'INFO') as logs:
+            self._chat()
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['path'], entry['status']), ('/api/chat/', 200))
+        self.assertEqual([span['name'] for span in entry['spans']][-1], 'Groq')
+
+    @patch('api.views.call_groq', return_value='Hello!')
+    def test_profile_is_staff_only(self, mock_groq):
+        import os
+        import tempfile
+        from django.contrib.auth.models import User
+        with tempfile.TemporaryDirectory() as directory, self.settings(PROFILE_DIR=directory):
+            self.assertNotIn('X-Profile-File', self._chat(x_profile='1'))
+
+            admin = User.objects.create_user('admin', password='pw', is_staff=True)
+            self.client.force_login(admin)
+            response = self._chat(x_profile='1')
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(os.path.exists(os.path.join(directory, response['X-Profile-File'])))
+
+
+class WarmAnswersTest(StateTestCase):
+    """manage.py warm_answers pins answers that chat serves without a provider call."""
+
+    def _warm(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        with self.settings(WARM_ANSWER_QUESTIONS=['Tell me about yourself', 'What is your work experience?']):
+            call_command('warm_answers', '--per-minute', '0', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def _chat(self, question):
+        return json.loads(self.client.post(
+            '/api/chat/',
+            data=json.dumps({'question': question}),
+            content_type='application/json'
+        ).content)
+
+    @patch('api.views.call_groq', return_value='Warm reply')
+    def test_warmed_answers_are_served(self, mock_groq):
+        self.assertIn('Warmed 2, already warm 0, failed 0', self._warm())
+        self.assertEqual(CachedAnswer.objects.filter(pinned=True).count(), 2)
+        answer_cache.reset()  # a fresh worker
+        data = self._chat('what is your work experience')
+        self.assertTrue(data['cached'])
+        self.assertEqual(data['reply'], 'Warm reply')
+        self.assertEqual(mock_groq.call_count, 2)
+
+    @patch('api.views.call_groq', return_value='Warm reply')
+    def test_rerun_skips_warm_questions(self, mock_groq):
+        self._warm()
+        self.assertIn('Warmed 0, already warm 2', self._warm())
+        self.assertIn('Warmed 2, already warm 0', self._warm('--force'))
+        self.assertEqual(mock_groq.call_count, 4)
+
+    @patch('api.views.call_groq', return_value='Warm reply')
+    def test_pinned_answers_do_not_expire(self, mock_groq):
+        from datetime import timedelta
+        from django.utils import timezone
+        self._warm()
+        CachedAnswer.objects.update(created_at=timezone.now() - timedelta(days=365))
+        answer_cache.reset()
+        self.assertTrue(self._chat('Tell me about yourself')['cached'])
+
+    @unittest.skipIf(semantic_cache.numpy() is None, 'NumPy not installed')
+    @patch('api.views.call_groq', return_value='Warm reply')
+    def test_paraphrase_served_after_restart(self, mock_groq):
+        self._warm()
+        answer_cache.reset()
+        self.assertTrue(self._chat('Tell me about your work experience')['cached'])
+        later = time.monotonic() + 3600  # well past ANSWER_CACHE_MEMORY_TTL
+        with patch('api.semantic_cache.time.monotonic', return_value=later):
+            self.assertTrue(self._chat('What about your work experience')['cached'])
+        self.assertEqual(mock_groq.call_count, 2)
+
+    @patch('api.views.call_groq', return_value='Warm reply')
+    def test_questions_answered_without_a_provider_are_not_warmed(self, mock_groq):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        questions = ['What are your technical skills?', 'How can I contact you?', 'Tell me about yourself']
+        with self.settings(WARM_ANSWER_QUESTIONS=questions):
+            call_command('warm_answers', '--per-minute', '0', stdout=out, stderr=StringIO())
+        self.assertIn('Warmed 1, already warm 0, failed 0, answered directly 2', out.getvalue())
+        self.assertEqual(mock_groq.call_count, 1)
+
+    @patch('api.views.call_cohere', side_effect=Exception('Cohere down'))
+    @patch('api.views.call_huggingface', side_effect=Exception('HF down'))
+    @patch('api.views.call_together', side_effect=Exception('Together down'))
+    @patch('api.views.call_openrouter', side_effect=Exception('OR down'))
+    @patch('api.views.call_groq', side_effect=Exception('Groq down'))
+    def test_failures_are_reported(self, *mocks):
+        self.assertIn('Warmed 0, already warm 0, failed 2', self._warm())
+        self.assertFalse(CachedAnswer.objects.exists())
+
+
+class FastPathTest(StateTestCase):
+    """Skills and projects lists rendered from the knowledge base, without a provider."""
+
+    def _post(self, question, path='/api/chat/'):
+        return self.client.post(
+            path,
+            data=json.dumps({'question': question}),
+            content_type='application/json'
+        )
+
+    def test_list_questions_are_detected(self):
+        for question in ('What are your technical skills?', "what's your tech stack", 'Skills'):
+            self.assertEqual(fast_path.intent(question), 'skills', question)
+        for question in ('What projects have you built?', 'Tell me about your projects'):
+            self.assertEqual(fast_path.intent(question), 'projects', question)
+        for question in ('What skills did you use in Smart Nutri?', 'Tell me about the Smart Nutri project',
+                         'Do you know Python?', 'Tell me about yourself'):
+            self.assertIsNone(fast_path.intent(question), question)
+
+    def test_skills_match_the_knowledge_base(self):
+        intro, data = fast_path.answer('What are your skills?')['reply'].split('::')
+        self.assertTrue(intro)
+        categories = dict(entry.split(':', 1) for entry in data.split('|'))
+        self.assertEqual(categories['Databases'].split(','), ['PostgreSQL', 'MySQL'])
+        for category, skills in categories.items():
+            self.assertIn(f"- {category}: {skills.replace(',', ', ')}", KNOWLEDGE_BASE)
+
+    def test_projects_match_the_knowledge_base(self):
+        _, data = fast_path.answer('What projects have you built?')['reply'].split('::')
+        projects = [entry.split(';') for entry in data.split('|')]
+        self.assertEqual(len(projects), 3)
+        for name, description, url in projects:
+            self.assertIn(name, KNOWLEDGE_BASE)
+            self.assertIn(description, KNOWLEDGE_BASE)
+            self.assertTrue(url.startswith('https://github.com/'))
+
+    def test_separators_cannot_break_the_format(self):
+        rendered = fast_path.render_projects([('A|B', 'uses x;y', 'https://example.com')])
+        self.assertEqual(rendered.split(';'), ['A B', 'uses x y', 'https://example.com'])
+
+    @patch('api.views.call_groq')
+    def test_chat_skips_providers(self, mock_groq):
+        data = json.loads(self._post('What are your technical skills?').content)
+        self.assertEqual(data['provider'], fast_path.PROVIDER)
+        self.assertIn('::Languages:Python', data['reply'])
+        self.assertEqual(data['source'], 'knowledge_base')
+        mock_groq.assert_not_called()
+
+    @patch('api.views.acall_groq', new_callable=AsyncMock)
+    def test_stream_and_async_views_use_it(self, mock_groq):
+        self.assertIn(b'::', b''.join(self._post('Show me your projects', '/api/chat/stream/').streaming_content))
+        data = json.loads(self._post('Show me your projects', '/api/chat/async/').content)
+        self.assertEqual(data['provider'], fast_path.PROVIDER)
+        mock_groq.assert_not_called()
+
+    @override_settings(FAST_PATH_ENABLED=False)
+    @patch('api.views.call_groq', return_value='LLM skills')
+    def test_can_be_disabled(self, mock_groq):
+        self.assertEqual(json.loads(self._post('What are your skills?').content)['reply'], 'LLM skills')
+
+
+
+class RouterTest(StateTestCase):
+    """Questions are routed to a template, the small model tier or the large one."""
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def _post(self, question, path='/api/chat/'):
+        return self.client.post(path, data=json.dumps({'question': question}), content_type='application/json')
+
+    def test_classify(self):
+        cases = {
+            'hi': 'greeting',
+            'Thank you!': 'greeting',
+            "What's your email?": 'contact',
+            'How can I reach you?': 'contact',
+            'How old are you?': 'factual',
+            'Where did you study?': 'factual',
+            'Tell me about yourself': 'open',
+            'Why did you choose Django for Smart Nutri?': 'open',
+            'Hi! ' + 'Could you walk me through your internship and what you learned there? ' * 2: 'open',
+        }
+        for question, intent in cases.items():
+            self.assertEqual(router.classify(question), intent, question)
+
+    @patch('api.views.call_groq')
+    def test_contact_is_answered_from_the_knowledge_base(self, mock_groq):
+        data = json.loads(self._post('What is your email?').content)
+        self.assertEqual(data['provider'], fast_path.PROVIDER)
+        self.assertIn('girishsaana2513@gmail.com', data['reply'])
+        self.assertEqual(data['source'], 'template')
+        self.assertNotIn('cached', data)  # not an answer cache hit
+        mock_groq.assert_not_called()
+
+    @patch('api.views.call_groq', return_value='Hey!')
+    def test_tier_and_limit_reach_the_provider(self, mock_groq):
+        self._post('hello')
+        route = mock_groq.call_args.kwargs['route']
+        self.assertEqual((route.intent, route.tier, route.max_tokens), ('greeting', router.SMALL, 150))
+        body = json.loads(providers._groq_body(route).render([{'role': 'user', 'content': 'hello'}], max_tokens=150))
+        self.assertEqual(body['model'], settings.ROUTER_SMALL_MODEL)
+        self.assertEqual(body['max_tokens'], 150)
+
+        self._post('Tell me about yourself')
+        route = mock_groq.call_args.kwargs['route']
+        self.assertEqual((route.tier, route.max_tokens), (router.LARGE, 2048))
+        self.assertEqual(json.loads(providers._groq_body(route).render([]))['model'], 'llama-3.3-70b-versatile')
+
+    def test_max_tokens_override_in_every_format(self):
+        messages = [{'role': 'user', 'content': 'hi'}]
+        together = json.loads(providers.TOGETHER_BODY.render(messages, stream=True, max_tokens=99))
+        self.assertEqual(together['max_tokens'], 99)
+        self.assertEqual(json.loads(providers.TOGETHER_BODY.render(messages))['max_tokens'], 2048)
+        hf = json.loads(providers.HUGGINGFACE_BODY.render(messages, max_tokens=99))
+        self.assertEqual(hf['parameters']['max_new_tokens'], 99)
+        self.assertEqual(json.loads(providers.COHERE_BODY.render(messages, max_tokens=99))['max_tokens'], 99)
+
+    def test_route_limit_caps_the_provider_limit(self):
+        open_route = router.Route('open', max_tokens=2048)
+        greeting = router.Route('greeting', tier=router.SMALL, max_tokens=150)
+        self.assertEqual(providers._max_tokens(open_route, providers.HUGGINGFACE_BODY), 1024)
+        self.assertEqual(providers._max_tokens(greeting, providers.HUGGINGFACE_BODY), 150)
+        self.assertEqual(providers._max_tokens(greeting, providers.GROQ_BODY), 150)
+        self.assertEqual(providers._max_tokens(greeting, providers.COHERE_BODY), 150)  # no fixed limit of its own
+        body = json.loads(providers.COHERE_BODY.render(
+            [{'role': 'user', 'content': 'hi'}], max_tokens=providers._max_tokens(greeting, providers.COHERE_BODY)))
+        self.assertEqual(body['max_tokens'], 150)
+        self.assertIsNone(providers._max_tokens(None, providers.GROQ_BODY))
+
+    @patch('api.views.call_groq', return_value='Hey!')
+    def test_decisions_are_measured(self, mock_groq):
+        self._post('hi')
+        self._post('How can I contact you?')
+        totals = metrics.snapshot()
+        self.assertEqual(totals[(metrics.ROUTES.name, ('greeting', router.SMALL))], 1)
+        self.assertEqual(totals[(metrics.ROUTES.name, ('contact', 'template'))], 1)
+        self.assertEqual(totals[(metrics.ROUTE_LATENCY.name, ('greeting', router.SMALL))][-1], 1)
+
+    @override_settings(ROUTER_ENABLED=False)
+    @patch('api.views.call_groq', return_value='Write to me')
+    def test_can_be_disabled(self, mock_groq):
+        self.assertEqual(json.loads(self._post('What is your email?').content)['reply'], 'Write to me')
+        self.assertIsNone(mock_groq.call_args.kwargs['route'])
+
+
+@override_settings(ANSWER_CACHE_ENABLED=False)  # so every request reaches the cascade
+class SingleFlightTest(StateTestCase):
+    """Identical chats in flight at the same time share one upstream call."""
+
+    QUESTION = 'Tell me about yourself'
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def _request(self, path='/api/chat/'):
+        return RequestFactory().post(path, data=json.dumps({'question': self.QUESTION}),
+                                     content_type='application/json')
+
+    def _wait_until(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline, 'timed out')
+            time.sleep(0.005)
+
+    def _wait_for_followers(self, count):
+        self._wait_until(lambda: metrics.snapshot().get((metrics.SINGLE_FLIGHT.name, ('follower',)), 0) >= count)
+
+    def _concurrently(self, view, n, release):
+        import threading
+        results = [None] * n
+
+        def send(i):
+            response = view(self._request())
+            results[i] = (response.status_code, json.loads(response.content))
+
+        threads = [threading.Thread(target=send, args=(i,)) for i in range(n)]
+        for thread in threads:
+            thread.start()
+        self._wait_for_followers(n - 1)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        return results
+
+    @patch('api.views.call_groq')
+    def test_concurrent_identical_requests_make_one_upstream_call(self, mock_groq):
+        import threading
+        release = threading.Event()
+
+        def answer(messages, deadline=None, route=None):
+            release.wait(5)
+            return 'Shared reply'
+        mock_groq.side_effect = answer
+
+        results = self._concurrently(chat_view, 8, release)
+        self.assertEqual(mock_groq.call_count, 1)
+        self.assertEqual([(status, data['reply']) for status, data in results], [(200, 'Shared reply')] * 8)
+        self.assertEqual(singleflight.in_flight()['calls'], 0)
+
+    @patch('api.views.call_groq')
+    def test_waiters_get_the_same_error(self, mock_groq):
+        import threading
+        release = threading.Event()
+
+        def fail(messages, deadline=None, route=None):
+            release.wait(5)
+            raise Exception('Groq down')
+        mock_groq.side_effect = fail
+
+        results = self._concurrently(chat_view, 4, release)
+        self.assertEqual(mock_groq.call_count, 1)
+        self.assertEqual([status for status, _ in results], [503] * 4)
+        self.assertIn('Groq down', results[-1][1]['error'])
+
+    def test_waiter_gives_up_at_its_timeout(self):
+        import threading
+        release = threading.Event()
+        leader = threading.Thread(target=singleflight.do, args=('key', lambda: release.wait(5)))
+        leader.start()
+        self._wait_until(lambda: singleflight.in_flight()['calls'])
+        with self.assertRaises(singleflight.WaitTimeout):
+            singleflight.do('key', lambda: self.fail('ran twice'), timeout=0.05)
+        release.set()
+        leader.join(5)
+
+    @patch('api.views.acall_groq')
+    def test_async_requests_share_a_task(self, mock_groq):
+        async def answer(messages, deadline=None, route=None):
+            await asyncio.sleep(0.05)
+            return 'Shared reply'
+        mock_groq.side_effect = answer
+
+        async def run():
+            return await asyncio.gather(*(achat_view(self._request('/api/chat/async/')) for _ in range(8)))
+
+        responses = asyncio.run(run())
+        self.assertEqual(mock_groq.call_count, 1)
+        self.assertEqual({json.loads(r.content)['reply'] for r in responses}, {'Shared reply'})
+
+    @patch('api.views.stream_groq')
+    def test_streams_are_shared_and_survive_the_leader_leaving(self, mock_stream):
+        import threading
+        release = threading.Event()
+
+        def tokens(messages, deadline=None, route=None):
+            release.wait(5)
+            yield 'Shared '
+            yield 'reply'
+        mock_stream.side_effect = tokens
+
+        follower_body = []
+
+        def follow():
+            self._wait_until(lambda: singleflight.in_flight()['streams'])
+            follower_body.extend(chat_stream_view(self._request('/api/chat/stream/')).streaming_content)
+
+        follower = threading.Thread(target=follow)
+        releaser = threading.Thread(target=lambda: (self._wait_for_followers(1), release.set()))
+        follower.start()
+        releaser.start()
+        leader = chat_stream_view(self._request('/api/chat/stream/'))
+        first = next(iter(leader.streaming_content))  # blocks until the follower joined and tokens flow
+        leader.close()  # the first visitor navigates away
+        follower.join(5)
+        releaser.join(5)
+
+        self.assertEqual(mock_stream.call_count, 1)
+        self.assertIn(b'event: start', first)
+        body = b''.join(follower_body)
+        self.assertIn(b'Shared ', body)
+        self.assertIn(b'reply', body)
+        self.assertIn(b'event: done', body)
+
+
+class SessionTest(StateTestCase):
+    """Clients with a session id send only the new question; the turns are kept server-side."""
+
+    def setUp(self):
+        super().setUp()
+        sessions.reset()
+
+    def _post(self, question, path='/api/chat/', **body):
+        return self.client.post(path, data=json.dumps({'question': question, **body}),
+                                content_type='application/json')
+
+    def _history_sent(self, mock_groq):
+        return [(turn['role'], turn['content']) for turn in mock_groq.call_args[0][0][1:-1]]
+
+    @patch('api.views.call_groq', side_effect=['First reply', 'Second reply'])
+    def test_follow_up_uses_the_stored_turns(self, mock_groq):
+        first = json.loads(self._post('Tell me about yourself', session_id=None).content)
+        second = json.loads(self._post('Why Django?', session_id=first['session_id']).content)
+
+        self.assertEqual(self._history_sent(mock_groq), [
+            ('user', 'Tell me about yourself'), ('assistant', 'First reply'),
+        ])
+        self.assertEqual(first['session_id'].split('.')[0], second['session_id'].split('.')[0])
+        self.assertTrue(second['session_id'].endswith('.2'))
+
+    @patch('api.views.call_groq', return_value='Reply')
+    def test_unknown_id_falls_back_to_the_history(self, mock_groq):
+        history = [{'role': 'user', 'content': 'Earlier question'}, {'role': 'assistant', 'content': 'Earlier reply'}]
+        data = json.loads(self._post('And then?', session_id='x' * 22 + '.2', history=history).content)
+
+        self.assertEqual(self._history_sent(mock_groq), [('user', 'Earlier question'), ('assistant', 'Earlier reply')])
+        self.assertNotIn('x' * 22, data['session_id'])
+        self.assertTrue(data['session_id'].endswith('.1'))
+
+    @patch('api.views.call_groq', side_effect=['First reply', 'Second reply'])
+    def test_session_is_read_back_from_the_database(self, mock_groq):
+        first = json.loads(self._post('Tell me about yourself', session_id=None).content)
+        sessions.reset()  # evicted, or a different worker
+        self._post('Why Django?', session_id=first['session_id'])
+        self.assertEqual(self._history_sent(mock_groq), [
+            ('user', 'Tell me about yourself'), ('assistant', 'First reply'),
+        ])
+
+    @override_settings(CHAT_SESSION_MAX_TURNS=4)
+    @patch('api.views.call_groq', side_effect=['r1', 'r2', 'r3', 'r4'])
+    def test_stale_worker_notices_writes_past_the_turn_cap(self, mock_groq):
+        first = json.loads(self._post('q1', session_id=None).content)
+        second = json.loads(self._post('q2', session_id=first['session_id']).content)
+        stale = sessions._memory.get(second['session_id'].split('.')[0])  # another worker's copy
+        third = json.loads(self._post('q3', session_id=second['session_id']).content)
+        self.assertNotEqual(third['session_id'], second['session_id'])
+
+        sessions._memory.set(third['session_id'].split('.')[0], stale)
+        self._post('q4', session_id=third['session_id'])
+        self.assertEqual(self._history_sent(mock_groq), [
+            ('user', 'q2'), ('assistant', 'r2'), ('user', 'q3'), ('assistant', 'r3'),
+        ])
+
+    @override_settings(CHAT_SESSION_TTL=60)
+    @patch('api.views.call_groq', side_effect=['First reply', 'Second reply'])
+    def test_expired_id_without_history_asks_for_it(self, mock_groq):
+        from datetime import timedelta
+        from django.utils import timezone
+        first = json.loads(self._post('Tell me about yourself', session_id=None).content)
+        ChatSession.objects.update(updated_at=timezone.now() - timedelta(seconds=120))
+        sessions.reset()
+
+        for path in ('/api/chat/', '/api/chat/stream/'):
+            response = self._post('Why Django?', path=path, session_id=first['session_id'], history=[])
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(json.loads(response.content)['code'], 'session_expired')
+        self.assertEqual(mock_groq.call_count, 1)
+
+        history = [{'role': 'user', 'content': 'Tell me about yourself'}, {'role': 'assistant', 'content': 'First reply'}]
+        data = json.loads(self._post('Why Django?', session_id=None, history=history).content)
+        self.assertEqual(data['reply'], 'Second reply')
+        self.assertEqual(self._history_sent(mock_groq), [
+            ('user', 'Tell me about yourself'), ('assistant', 'First reply'),
+        ])
+
+    @patch('api.views.stream_groq', side_effect=[iter(['Str', 'eamed']), iter(['Again'])])
+    def test_stream_returns_the_id_when_done(self, mock_stream):
+        response = self._post('Tell me about yourself', path='/api/chat/stream/', session_id=None)
+        done = _sse_events(b''.join(response.streaming_content).decode())[-1]
+        self.assertEqual(done[0], 'done')
+
+        response = self._post('Why Django?', path='/api/chat/stream/', session_id=done[1]['session_id'])
+        b''.join(response.streaming_content)
+        turns = [(turn['role'], turn['content']) for turn in mock_stream.call_args[0][0][1:-1]]
+        self.assertEqual(turns, [('user', 'Tell me about yourself'), ('assistant', 'Streamed')])
+
+    @override_settings(CHAT_SESSION_TTL=60)
+    def test_expired_sessions_are_purged(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        ChatSession.objects.create(session_id='old', turns='[]')
+        ChatSession.objects.create(session_id='new', turns='[]')
+        ChatSession.objects.filter(session_id='old').update(updated_at=timezone.now() - timedelta(seconds=120))
+
+        self.assertEqual(sessions.purge(), 1)
+        self.assertEqual(list(ChatSession.objects.values_list('session_id', flat=True)), ['new'])
+
+
+@override_settings(PROVIDER_RANKING_EXPLORE_RATE=0)
+class RankingTest(StateTestCase):
+    """The cascade tries providers by expected time to success."""
+
+    NAMES = ['Groq', 'OpenRouter', 'Together AI', 'Hugging Face', 'Cohere']
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def _order(self):
+        return ranking.order(self.NAMES, name=str)
+
+    def test_unsampled_providers_keep_the_configured_order(self):
+        self.assertEqual(self._order(), self.NAMES)
+
+    def test_ranks_by_latency_over_success_rate(self):
+        ranking.record('Groq', 6.0)
+        ranking.record('Together AI', 0.5)
+        ranking.record('OpenRouter', 1.0, httpx.ConnectError('down'))
+        ranking.record('Hugging Face', 1.0, ValueError('HUGGINGFACE_API_KEY not configured'))
+        self.assertEqual(self._order(), ['Together AI', 'Hugging Face', 'Cohere', 'Groq', 'OpenRouter'])
+
+    def test_averages_move_with_new_samples(self):
+        with self.settings(PROVIDER_RANKING_ALPHA=0.5):
+            ranking.record('Groq', 4.0)
+            ranking.record('Groq', 0.5)
+            ranking.record('Groq', 0.5)
+        self.assertEqual(self._order()[0], 'Groq')
+        self.assertEqual(ranking.snapshot(['Groq'])[0]['attempt_seconds'], 1.375)
+
+    @patch('api.views.call_together', return_value='Together reply')
+    @patch('api.views.call_openrouter', side_effect=ValueError('No key'))
+    @patch('api.views.call_groq')
+    def test_cascade_starts_with_the_best_provider(self, mock_groq, mock_openrouter, mock_together):
+        def slow_failure(messages, deadline=None, route=None):
+            time.sleep(0.05)  # an instant failure would score faster than Together's success
+            raise httpx.ConnectError('Groq down')
+        mock_groq.side_effect = slow_failure
+        with self.settings(ANSWER_CACHE_ENABLED=False, SINGLE_FLIGHT_ENABLED=False):
+            for _ in range(2):
+                response = self.client.post('/api/chat/', data=json.dumps({'question': 'hello'}),
+                                            content_type='application/json')
+                self.assertEqual(json.loads(response.content)['provider'], 'Together AI')
+        self.assertEqual(mock_groq.call_count, 1)
+        self.assertEqual(mock_together.call_count, 2)
+
+    def test_explores_a_provider_not_tried_lately(self):
+        ranking.record('Groq', 0.2)
+        ranking.record('Cohere', 20.0)
+        with self.settings(PROVIDER_RANKING_EXPLORE_RATE=1, PROVIDER_RANKING_EXPLORE_AFTER=0):
+            self.assertEqual(self._order()[0], 'Cohere')
+        with self.settings(PROVIDER_RANKING_EXPLORE_RATE=1, PROVIDER_RANKING_EXPLORE_AFTER=60):
+            self.assertEqual(self._order()[0], 'Groq')
+        self.assertEqual(metrics.snapshot()[(metrics.PROVIDER_EXPLORATIONS.name, ('Cohere',))], 1)
+
+    @patch.dict('os.environ', {'OPENROUTER_API_KEY': 'test-key'})
+    def test_openrouter_tries_the_fastest_model_first(self):
+        slow, fast = providers.OPENROUTER_FREE_MODELS[:2]
+        ranking.record(providers.openrouter_model_name(slow), 8.0)
+        ranking.record(providers.openrouter_model_name(fast), 1.0)
+
+        session = MagicMock()
+        session.post.return_value.json.return_value = {'choices': [{'message': {'content': 'ok'}}]}
+        with patch('api.clients.get_session', return_value=session):
+            providers.call_openrouter([{'role': 'user', 'content': 'hi'}])
+        self.assertEqual(json.loads(session.post.call_args.kwargs['data'])['model'], fast)
+
+    def test_health_shows_the_ranking(self):
+        ranking.record('Groq', 9.0)
+        data = json.loads(self.client.get('/api/health/').content)
+        self.assertEqual(data['ranking']['providers'][-1]['name'], 'Groq')
+        self.assertEqual(data['ranking']['providers'][-1]['samples'], 1)
+        self.assertEqual(len(data['ranking']['openrouter_models']), len(providers.OPENROUTER_FREE_MODELS))
+
+
+@override_settings(HEDGING_ENABLED=True, HEDGE_DELAY_SECONDS=0.05, ANSWER_CACHE_ENABLED=False,
+                   PROVIDER_RANKING_ENABLED=False)
+class HedgingTest(StateTestCase):
+    """A slow provider call is raced against the next provider."""
+
+    def setUp(self):
+        super().setUp()
+        hedging.reset()
+        metrics.reset()
+        import threading
+        self.finished = threading.Semaphore(0)
+        self.slow_calls = 0
+
+    def tearDown(self):
+        for _ in range(self.slow_calls):  # losers keep running after the reply; don't leak into other tests
+            self.finished.acquire(timeout=5)
+
+    def _slow(self, messages, deadline=None, route=None):
+        self.slow_calls += 1
+        time.sleep(0.2)
+        self.finished.release()
+        return 'Slow reply'
+
+    def _post(self, view=chat_view):
+        request = RequestFactory().post('/api/chat/', data=json.dumps({'question': 'Tell me about yourself'}),
+                                        content_type='application/json')
+        return view(request)
+
+    def _hedges(self, outcome):
+        return metrics.snapshot().get((metrics.HEDGES.name, (outcome,)), 0)
+
+    @patch('api.views.call_openrouter', return_value='Fast reply')
+    @patch('api.views.call_groq')
+    def test_slow_call_is_hedged(self, mock_groq, mock_openrouter):
+        mock_groq.side_effect = self._slow
+        data = json.loads(self._post().content)
+        self.assertEqual((data['reply'], data['provider']), ('Fast reply', 'OpenRouter'))
+        self.assertEqual(self._hedges('hedge_won'), 1)
+
+    @patch('api.views.call_openrouter', return_value='Fast reply')
+    @patch('api.views.call_groq', return_value='Groq reply')
+    def test_fast_call_is_not_hedged(self, mock_groq, mock_openrouter):
+        self.assertEqual(json.loads(self._post().content)['provider'], 'Groq')
+        mock_openrouter.assert_not_called()
+
+    @patch('api.views.call_together', return_value='Together reply')
+    @patch('api.views.call_openrouter', side_effect=ValueError('No key'))
+    @patch('api.views.call_groq')
+    def test_failed_hedge_falls_back_to_the_primary(self, mock_groq, mock_openrouter, mock_together):
+        def slow_then_fail(messages, deadline=None, route=None):
+            time.sleep(0.1)
+            raise httpx.ConnectError('Groq down')
+        mock_groq.side_effect = slow_then_fail
+        data = json.loads(self._post().content)
+        self.assertEqual(data['provider'], 'Together AI')
+        self.assertEqual(mock_openrouter.call_count, 1)  # not called again after the hedge
+
+    @patch('api.views.call_together', return_value='Together reply')
+    @patch('api.views.call_openrouter', return_value='Fast reply')
+    @patch('api.views.call_groq')
+    def test_hedge_skips_providers_out_of_quota(self, mock_groq, mock_openrouter, mock_together):
+        mock_groq.side_effect = self._slow
+        limited = MagicMock(status_code=429, headers={'retry-after': '60'})
+        for model in providers.OPENROUTER_FREE_MODELS:
+            quota.observe(providers.openrouter_model_name(model), limited)
+        try:
+            self.assertEqual(json.loads(self._post().content)['provider'], 'Together AI')
+        finally:
+            quota.reset()
+        mock_openrouter.assert_not_called()
+
+    @override_settings(HEDGE_BUDGET_BURST=1, HEDGE_BUDGET_RATIO=0)
+    @patch('api.views.call_openrouter', return_value='Fast reply')
+    @patch('api.views.call_groq')
+    def test_hedges_are_rationed(self, mock_groq, mock_openrouter):
+        mock_groq.side_effect = self._slow
+        self.assertEqual(json.loads(self._post().content)['provider'], 'OpenRouter')
+        self.assertEqual(json.loads(self._post().content)['provider'], 'Groq')
+        self.assertEqual(mock_openrouter.call_count, 1)
+        self.assertEqual(self._hedges('no_budget'), 1)
+
+    @override_settings(HEDGE_MAX_THREADS=1)
+    @patch('api.views.call_openrouter', return_value='Fast reply')
+    @patch('api.views.call_groq')
+    def test_no_hedge_while_the_pool_is_full(self, mock_groq, mock_openrouter):
+        mock_groq.side_effect = self._slow
+        self.assertEqual(json.loads(self._post().content)['provider'], 'Groq')
+        mock_openrouter.assert_not_called()
+        self.assertEqual(self._hedges('pool_full'), 1)
+
+    @patch('api.views.acall_openrouter', new_callable=AsyncMock, return_value='Fast reply')
+    @patch('api.views.acall_groq')
+    def test_async_loser_is_cancelled(self, mock_groq, mock_openrouter):
+        cancelled = []
+
+        async def hang(messages, deadline=None, route=None):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+        mock_groq.side_effect = hang
+
+        data = json.loads(asyncio.run(self._post(achat_view)).content)
+        self.assertEqual(data['provider'], 'OpenRouter')
+        self.assertEqual(cancelled, [True])
+        self.assertEqual(breaker.get('Groq').snapshot()['failure_rate'], 0.0)
+
+    @override_settings(HEDGE_MIN_SAMPLES=10, HEDGE_PERCENTILE=90)
+    def test_delay_is_a_percentile_of_recent_calls(self):
+        self.assertEqual(hedging.delay('Groq'), 0.05)
+        for seconds in range(1, 11):
+            hedging.record('Groq', seconds / 10)
+        self.assertEqual(hedging.delay('Groq'), 0.9)
+
+
+class ColdStartTest(TestCase):
+    """The API-only profile serves /api/ without loading the admin, the HTTP clients or NumPy."""
+
+    def test_api_profile_skips_heavy_imports(self):
+        import os
+        import subprocess
+        import sys
+        from pathlib import Path
+
+        script = (
+            "import io, json, sys\n"
+            "from portfolio_project.wsgi_api import app\n"
+            "environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/health/', 'SERVER_NAME': 'localhost',\n"
+            "           'SERVER_PORT': '80', 'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http'}\n"
+            "status = []\n"
+            "b''.join(app(environ, lambda line, headers: status.append(line)))\n"
+            "heavy = ['django.contrib.admin', 'django.contrib.auth', 'requests', 'httpx', 'numpy']\n"
+            "print(json.dumps([status[0], [name for name in heavy if name in sys.modules]]))\n"
+        )
+        env = {key: value for key, value in os.environ.items() if key != 'DJANGO_SETTINGS_MODULE'}
+        result = subprocess.run([sys.executable, '-c', script], cwd=Path(settings.BASE_DIR), env=env,
+                                capture_output=True, text=True, check=True)
+        status, heavy = json.loads(result.stdout.strip().splitlines()[-1])
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(heavy, [])
+
+
+class QuotaTest(StateTestCase):
+    """Providers that are rate limited or out of quota are skipped before they reject a call."""
+
+    MESSAGES = [{'role': 'user', 'content': 'hi'}]
+
+    def setUp(self):
+        super().setUp()
+        quota.reset()
+
+    def tearDown(self):
+        quota.reset()
+
+    def _response(self, status=200, headers=None, reply='ok'):
+        response = MagicMock(status_code=status, headers=headers or {})
+        response.json.return_value = {'choices': [{'message': {'content': reply}}]}
+        if status >= 400:
+            response.raise_for_status.side_effect = requests.HTTPError(f'{status} error', response=response)
+        return response
+
+    def test_parses_reset_times(self):
+        self.assertAlmostEqual(quota.parse_reset('2m59.56s'), 179.56)
+        self.assertAlmostEqual(quota.parse_reset('7.66s'), 7.66)
+        self.assertAlmostEqual(quota.parse_reset('250ms'), 0.25)
+        self.assertEqual(quota.parse_reset('1h'), 3600)
+        self.assertEqual(quota.parse_reset('12'), 12)
+        self.assertAlmostEqual(quota.parse_reset('1700000030000', now=1700000000), 30)  # OpenRouter: epoch ms
+        self.assertIsNone(quota.parse_reset('soon'))
+        self.assertEqual(quota.parse_retry_after('120'), 120)
+        self.assertAlmostEqual(quota.parse_retry_after('Tue, 14 Nov 2023 22:13:50 GMT', now=1700000000), 30)
+        self.assertIsNone(quota.parse_retry_after(None))
+
+    @patch.dict('os.environ', {'GROQ_API_KEY': 'test-key'})
+    def test_retry_after_is_honored(self):
+        session = MagicMock()
+        session.post.return_value = self._response(429, {'retry-after': '30'})
+        with patch('api.clients.get_session', return_value=session):
+            with self.assertRaises(requests.HTTPError):
+                providers.call_groq(self.MESSAGES)
+            with self.assertRaises(quota.QuotaExhausted):
+                providers.call_groq(self.MESSAGES)
+        self.assertEqual(session.post.call_count, 1)
+        self.assertEqual(quota.snapshot()['Groq']['retry_in'], 30)
+
+    @patch.dict('os.environ', {'GROQ_API_KEY': 'test-key'})
+    def test_routes_away_before_requests_run_out(self):
+        session = MagicMock()
+        session.post.return_value = self._response(headers={
+            'x-ratelimit-remaining-requests': '2', 'x-ratelimit-reset-requests': '1m',
+        })
+        with self.settings(QUOTA_RESERVE_REQUESTS=1), patch('api.clients.get_session', return_value=session):
+            providers.call_groq(self.MESSAGES)
+            session.post.return_value = self._response(headers={'x-ratelimit-remaining-requests': '1'})
+            providers.call_groq(self.MESSAGES)
+            with self.assertRaises(quota.QuotaExhausted):
+                providers.call_groq(self.MESSAGES)
+        self.assertEqual(session.post.call_count, 2)
+
+    def test_tokens_are_estimated_and_spent(self):
+        quota.observe('Groq', self._response(headers={
+            'x-ratelimit-remaining-tokens': '1000', 'x-ratelimit-reset-tokens': '30s',
+        }))
+        tokens = quota.estimate_tokens(self.MESSAGES, 400)
+        self.assertEqual(tokens, history.prompt_tokens(self.MESSAGES) + 400)
+        quota.reserve('Groq', tokens)
+        quota.reserve('Groq', tokens)
+        with self.assertRaises(quota.QuotaExhausted):
+            quota.reserve('Groq', tokens)
+
+    def test_window_reset_forgets_the_count(self):
+        with patch('api.quota.time.monotonic', return_value=100.0):
+            quota.observe('Groq', self._response(headers={
+                'x-ratelimit-remaining-requests': '0', 'x-ratelimit-reset-requests': '10s',
+            }))
+            with self.assertRaises(quota.QuotaExhausted):
+                quota.reserve('Groq', 10)
+        with patch('api.quota.time.monotonic', return_value=111.0):
+            quota.reserve('Groq', 10)
+        self.assertEqual(quota.snapshot(), {})
+
+    def test_mock_headers_are_ignored(self):
+        quota.observe('Groq', MagicMock())
+        quota.reserve('Groq', 10)
+        self.assertEqual(quota.snapshot(), {})
+
+    @patch.dict('os.environ', {'GROQ_API_KEY': 'k', 'TOGETHER_API_KEY': 'k', 'HUGGINGFACE_API_KEY': 'k', 'COHERE_API_KEY': 'k'})
+    def test_expired_deadline_does_not_spend_quota(self):
+        calls = {'Groq': providers.call_groq, 'Together AI': providers.call_together,
+                 'Hugging Face': providers.call_huggingface, 'Cohere': providers.call_cohere}
+        for name, call in calls.items():
+            quota.observe(name, self._response(headers={
+                'x-ratelimit-remaining-requests': '5', 'x-ratelimit-reset-requests': '1m',
+            }))
+            with self.assertRaises(DeadlineExceeded):
+                call(self.MESSAGES, Deadline(1))  # less than CHAT_MIN_ATTEMPT_SECONDS left
+            self.assertEqual(quota.snapshot()[name]['requests_left'], 5)
+
+    @patch.dict('os.environ', {'OPENROUTER_API_KEY': 'test-key'})
+    @override_settings(PROVIDER_RANKING_ENABLED=False, BREAKER_MIN_CALLS=1)
+    def test_open_breaker_does_not_spend_quota(self):
+        first, second = providers.OPENROUTER_FREE_MODELS[:2]
+        quota.observe(providers.openrouter_model_name(first), self._response(headers={
+            'x-ratelimit-remaining-requests': '5', 'x-ratelimit-reset-requests': '1m',
+        }))
+        model_breaker = breaker.get(providers.openrouter_model_name(first))
+        model_breaker.allow()
+        model_breaker.record(requests.ConnectionError('down'))
+        session = MagicMock()
+        session.post.return_value = self._response(reply='from the next model')
+        with patch('api.clients.get_session', return_value=session):
+            for _ in range(3):
+                providers.call_openrouter(self.MESSAGES)
+        self.assertEqual(quota.snapshot()[providers.openrouter_model_name(first)]['requests_left'], 5)
+
+    @patch.dict('os.environ', {'OPENROUTER_API_KEY': 'test-key'})
+    @override_settings(PROVIDER_RANKING_ENABLED=False)
+    def test_openrouter_skips_rate_limited_model(self):
+        first, second = providers.OPENROUTER_FREE_MODELS[:2]
+        quota.observe(providers.openrouter_model_name(first), self._response(429, {'retry-after': '60'}))
+        session = MagicMock()
+        session.post.return_value = self._response(reply='from the next model')
+        with patch('api.clients.get_session', return_value=session):
+            self.assertEqual(providers.call_openrouter(self.MESSAGES), 'from the next model')
+        self.assertEqual(session.post.call_count, 1)
+        self.assertIn(second.encode(), session.post.call_args.kwargs['data'])
+
+    @patch('api.views.call_openrouter', return_value='OpenRouter reply')
+    @patch('api.views.call_groq', side_effect=quota.QuotaExhausted('Groq: rate limited for 30s more'))
+    def test_cascade_skips_without_tripping_the_breaker(self, mock_groq, mock_openrouter):
+        for question in ('Where do you live?', 'What do you do?', 'What is your name?'):
+            request = RequestFactory().post('/api/chat/', data=json.dumps({'question': question}),
+                                            content_type='application/json')
+            data = json.loads(chat_view(request).content)
+            self.assertEqual(data['provider'], 'OpenRouter')
+        self.assertEqual(breaker.get('Groq').snapshot()['calls'], 0)
+
+    def test_health_reports_quota(self):
+        from api.views import health_view
+        quota.observe('Cohere', self._response(429, {'retry-after': '5'}))
+        data = json.loads(health_view(RequestFactory().get('/api/health/')).content)
+        self.assertEqual(data['quota']['Cohere']['retry_in'], 5)
@@ -0,0 +1,148 @@
+"""
+Per-request phase timing.
+
+``TimingMiddleware`` starts a trace for every ``/api/`` request, and code wraps
+its phases in ``span(name)``: request parsing, history normalization, prompt
+building, the answer cache and each provider attempt. The spans go out in a
+``Server-Timing`` header (shown in the browser's network panel), and with
+``TRACE_SAMPLE_RATE`` above 0 a share of requests is also logged as one JSON
+line on the ``api.trace`` logger.
+
+Streamed replies send their headers before the provider is called, so their
+header only covers the work up to that point.
+
+A staff user who is logged in to the admin can send ``X-Profile: 1`` to run a
+request under cProfile. The stats are written to ``PROFILE_DIR`` and the file
+name comes back in ``X-Profile-File``.
+"""
+import contextvars
+import json
+import logging
+import os
+import random
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger('api.trace')
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_STATS_LINES = 25  # functions logged per profiled request
+
+_current = contextvars.ContextVar('api_trace', default=None)
+
+
+def _metric_name(name):
+    # Server-Timing names are HTTP tokens: "Hugging Face" -> "hugging-face"
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+
+
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []  # (name, seconds)
+
+    def add(self, name, seconds):
+        self.spans.append((name, seconds))
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        entries = [
+            f'{_metric_name(name)};desc="{name}";dur={seconds * 1000:.1f}'
+            for name, seconds in self.spans
+        ]
+        entries.append(f"total;dur={self.total() * 1000:.1f}")
+        return ", ".join(entries)
+
+    def as_dict(self):
+        return {
+            'total_ms': round(self.total() * 1000, 1),
+            'spans': [{'name': name, 'ms': round(seconds * 1000, 1)} for name, seconds in self.spans],
+        }
+
+
+def current():
+    return _current.get()
+
+
+def start():
+    """Begin a trace for this request; returns the token for :func:`finish`."""
+    return _current.set(Trace())
+
+
+def finish(token):
+    _current.reset(token)
+
+
+@contextmanager
+def span(name):
+    """Time the block into the current trace (no-op outside a traced request)."""
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - started)
+
+
+def should_log():
+    rate = getattr(settings, 'TRACE_SAMPLE_RATE', 0.0)
+    return rate > 0 and random.random() < rate
+
+
+def log_trace(request, response, trace):
+    trace_logger.info(json.dumps({
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        **trace.as_dict(),
+    }))
+
+
+# === cProfile capture ===
+def wants_profile(request):
+    if request.META.get(PROFILE_HEADER) != '1':
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_active and user.is_staff)
+
+
+def start_profile():
+    import cProfile  # staff-only; kept out of the cold start
+
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:  # another profiler is already running on this thread
+        logger.warning(f"Profiling skipped: {e}")
+        return None
+    return profiler
+
+
+def save_profile(profiler, request):
+    """Dump the stats to PROFILE_DIR and log the slowest calls; returns the file name."""
+    import pstats
+
+    profiler.disable()
+    directory = getattr(settings, 'PROFILE_DIR', '') or os.path.join(tempfile.gettempdir(), 'api-profiles')
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{_metric_name(request.path) or 'root'}-{os.getpid()}.prof"
+    profiler.dump_stats(os.path.join(directory, name))
+
+    stats = pstats.Stats(profiler)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_STATS_LINES]
+    summary = "\n".join(
+        f"{cumulative * 1000:9.1f}ms {calls:6d} {pstats.func_std_string(func)}"
+        for func, (_, calls, _, cumulative, _) in rows
+    )
+    logger.info(f"Profiled {request.method} {request.path} -> {name}\n{summary}")
+    return name
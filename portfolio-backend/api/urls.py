@@ -1,7 +1,14 @@
 # api/urls.py
+from django.conf import settings
 from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('chat/', views.chat_view, name='chat'),
-]
\ No newline at end of file
+    path('chat/', views.achat_view if settings.CHAT_ASYNC else views.chat_view, name='chat'),
+    path('chat/async/', views.achat_view, name='chat-async'),
+    path('chat/stream/', views.achat_stream_view if settings.CHAT_ASYNC else views.chat_stream_view,
+         name='chat-stream'),
+    path('health/', views.health_view, name='health'),
+    path('views/', views.view_count_view, name='views'),
+    path('metrics', views.metrics_view, name='metrics'),
+]
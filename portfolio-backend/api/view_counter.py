@@ -0,0 +1,151 @@
+"""
+Write-behind page-view counter.
+
+A database write per page view would queue every visitor behind SQLite's
+single write lock. Views are counted in process memory instead and added to
+the ``ViewCounter`` row in one ``UPDATE ... SET count = count + n`` once
+``VIEW_COUNTER_FLUSH_SIZE`` views are pending, or ``VIEW_COUNTER_FLUSH_SECONDS``
+after the first unflushed view, whichever comes first. Pending views are also
+flushed when the process exits, and a failed flush keeps them for the next one.
+
+Each client counts at most once per ``VIEW_COUNTER_CLIENT_WINDOW`` seconds
+(per process, remembering up to ``VIEW_COUNTER_MAX_CLIENTS`` clients), so a
+script POSTing in a loop can't inflate the count.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+COUNTER_ID = 1  # the single site-wide row
+
+
+def _persist(views):
+    from .models import ViewCounter
+
+    now = timezone.now()  # update() skips auto_now
+    counter = ViewCounter.objects.filter(pk=COUNTER_ID)
+    if counter.update(count=F('count') + views, last_updated=now):
+        return
+    try:
+        with transaction.atomic():
+            ViewCounter.objects.create(pk=COUNTER_ID, count=views)
+    except IntegrityError:  # another worker created it first
+        counter.update(count=F('count') + views, last_updated=now)
+
+
+class ViewBuffer:
+    def __init__(self, flush_size, flush_seconds):
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.pending = 0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, views=1):
+        with self._lock:
+            self.pending += views
+            flush_now = self.pending >= self.flush_size
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(self.flush_seconds, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
+
+    def flush(self):
+        """Write the pending views in one UPDATE; returns how many were written."""
+        with self._lock:
+            views, self.pending = self.pending, 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not views:
+            return 0
+        try:
+            _persist(views)
+        except DatabaseError as e:
+            logger.warning(f"View counter flush failed, keeping {views} views pending: {e}")
+            with self._lock:
+                self.pending += views
+            return 0
+        return views
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()  # this thread's connections only
+
+    def cancel(self):
+        """Drop pending views and stop the timer (tests)."""
+        with self._lock:
+            self.pending = 0
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ViewBuffer(
+                    flush_size=getattr(settings, 'VIEW_COUNTER_FLUSH_SIZE', 50),
+                    flush_seconds=getattr(settings, 'VIEW_COUNTER_FLUSH_SECONDS', 5),
+                )
+                atexit.register(_buffer.flush)
+    return _buffer
+
+
+_seen = LRUCache(
+    maxsize=getattr(settings, 'VIEW_COUNTER_MAX_CLIENTS', 10000),
+    ttl=getattr(settings, 'VIEW_COUNTER_CLIENT_WINDOW', 1800),
+)
+_seen_lock = threading.Lock()
+
+
+def record_view(client_id=None):
+    """Count a view, unless ``client_id`` already had one counted in the current window."""
+    if client_id is not None:
+        with _seen_lock:
+            if _seen.get(client_id) is not None:
+                return False
+            _seen.set(client_id, True)
+    get_buffer().add()
+    return True
+
+
+def total():
+    """Stored views plus the ones this process hasn't flushed yet."""
+    from .models import ViewCounter
+
+    try:
+        stored = ViewCounter.objects.filter(pk=COUNTER_ID).values_list('count', flat=True).first() or 0
+    except DatabaseError as e:
+        logger.warning(f"View counter read failed: {e}")
+        stored = 0
+    return stored + get_buffer().pending
+
+
+def reset():
+    global _buffer
+    _seen.clear()
+    with _buffer_lock:
+        if _buffer is not None:
+            _buffer.cancel()
+            atexit.unregister(_buffer.flush)
+        _buffer = None
@@ -0,0 +1,18 @@
+"""
+Benchmarks for the chat backend. Run from ``portfolio-backend/``, e.g.::
+
+    python -m benchmarks.bench_http_pool
+"""
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'portfolio_project.settings')
+    import django
+    django.setup()
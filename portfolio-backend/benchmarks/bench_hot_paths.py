@@ -0,0 +1,209 @@
+"""
+Per-function budgets for the chat hot path, checked against a stored baseline.
+
+    python -m benchmarks.bench_hot_paths             # measure, print JSON
+    python -m benchmarks.bench_hot_paths --save      # measure and store as the baseline
+    python -m benchmarks.bench_hot_paths --compare   # measure and exit 1 on a regression
+
+Each case is timed like ``timeit`` (the loop size grown until one takes
+``--min-time``, best of ``--repeat`` loops) and then called once under
+``tracemalloc`` for its peak allocation. The loops run in rounds, one per case
+per round, so a machine that runs slower for a while slows every case alike.
+``--compare`` divides each case's time ratio to the baseline by the median
+ratio of all cases (how fast the machine runs today; with fewer than three
+cases, by 1), and flags a case whose time grew by more than ``--threshold``
+over that, or whose peak allocation grew by more than ``--alloc-threshold``,
+against the baseline in ``--baseline``. A change that slows every case alike
+looks like a slower machine; the median ratio is reported as
+``machine_speed_ratio``. Noise comes in bursts that can slow a case by 40% for
+a whole run, so a case that looks regressed is timed again, up to
+``--retries`` times, keeping its best time: a real regression stays.
+
+Times depend on the machine, so only compare against a baseline saved on the
+same one (the baseline records its Python version and platform).
+"""
+import argparse
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from . import setup_django
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "hot_paths.json"
+QUESTION = "What projects have you built with Django?"
+PREVIOUS_QUESTION = "What are your technical skills?"
+ALLOC_SLACK_BYTES = 64  # allocation growth below this is noise (e.g. a longer interned string)
+
+
+def _history(turns):
+    history = []
+    for i in range(turns):
+        if i % 2 == 0:
+            history.append({"role": "user", "content": f"Turn {i}: " + "a question about your work " * 4})
+        else:  # the frontend sends Gemini-style turns
+            history.append({"role": "model", "parts": [{"text": f"Turn {i}: " + "an earlier reply " * 12}]})
+    return history
+
+
+def _cases(turns):
+    from django.test import RequestFactory
+
+    from api import payloads, providers, ratelimit, retrieval, router, views
+
+    request = RequestFactory().post(
+        "/api/chat/", HTTP_X_FORWARDED_FOR="203.0.113.7, 10.0.0.2, 10.0.0.1", REMOTE_ADDR="10.0.0.1",
+    )
+    ratelimit.reset()
+    ips = itertools.cycle([f"198.51.{i // 256}.{i % 256}" for i in range(50000)])
+
+    history = _history(turns)
+    messages = [
+        {"role": "system", "content": payloads.system_prompt(retrieval.relevant_chunks(QUESTION))},
+        *views.normalize_history(history),
+        {"role": "user", "content": QUESTION},
+    ]
+
+    return {
+        "get_client_ip": lambda: views.get_client_ip(request),
+        "is_rate_limited": lambda: ratelimit.is_rate_limited(next(ips)),
+        "normalize_history": lambda: views.normalize_history(history),
+        "classify_intent": lambda: router.classify(QUESTION),
+        "system_prompt": lambda: payloads.system_prompt(retrieval.relevant_chunks(QUESTION, PREVIOUS_QUESTION)),
+        "huggingface_body": lambda: providers.HUGGINGFACE_BODY.render(messages),
+        "cohere_body": lambda: providers.COHERE_BODY.render(messages),
+    }
+
+
+def _loop(func, number):
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+    return time.perf_counter() - start
+
+
+def _loop_size(func, min_time):
+    number = 1
+    while True:
+        elapsed = _loop(func, number)
+        if elapsed >= min_time:
+            return number
+        number *= 2 if elapsed > min_time / 4 else 10
+
+
+def _ns_per_call(funcs, repeat, min_time):
+    """Best time per call of each function, timed in ``repeat`` interleaved rounds."""
+    numbers = {name: _loop_size(func, min_time) for name, func in funcs.items()}
+    best = dict.fromkeys(funcs, float("inf"))
+    for _ in range(repeat):
+        for name, func in funcs.items():
+            best[name] = min(best[name], _loop(func, numbers[name]) / numbers[name])
+    return {name: seconds * 1e9 for name, seconds in best.items()}
+
+
+def _peak_alloc(func):
+    func()  # warm caches, so only the per-call allocations are counted
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    func()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return peak
+
+
+def measure(turns, repeat, min_time, only=None):
+    cases = {name: func for name, func in _cases(turns).items() if not only or name in only}
+    times = _ns_per_call(cases, repeat, min_time)
+    return {
+        name: {"ns_per_call": round(times[name], 1), "peak_alloc_bytes": _peak_alloc(func)}
+        for name, func in cases.items()
+    }
+
+
+def machine_speed(results, baseline):
+    """Median time ratio over the cases in both, or 1.0 with fewer than three to judge by."""
+    ratios = sorted(results[name]["ns_per_call"] / baseline[name]["ns_per_call"]
+                    for name in results if name in baseline)
+    if len(ratios) < 3:
+        return 1.0
+    return statistics.median(ratios)
+
+
+def compare(results, baseline, threshold, alloc_threshold):
+    """Per-case ratios against the baseline, and the names of the cases that regressed."""
+    speed = machine_speed(results, baseline)
+    comparison, regressions = {}, []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            comparison[name] = {"status": "new"}
+            continue
+        time_ratio = result["ns_per_call"] / before["ns_per_call"] / speed
+        alloc_growth = result["peak_alloc_bytes"] - before["peak_alloc_bytes"]
+        alloc_ratio = (result["peak_alloc_bytes"] + 1) / (before["peak_alloc_bytes"] + 1)
+        regressed = (time_ratio > 1 + threshold
+                     or (alloc_ratio > 1 + alloc_threshold and alloc_growth > ALLOC_SLACK_BYTES))
+        comparison[name] = {
+            "time_ratio": round(time_ratio, 3),
+            "alloc_ratio": round(alloc_ratio, 3),
+            "status": "regressed" if regressed else "ok",
+        }
+        if regressed:
+            regressions.append(name)
+    return comparison, regressions
+
+
+def _environment():
+    return {"python": platform.python_version(), "platform": platform.platform()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="exit 1 if a case regressed past the thresholds")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.30, help="allowed time increase (0.30 = +30%%)")
+    parser.add_argument("--alloc-threshold", type=float, default=0.10, help="allowed peak allocation increase")
+    parser.add_argument("--turns", type=int, default=6, help="earlier conversation turns")
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per timing loop")
+    parser.add_argument("--only", action="append", help="run just this case (repeatable)")
+    parser.add_argument("--retries", type=int, default=3, help="times to re-time a case that looks regressed")
+    args = parser.parse_args()
+
+    setup_django()
+    results = measure(args.turns, args.repeat, args.min_time, args.only)
+    report = {"environment": _environment(), "turns": args.turns, "results": results}
+
+    if args.compare:
+        stored = json.loads(args.baseline.read_text())
+        if stored["environment"] != report["environment"]:
+            print(f"Warning: baseline was recorded on {stored['environment']}", file=sys.stderr)
+        comparison, regressions = compare(results, stored["results"], args.threshold, args.alloc_threshold)
+        for _ in range(args.retries if regressions else 0):
+            for name, result in measure(args.turns, args.repeat, args.min_time, regressions).items():
+                results[name]["ns_per_call"] = min(results[name]["ns_per_call"], result["ns_per_call"])
+            comparison, regressions = compare(results, stored["results"], args.threshold, args.alloc_threshold)
+            if not regressions:
+                break
+        report["machine_speed_ratio"] = round(machine_speed(results, stored["results"]), 3)
+        report["comparison"] = comparison
+        report["regressions"] = regressions
+
+    print(json.dumps(report, indent=2))
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+    if args.compare and report["regressions"]:
+        print(f"Regressed past the thresholds: {', '.join(report['regressions'])}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Bare ``requests.post`` vs the pooled provider sessions against a local stub.
+
+    python -m benchmarks.bench_http_pool --requests 200 --tls
+
+Prints JSON with per-mode mean/p50/p95 latency and how many TCP connections the
+stub accepted; the pooled mode should open one.
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+from . import setup_django
+from .stub_server import start_stub_server
+
+PAYLOAD = {"model": "stub", "messages": [{"role": "user", "content": "hi"}]}
+HEADERS = {"Authorization": "Bearer stub", "Content-Type": "application/json"}
+
+
+def _self_signed_cert(directory):
+    cert, key = Path(directory) / "cert.pem", Path(directory) / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-keyout", str(key), "-out", str(cert)],
+        check=True, capture_output=True,
+    )
+    return str(cert), str(key)
+
+
+def _run(send, n):
+    timings = []
+    for _ in range(n):
+        start = time.perf_counter()
+        send().raise_for_status()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "mean_ms": round(statistics.fmean(timings), 3),
+        "p50_ms": round(timings[len(timings) // 2], 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95) - 1], 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub response delay (s)")
+    parser.add_argument("--tls", action="store_true", help="serve the stub over HTTPS")
+    args = parser.parse_args()
+
+    setup_django()
+    import requests
+    from api import clients
+
+    warnings.filterwarnings("ignore", message="Unverified HTTPS request")
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile, keyfile = _self_signed_cert(tmp) if args.tls else (None, None)
+        results = {}
+
+        server, base_url = start_stub_server(args.latency, certfile, keyfile)
+        url = f"{base_url}/v1/chat/completions"
+        results["bare"] = _run(
+            lambda: requests.post(url, headers=HEADERS, json=PAYLOAD, timeout=30, verify=False),
+            args.requests,
+        )
+        results["bare"]["connections"] = server.connections
+        server.shutdown()
+
+        server, base_url = start_stub_server(args.latency, certfile, keyfile)
+        url = f"{base_url}/v1/chat/completions"
+        session = clients.get_session(url)
+        session.verify = False
+        session.trust_env = False  # a CA bundle in the environment would override verify
+        results["pooled"] = _run(lambda: clients.post(url, HEADERS, PAYLOAD), args.requests)
+        results["pooled"]["connections"] = server.connections
+        server.shutdown()
+        clients.close_all()
+
+    results["requests"] = args.requests
+    results["tls"] = args.tls
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
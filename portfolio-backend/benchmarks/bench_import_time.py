@@ -0,0 +1,159 @@
+"""
+Cold-start cost of the API function, checked against a stored baseline.
+
+    python -m benchmarks.bench_import_time             # measure, print JSON
+    python -m benchmarks.bench_import_time --save      # measure and store as the baseline
+    python -m benchmarks.bench_import_time --compare   # measure and exit 1 on a regression
+
+Each run starts a fresh ``python -X importtime`` process that loads a WSGI
+entry point and serves one ``GET /api/health/``, which is what a serverless
+cold start does before the first visitor gets a reply. For each settings
+profile (``api``: ``wsgi_api.py``, what Vercel deploys; ``full``: ``wsgi.py``
+with the admin) it reports the time to that reply, the total import time, the
+import time per top-level package and the slowest top-level imports, from the
+median of ``--runs`` processes.
+
+``--compare`` fails if the api profile's cold start grew by more than
+``--threshold`` over the baseline in ``--baseline``, or if it loads any of
+``HEAVY_MODULES``, which should only be imported on first use. Times depend on
+the machine, so only compare them against a baseline saved on the same one;
+the module check holds anywhere.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+from . import BACKEND_DIR
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "import_time.json"
+PROFILES = {"api": "portfolio_project.wsgi_api", "full": "portfolio_project.wsgi"}
+CHECKED_PROFILE = "api"
+HEAVY_MODULES = (
+    "django.contrib.admin", "django.contrib.auth", "django.contrib.sessions", "django.contrib.messages",
+    "requests", "httpx", "numpy",
+)
+
+# Runs in the child process: load the entry point and serve one request
+_COLD_START = """
+import io, json, sys, time
+started = time.perf_counter()
+from importlib import import_module
+app = import_module(sys.argv[1]).app
+environ = {
+    "REQUEST_METHOD": "GET", "PATH_INFO": "/api/health/", "SERVER_NAME": "localhost", "SERVER_PORT": "80",
+    "HTTP_HOST": "localhost", "wsgi.input": io.BytesIO(), "wsgi.url_scheme": "http",
+}
+status = []
+b"".join(app(environ, lambda line, headers, exc_info=None: status.append(line)))
+print(json.dumps({
+    "status": status[0],
+    "cold_start_ms": (time.perf_counter() - started) * 1000,
+    "heavy_modules": [name for name in sys.argv[2:] if name in sys.modules],
+}))
+"""
+
+
+def _parse_importtime(stderr):
+    """``(total_ms, {package: self_ms}, {top-level import: cumulative_ms})`` from ``-X importtime`` output."""
+    total = 0
+    packages = defaultdict(int)
+    top_level = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        module = name.strip()
+        total += int(self_us)
+        packages[module.split(".")[0]] += int(self_us)
+        if not name[1:].startswith(" "):  # not nested under another import
+            top_level[module] = int(cumulative_us)
+    return total / 1000, {name: us / 1000 for name, us in packages.items()}, {
+        name: us / 1000 for name, us in top_level.items()
+    }
+
+
+def _run(entry_point):
+    env = {**os.environ, "PYTHONPATH": str(BACKEND_DIR), "LLM_HTTP_WARMUP": "0", "METRICS_DIR": ""}
+    env.pop("DJANGO_SETTINGS_MODULE", None)  # each entry point picks its own profile
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _COLD_START, entry_point, *HEAVY_MODULES],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    run["import_ms"], run["packages"], run["top_level"] = _parse_importtime(result.stderr)
+    return run
+
+
+def measure(runs, top):
+    results = {}
+    for profile, entry_point in PROFILES.items():
+        samples = sorted((_run(entry_point) for _ in range(runs)), key=lambda run: run["cold_start_ms"])
+        median = samples[len(samples) // 2]
+        slowest = sorted(median["top_level"].items(), key=lambda item: item[1], reverse=True)[:top]
+        results[profile] = {
+            "entry_point": entry_point,
+            "status": median["status"],
+            "cold_start_ms": round(statistics.median(run["cold_start_ms"] for run in samples), 1),
+            "import_ms": round(statistics.median(run["import_ms"] for run in samples), 1),
+            "packages_ms": {
+                name: round(ms, 1)
+                for name, ms in sorted(median["packages"].items(), key=lambda item: item[1], reverse=True)[:top]
+            },
+            "slowest_imports_ms": {name: round(ms, 1) for name, ms in slowest},
+            "heavy_modules": median["heavy_modules"],
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    """The checked profile's cold start against the baseline, and what regressed."""
+    now, before = results[CHECKED_PROFILE], baseline[CHECKED_PROFILE]
+    ratio = now["cold_start_ms"] / before["cold_start_ms"]
+    regressions = [f"heavy module {name}" for name in now["heavy_modules"]]
+    if ratio > 1 + threshold:
+        regressions.append(f"cold start {before['cold_start_ms']} -> {now['cold_start_ms']} ms")
+    return {"cold_start_ratio": round(ratio, 3), "status": "regressed" if regressions else "ok"}, regressions
+
+
+def _environment():
+    return {"python": platform.python_version(), "platform": platform.platform()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--save", action="store_true", help="store the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="exit 1 if the api profile regressed")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=0.30, help="allowed cold-start increase (0.30 = +30%%)")
+    parser.add_argument("--runs", type=int, default=5, help="processes started per profile")
+    parser.add_argument("--top", type=int, default=10, help="packages and imports listed per profile")
+    args = parser.parse_args()
+
+    results = measure(args.runs, args.top)
+    report = {"environment": _environment(), "runs": args.runs, "results": results}
+    report["saved_ms"] = round(results["full"]["cold_start_ms"] - results["api"]["cold_start_ms"], 1)
+
+    if args.compare:
+        stored = json.loads(args.baseline.read_text())
+        if stored["environment"] != report["environment"]:
+            print(f"Warning: baseline was recorded on {stored['environment']}", file=sys.stderr)
+        report["comparison"], report["regressions"] = compare(results, stored["results"], args.threshold)
+
+    print(json.dumps(report, indent=2))
+
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+    if args.compare and report["regressions"]:
+        print(f"Regressed: {', '.join(report['regressions'])}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
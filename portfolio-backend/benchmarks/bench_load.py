@@ -0,0 +1,261 @@
+"""
+Load test of ``/api/chat/`` against local stub providers.
+
+    python -m benchmarks.bench_load --requests 500 --concurrency 20 --latency 0.2
+    python -m benchmarks.bench_load --stub groq:error_rate=0.3 --stub openrouter:rate_limit_rate=0.5
+    python -m benchmarks.bench_load --asgi  # uvicorn + the async view
+    python -m benchmarks.bench_load --stub groq:slow_rate=0.02,slow_latency=3 --hedging
+    python -m benchmarks.bench_load --stub groq:quota=20 --ignore-quota  # vs. without --ignore-quota
+
+Starts one stub per provider (``benchmarks/stub_server.py``), points the
+provider base URLs at them, serves the app in-process (threaded WSGI server,
+or uvicorn with ``--asgi``) on a throwaway SQLite database, and sends
+``--requests`` chats from ``--concurrency`` client threads. The answer cache
+and single-flight coalescing are off unless ``--cache`` / ``--single-flight``
+are given, so every chat reaches the providers.
+Hedging is off unless ``--hedging`` is given, and ``--ignore-quota`` turns
+off the app's quota tracking.
+``--stub NAME:key=value,...`` overrides ``latency``, ``error_rate``,
+``rate_limit_rate``, ``slow_rate``, ``slow_latency``, ``quota`` or
+``quota_window`` for one provider (groq, openrouter, together, huggingface,
+cohere).
+
+Prints JSON (also written to ``--output``) with throughput, latency
+percentiles, status codes, which provider answered, the cascade depth from
+``api.metrics`` and what each stub saw, so runs can be compared across commits.
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from . import setup_django
+from .stub_server import start_stub_server
+
+# provider -> (base URL setting, API key variable, path prefix the real API uses)
+PROVIDERS = {
+    "groq": ("GROQ_BASE_URL", "GROQ_API_KEY", "/openai/v1"),
+    "openrouter": ("OPENROUTER_BASE_URL", "OPENROUTER_API_KEY", "/api/v1"),
+    "together": ("TOGETHER_BASE_URL", "TOGETHER_API_KEY", "/v1"),
+    "huggingface": ("HUGGINGFACE_BASE_URL", "HUGGINGFACE_API_KEY", ""),
+    "cohere": ("COHERE_BASE_URL", "COHERE_API_KEY", ""),
+}
+STUB_OPTIONS = ("latency", "error_rate", "rate_limit_rate", "slow_rate", "slow_latency", "quota", "quota_window")
+# Open-ended, so neither the knowledge-base fast path nor a router template answers it
+QUESTION = "Why did you choose Django for Smart Nutri?"
+
+
+def _stub_overrides(specs):
+    overrides = {name: {} for name in PROVIDERS}
+    for spec in specs:
+        name, _, options = spec.partition(":")
+        if name not in PROVIDERS:
+            raise SystemExit(f"Unknown provider {name!r} in --stub (one of {', '.join(PROVIDERS)})")
+        for option in filter(None, options.split(",")):
+            key, _, value = option.partition("=")
+            if key not in STUB_OPTIONS:
+                raise SystemExit(f"Unknown stub option {key!r} (one of {', '.join(STUB_OPTIONS)})")
+            overrides[name][key] = float(value)
+    return overrides
+
+
+def _start_stubs(args):
+    stubs = {}
+    overrides = _stub_overrides(args.stub)
+    for name, (setting, key_variable, prefix) in PROVIDERS.items():
+        options = {"latency": args.latency, "error_rate": args.error_rate,
+                   "rate_limit_rate": args.rate_limit_rate, **overrides[name]}
+        server, base_url = start_stub_server(**options)
+        stubs[name] = server
+        # Read by settings.py, so this has to happen before Django is set up
+        os.environ[setting] = f"{base_url}{prefix}"
+        os.environ[key_variable] = "stub"
+    return stubs
+
+
+def _use_scratch_database(directory):
+    from django.conf import settings
+    from django.core.management import call_command
+
+    settings.DATABASES["default"]["NAME"] = os.path.join(directory, "load.sqlite3")
+    call_command("migrate", verbosity=0)
+
+
+def _serve_wsgi():
+    from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+    from django.core.wsgi import get_wsgi_application
+
+    class QuietHandler(WSGIRequestHandler):
+        disable_nagle_algorithm = True  # else delayed ACKs add ~40ms to every response
+
+        def log_message(self, format, *args):
+            pass
+
+    class Server(ThreadedWSGIServer):
+        request_queue_size = 1024
+
+    server = Server(("127.0.0.1", 0), QuietHandler)
+    server.set_app(get_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}", server.shutdown
+
+
+def _serve_asgi():
+    import uvicorn
+    from django.core.asgi import get_asgi_application
+
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(get_asgi_application(), log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+    def stop():
+        server.should_exit = True
+    return f"http://127.0.0.1:{sock.getsockname()[1]}", stop
+
+
+def _percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _drive(url, total, concurrency):
+    import requests
+
+    local = threading.local()
+
+    def send(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = session.post(url, json={"question": QUESTION}, timeout=60)
+            status, provider = response.status_code, response.json().get("provider")
+        except (requests.RequestException, ValueError) as e:
+            status, provider = type(e).__name__, None
+        return time.perf_counter() - start, status, provider
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(send, range(total)))
+    return results, time.perf_counter() - start
+
+
+def _cascade_depth(metrics):
+    from api.metrics import CASCADE_DEPTH
+
+    histogram, total, count = Counter(), 0, 0
+    for (name, labels), counts in metrics.snapshot().items():
+        if name != CASCADE_DEPTH.name:
+            continue
+        outcome = labels[0]
+        for bound, n in zip((*CASCADE_DEPTH.buckets, "more"), counts):
+            if n:
+                histogram[f"{outcome}:{bound}"] += n
+        total += counts[-2]
+        count += counts[-1]
+    return {"mean": round(total / count, 3) if count else None, "histogram": dict(sorted(histogram.items()))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=10, help="requests sent before measuring")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub response delay (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of stub calls answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share answered with 429")
+    parser.add_argument("--stub", action="append", default=[], metavar="NAME:key=value,...")
+    parser.add_argument("--asgi", action="store_true", help="serve with uvicorn and the async view")
+    parser.add_argument("--cache", action="store_true", help="keep the answer cache on")
+    parser.add_argument("--single-flight", action="store_true", help="let identical in-flight chats share a call")
+    parser.add_argument("--hedging", action="store_true", help="race slow provider calls against the next provider")
+    parser.add_argument("--ignore-quota", action="store_true",
+                        help="don't track provider quotas (QUOTA_ENABLED=0), to compare against")
+    parser.add_argument("--output", help="also write the JSON results here")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's provider warnings")
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.disable(logging.WARNING)  # injected failures would log one line each
+
+    stubs = _start_stubs(args)
+    os.environ["RATE_LIMIT_MAX_REQUESTS"] = str(10 ** 9)  # one client IP sends everything
+    os.environ.pop("METRICS_DIR", None)
+    if not args.cache:
+        os.environ["ANSWER_CACHE_ENABLED"] = "0"
+    if not args.single_flight:
+        os.environ["SINGLE_FLIGHT_ENABLED"] = "0"
+    if args.hedging:
+        os.environ["HEDGING_ENABLED"] = "1"
+    if args.ignore_quota:
+        os.environ["QUOTA_ENABLED"] = "0"
+    if args.asgi:
+        os.environ["CHAT_ASYNC"] = "1"
+    setup_django()
+    from api import metrics
+
+    with tempfile.TemporaryDirectory() as directory:
+        _use_scratch_database(directory)
+        base_url, stop = _serve_asgi() if args.asgi else _serve_wsgi()
+        url = f"{base_url}/api/chat/"
+
+        _drive(url, args.warmup, args.concurrency)
+        metrics.reset()
+        before = {
+            name: (server.requests, server.errors, server.rate_limited, server.over_quota)
+            for name, server in stubs.items()
+        }
+
+        results, elapsed = _drive(url, args.requests, args.concurrency)
+        stop()
+
+    latencies = sorted(seconds * 1000 for seconds, _, _ in results)
+    report = {
+        "config": {
+            "requests": args.requests, "concurrency": args.concurrency, "server": "asgi" if args.asgi else "wsgi",
+            "latency": args.latency, "error_rate": args.error_rate, "rate_limit_rate": args.rate_limit_rate,
+            "stub_overrides": args.stub, "cache": args.cache, "single_flight": args.single_flight,
+            "hedging": args.hedging, "quota_tracking": not args.ignore_quota,
+        },
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(results) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies), 1),
+            "p50": round(_percentile(latencies, 0.50), 1),
+            "p95": round(_percentile(latencies, 0.95), 1),
+            "p99": round(_percentile(latencies, 0.99), 1),
+            "max": round(latencies[-1], 1),
+        },
+        "status": dict(Counter(str(status) for _, status, _ in results)),
+        "answered_by": dict(Counter(provider for _, status, provider in results if provider)),
+        "cascade_depth": _cascade_depth(metrics),
+        "stubs": {
+            name: {
+                "requests": server.requests - before[name][0],
+                "errors_injected": server.errors - before[name][1],
+                "rate_limited_injected": server.rate_limited - before[name][2],
+                "over_quota": server.over_quota - before[name][3],
+            }
+            for name, server in stubs.items()
+        },
+    }
+    for server in stubs.values():
+        server.shutdown()
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+System-prompt size with and without knowledge-base section retrieval.
+
+    python -m benchmarks.bench_prompt_tokens --top-k 3
+
+Builds the provider messages for a set of typical visitor questions and prints
+JSON with the estimated prompt tokens per question (about 4 characters per
+token), the mean reduction and the time spent in retrieval.
+"""
+import argparse
+import json
+import time
+
+from . import setup_django
+
+QUESTIONS = [
+    "What are your technical skills?",
+    "Tell me about your projects",
+    "Where have you worked?",
+    "Where did you study?",
+    "How can I contact you?",
+    "Do you know Django?",
+    "What are your hobbies?",
+    "What are your career goals?",
+    "What certifications do you have?",
+    "What did you build at WebAura?",
+    "Tell me about yourself",
+]
+
+
+def _tokens(text):
+    return round(len(text) / 4)
+
+
+def _system_prompt(factory, build_messages, question):
+    request = factory.post('/api/chat/', data=json.dumps({'question': question}),
+                           content_type='application/json')
+    return build_messages(request)[0][0]['content']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--top-k", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=1000, help="retrieval calls timed per question")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test import RequestFactory
+    from django.test.utils import override_settings
+    from api import retrieval
+    from api.views import build_messages
+
+    factory = RequestFactory()
+    overrides = {} if args.top_k is None else {'KB_RETRIEVAL_TOP_K': args.top_k}
+    rows = []
+    with override_settings(**overrides):
+        for question in QUESTIONS:
+            with override_settings(KB_RETRIEVAL_ENABLED=False):
+                full = _tokens(_system_prompt(factory, build_messages, question))
+            retrieved = _tokens(_system_prompt(factory, build_messages, question))
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                retrieval.relevant_knowledge(question)
+            retrieval_us = (time.perf_counter() - start) / args.repeat * 1e6
+            rows.append({
+                "question": question,
+                "full_tokens": full,
+                "retrieved_tokens": retrieved,
+                "reduction_pct": round(100 * (1 - retrieved / full), 1),
+                "retrieval_us": round(retrieval_us, 1),
+            })
+
+    print(json.dumps({
+        "questions": rows,
+        "mean_full_tokens": round(sum(r["full_tokens"] for r in rows) / len(rows)),
+        "mean_retrieved_tokens": round(sum(r["retrieved_tokens"] for r in rows) / len(rows)),
+        "mean_reduction_pct": round(sum(r["reduction_pct"] for r in rows) / len(rows), 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
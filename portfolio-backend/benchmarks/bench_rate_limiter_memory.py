@@ -0,0 +1,75 @@
+"""
+Memory held by the rate limiter as distinct client IPs keep arriving.
+
+    python -m benchmarks.bench_rate_limiter_memory --ips 1000000
+
+Sends one request from each of ``--ips`` distinct addresses through the old
+per-IP timestamp lists and through the bounded in-memory limiter, and prints
+JSON with the traced memory (MB) at regular checkpoints and the time per hit.
+The old limiter grows with every new IP; the new one levels off at
+``--max-keys`` tracked clients.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+
+from . import setup_django
+
+
+def _legacy_limiter(window=60, limit=20):
+    cache = defaultdict(list)
+
+    def is_rate_limited(ip):
+        now = time.time()
+        cache[ip] = [t for t in cache[ip] if now - t < window]
+        if len(cache[ip]) >= limit:
+            return True
+        cache[ip].append(now)
+        return False
+    return is_rate_limited
+
+
+def _ip(i):
+    return f"{10 + (i >> 24) % 200}.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+
+
+def _run(hit, ips, checkpoints):
+    growth = []
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for i in range(ips):
+        hit(_ip(i))
+        if (i + 1) % checkpoints == 0:
+            growth.append({"ips": i + 1, "mb": round((tracemalloc.get_traced_memory()[0] - baseline) / 2**20, 1)})
+    elapsed = time.perf_counter() - start
+    tracemalloc.stop()
+    return {"memory": growth, "us_per_hit_traced": round(elapsed / ips * 1e6, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ips", type=int, default=1_000_000)
+    parser.add_argument("--max-keys", type=int, default=50000)
+    parser.add_argument("--checkpoints", type=int, default=None, help="report every N ips (default: ips / 10)")
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+    checkpoints = args.checkpoints or max(1, args.ips // 10)
+
+    setup_django()
+    from api.ratelimit import MemoryLimiter
+
+    results = {"ips": args.ips, "max_keys": args.max_keys}
+    if not args.skip_legacy:
+        results["legacy_lists"] = _run(_legacy_limiter(), args.ips, checkpoints)
+    for algorithm in ("sliding_window", "token_bucket"):
+        limiter = MemoryLimiter(limit=20, window=60, algorithm=algorithm, max_keys=args.max_keys)
+        results[algorithm] = _run(limiter.hit, args.ips, checkpoints)
+        results[algorithm]["tracked_clients"] = len(limiter)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
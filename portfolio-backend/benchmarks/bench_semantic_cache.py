@@ -0,0 +1,70 @@
+"""
+Lookup latency and memory of the semantic answer-cache tier.
+
+    python -m benchmarks.bench_semantic_cache --entries 50000
+
+Fills the cache with synthetic questions and prints JSON with embed/lookup
+p50/p99 in microseconds and the size of the vector matrix.
+"""
+import argparse
+import json
+import random
+import time
+
+from . import setup_django
+
+WORDS = (
+    "python django react native nextjs postgres mysql fastapi docker git skills projects experience "
+    "education college cricket movies hobbies contact email phone linkedin github leetcode internship "
+    "freelance portal nutrition recommendation clustering machine learning pandas numpy vite hyderabad"
+).split()
+
+
+def _question(rng):
+    return "what about your " + " ".join(rng.sample(WORDS, 3))
+
+
+def _percentiles(samples):
+    samples.sort()
+    return {
+        "p50_us": round(samples[len(samples) // 2] * 1e6, 1),
+        "p99_us": round(samples[int(len(samples) * 0.99) - 1] * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=256)
+    args = parser.parse_args()
+
+    setup_django()
+    from api.semantic_cache import SemanticCache, embed
+
+    rng = random.Random(0)
+    cache = SemanticCache(size=args.entries, dim=args.dim, threshold=0.8, ttl=3600)
+    for i in range(args.entries):
+        cache.add(_question(rng), {"reply": str(i)})
+
+    queries = [_question(rng) for _ in range(args.lookups)]
+    embed_times, lookup_times = [], []
+    for query in queries:
+        start = time.perf_counter()
+        embed(query, args.dim)
+        embed_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        cache.lookup(query)
+        lookup_times.append(time.perf_counter() - start)
+
+    print(json.dumps({
+        "entries": len(cache),
+        "dim": args.dim,
+        "matrix_mb": round(cache._matrix.nbytes / 2**20, 2),
+        "embed": _percentiles(embed_times),
+        "lookup_including_embed": _percentiles(lookup_times),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
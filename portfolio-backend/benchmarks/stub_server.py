@@ -0,0 +1,182 @@
+"""
+Local stub LLM provider.
+
+Speaks the OpenAI-compatible chat completions format (Groq, OpenRouter,
+Together), plus Hugging Face's ``/models/...`` and Cohere's ``/v1/chat``
+formats, chosen by request path. It can add latency, make a share of calls
+take ``slow_latency`` instead (a latency tail), and inject 500s and 429s (with
+``Retry-After``) at a given rate. With ``quota`` set it also enforces a request
+quota per ``quota_window`` seconds like the real providers: every reply
+carries ``x-ratelimit-remaining-requests`` / ``x-ratelimit-reset-requests``,
+and calls over the quota get a 429 with ``Retry-After``.
+
+Used by the benchmarks so we can measure our own overhead without touching the
+real providers or their quotas.
+"""
+import json
+import math
+import random
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # concurrent benchmarks open many connections at once
+
+    def __init__(self, address, handler, latency=0.0, error_rate=0.0, rate_limit_rate=0.0,
+                 slow_rate=0.0, slow_latency=0.0, quota=0, quota_window=1.0):
+        super().__init__(address, handler)
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.quota = int(quota)  # requests per window; 0 = unlimited
+        self.quota_window = quota_window
+        self.over_quota = 0
+        self._window_start = time.monotonic()
+        self._window_used = 0
+        self._counter_lock = threading.Lock()
+
+    def get_request(self):
+        conn = super().get_request()
+        with self._counter_lock:
+            self.connections += 1
+        return conn
+
+    def count_request(self):
+        with self._counter_lock:
+            self.requests += 1
+
+    def take_quota(self):
+        """``(allowed, rate-limit headers)`` for the next request; always allowed without a quota."""
+        if not self.quota:
+            return True, []
+        with self._counter_lock:
+            now = time.monotonic()
+            if now - self._window_start >= self.quota_window:
+                self._window_start, self._window_used = now, 0
+            reset = self.quota_window - (now - self._window_start)
+            allowed = self._window_used < self.quota
+            if allowed:
+                self._window_used += 1
+            else:
+                self.over_quota += 1
+            headers = [
+                ("x-ratelimit-remaining-requests", str(self.quota - self._window_used)),
+                ("x-ratelimit-reset-requests", f"{reset:.3f}s"),
+            ]
+        if not allowed:
+            headers.append(("Retry-After", str(max(1, math.ceil(reset)))))
+        return allowed, headers
+
+    def injected_failure(self):
+        """429, 500 or None for the next request, at the configured rates."""
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            status = 429
+        elif roll < self.rate_limit_rate + self.error_rate:
+            status = 500
+        else:
+            return None
+        with self._counter_lock:
+            if status == 429:
+                self.rate_limited += 1
+            else:
+                self.errors += 1
+        return status
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data, headers=()):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+    def _stream_reply(self, words, headers=()):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        for word in words:
+            event = {"choices": [{"delta": {"content": word}}]}
+            self._send_chunk(f"data: {json.dumps(event)}\n\n".encode())
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        payload = json.loads(self.rfile.read(length) or b"{}")
+        self.server.count_request()
+        allowed, quota_headers = self.server.take_quota()
+        if not allowed:
+            self._send_json(429, {"error": "quota exceeded"}, headers=quota_headers)
+            return
+        if self.server.slow_rate and random.random() < self.server.slow_rate:
+            time.sleep(self.server.slow_latency)
+        elif self.server.latency:
+            time.sleep(self.server.latency)
+        failure = self.server.injected_failure()
+        if failure == 429:
+            self._send_json(429, {"error": "rate limited"}, headers=[("Retry-After", "1")])
+            return
+        if failure:
+            self._send_json(500, {"error": "injected failure"})
+            return
+        if self.path.startswith("/models/"):  # Hugging Face Inference API
+            self._send_json(200, [{"generated_text": "stub reply"}], headers=quota_headers)
+            return
+        if self.path == "/v1/chat":  # Cohere
+            self._send_json(200, {"text": "stub reply"}, headers=quota_headers)
+            return
+        if payload.get("stream"):
+            self._stream_reply(["stub", " reply"], headers=quota_headers)
+            return
+        self._send_json(200, {
+            "choices": [{"message": {"role": "assistant", "content": "stub reply"}}],
+        }, headers=quota_headers)
+
+
+def start_stub_server(latency=0.0, certfile=None, keyfile=None, host="127.0.0.1", port=0,
+                      error_rate=0.0, rate_limit_rate=0.0, slow_rate=0.0, slow_latency=0.0, quota=0,
+                      quota_window=1.0):
+    """Start a stub in a daemon thread; returns ``(server, base_url)``."""
+    server = StubServer((host, port), StubHandler, latency=latency, error_rate=error_rate,
+                        rate_limit_rate=rate_limit_rate, slow_rate=slow_rate, slow_latency=slow_latency,
+                        quota=quota, quota_window=quota_window)
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"{scheme}://{host}:{server.server_address[1]}"
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'portfolio_project.settings')
+# Under ASGI, /api/chat/ is served by the async view (see CHAT_ASYNC in settings).
+os.environ.setdefault('CHAT_ASYNC', '1')
 
 application = get_asgi_application()
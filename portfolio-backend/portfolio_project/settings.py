@@ -43,12 +43,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.TimingMiddleware',  # after auth: cProfile capture is staff-only
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -80,6 +82,19 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Reuse connections across requests instead of reopening the file every time
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # WAL lets readers run alongside the single writer; IMMEDIATE takes the write
+            # lock up front so concurrent writers wait (timeout) instead of failing
+            'init_command': (
+                'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;'
+                if os.environ.get('SQLITE_WAL', '1') == '1' else ''
+            ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -134,3 +149,144 @@ CORS_ALLOWED_ORIGINS = [
     # Add other origins if your frontend is served from a different address
 ]
 
+
+# Upstream LLM HTTP client (api/clients.py)
+LLM_HTTP_POOL_CONNECTIONS = int(os.environ.get('LLM_HTTP_POOL_CONNECTIONS', 1))  # pools per host
+LLM_HTTP_POOL_MAXSIZE = int(os.environ.get('LLM_HTTP_POOL_MAXSIZE', 10))  # keep-alive sockets per host
+LLM_HTTP_CONNECT_TIMEOUT = float(os.environ.get('LLM_HTTP_CONNECT_TIMEOUT', 5))  # seconds
+LLM_HTTP_READ_TIMEOUT = float(os.environ.get('LLM_HTTP_READ_TIMEOUT', 30))  # seconds
+LLM_HTTP_WARMUP = os.environ.get('LLM_HTTP_WARMUP', '') == '1'  # pre-connect provider hosts at boot
+LLM_HTTP_ASYNC_MAX_CONNECTIONS = int(os.environ.get('LLM_HTTP_ASYNC_MAX_CONNECTIONS', 500))  # in-flight calls per host (ASGI)
+
+# Serve /api/chat/ from the async view. asgi.py turns this on; Vercel (WSGI) keeps the sync view.
+CHAT_ASYNC = os.environ.get('CHAT_ASYNC', '') == '1'
+
+# Provider circuit breakers (api/breaker.py)
+BREAKER_WINDOW = int(os.environ.get('BREAKER_WINDOW', 20))  # recent calls considered
+BREAKER_MIN_CALLS = int(os.environ.get('BREAKER_MIN_CALLS', 5))  # before the rate is trusted
+BREAKER_FAILURE_RATE = float(os.environ.get('BREAKER_FAILURE_RATE', 0.5))  # opens at or above this
+BREAKER_OPEN_SECONDS = float(os.environ.get('BREAKER_OPEN_SECONDS', 30))  # skip time before probing
+BREAKER_HALF_OPEN_PROBES = int(os.environ.get('BREAKER_HALF_OPEN_PROBES', 1))  # concurrent probe requests
+
+# Per-request time budget across the provider cascade (api/deadline.py)
+CHAT_DEADLINE_SECONDS = float(os.environ.get('CHAT_DEADLINE_SECONDS', 25))
+CHAT_MIN_ATTEMPT_SECONDS = float(os.environ.get('CHAT_MIN_ATTEMPT_SECONDS', 2))  # skip attempts with less left
+
+# Exact-match answer cache (api/answer_cache.py)
+ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE_ENABLED', '1') == '1'
+ANSWER_CACHE_SIZE = int(os.environ.get('ANSWER_CACHE_SIZE', 512))  # in-memory entries per process
+ANSWER_CACHE_MEMORY_TTL = int(os.environ.get('ANSWER_CACHE_MEMORY_TTL', 300))  # seconds
+ANSWER_CACHE_DB_TTL = int(os.environ.get('ANSWER_CACHE_DB_TTL', 7 * 24 * 3600))  # seconds
+ANSWER_CACHE_MAX_HISTORY = int(os.environ.get('ANSWER_CACHE_MAX_HISTORY', 0))  # earlier turns allowed
+ANSWER_CACHE_PURGE_SECONDS = int(os.environ.get('ANSWER_CACHE_PURGE_SECONDS', 3600))  # how often expired rows are deleted
+
+# Near-duplicate question tier of the answer cache (api/semantic_cache.py, needs NumPy)
+SEMANTIC_CACHE_ENABLED = os.environ.get('SEMANTIC_CACHE_ENABLED', '1') == '1'
+SEMANTIC_CACHE_SIZE = int(os.environ.get('SEMANTIC_CACHE_SIZE', 10000))  # questions kept per process (x DIM x 4 bytes)
+SEMANTIC_CACHE_DIM = int(os.environ.get('SEMANTIC_CACHE_DIM', 256))  # hashed feature dimensions
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get('SEMANTIC_CACHE_THRESHOLD', 0.8))  # min cosine similarity
+
+# Knowledge-base section retrieval for the system prompt (api/retrieval.py)
+KB_RETRIEVAL_ENABLED = os.environ.get('KB_RETRIEVAL_ENABLED', '1') == '1'
+KB_RETRIEVAL_TOP_K = int(os.environ.get('KB_RETRIEVAL_TOP_K', 4))  # sections/entries per question
+KB_ALWAYS_INCLUDE = os.environ.get('KB_ALWAYS_INCLUDE', 'Profile').split(',')  # section names, comma-separated
+
+# Conversation history sent to providers (api/history.py); sizes in estimated tokens
+HISTORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_TOKEN_BUDGET', 1500))  # recent turns kept verbatim
+HISTORY_SUMMARY_TOKENS = int(os.environ.get('HISTORY_SUMMARY_TOKENS', 300))  # summary of older turns
+HISTORY_PROVIDER_TOKEN_BUDGETS = {  # smaller budgets for small-context providers, "Name=tokens,..."
+    name.strip(): int(tokens)
+    for name, tokens in (
+        item.split('=') for item in os.environ.get('HISTORY_PROVIDER_TOKEN_BUDGETS', 'Hugging Face=600').split(',')
+        if '=' in item
+    )
+}
+
+# Per-client rate limit on the chat endpoints (api/ratelimit.py)
+RATE_LIMIT_MAX_REQUESTS = int(os.environ.get('RATE_LIMIT_MAX_REQUESTS', 20))  # per window
+RATE_LIMIT_WINDOW = int(os.environ.get('RATE_LIMIT_WINDOW', 60))  # seconds
+RATE_LIMIT_ALGORITHM = os.environ.get('RATE_LIMIT_ALGORITHM', 'sliding_window')  # or 'token_bucket'
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # 'memory', 'cache' or 'database'
+RATE_LIMIT_MAX_KEYS = int(os.environ.get('RATE_LIMIT_MAX_KEYS', 50000))  # clients tracked per process (memory)
+RATE_LIMIT_CACHE_ALIAS = os.environ.get('RATE_LIMIT_CACHE_ALIAS', 'default')  # CACHES entry (cache backend)
+
+# Page-view counter (api/view_counter.py): views are buffered and written in batches
+VIEW_COUNTER_FLUSH_SIZE = int(os.environ.get('VIEW_COUNTER_FLUSH_SIZE', 50))  # pending views that force a write
+VIEW_COUNTER_FLUSH_SECONDS = float(os.environ.get('VIEW_COUNTER_FLUSH_SECONDS', 5))  # max delay of a pending view
+VIEW_COUNTER_CLIENT_WINDOW = int(os.environ.get('VIEW_COUNTER_CLIENT_WINDOW', 1800))  # seconds; one view per client
+VIEW_COUNTER_MAX_CLIENTS = int(os.environ.get('VIEW_COUNTER_MAX_CLIENTS', 10000))  # clients remembered per process
+
+# Prometheus metrics at /api/metrics (api/metrics.py)
+METRICS_DIR = os.environ.get('METRICS_DIR', '')  # shared dir for multi-worker totals; '' = this process only
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 15))  # how often workers write their totals
+
+# Per-phase timing (api/timing.py)
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', '1') == '1'  # Server-Timing header on /api/ responses
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 0))  # share of requests logged to 'api.trace', 0-1
+PROFILE_DIR = os.environ.get('PROFILE_DIR', '')  # where X-Profile captures go; '' = <tmp>/api-profiles
+
+# Provider API base URLs (api/providers.py); '' = the provider's public API.
+# Point them at a proxy, or at the stubs of benchmarks/bench_load.py.
+GROQ_BASE_URL = os.environ.get('GROQ_BASE_URL', '')  # e.g. https://api.groq.com/openai/v1
+OPENROUTER_BASE_URL = os.environ.get('OPENROUTER_BASE_URL', '')  # e.g. https://openrouter.ai/api/v1
+TOGETHER_BASE_URL = os.environ.get('TOGETHER_BASE_URL', '')  # e.g. https://api.together.xyz/v1
+HUGGINGFACE_BASE_URL = os.environ.get('HUGGINGFACE_BASE_URL', '')  # e.g. https://api-inference.huggingface.co
+COHERE_BASE_URL = os.environ.get('COHERE_BASE_URL', '')  # e.g. https://api.cohere.ai
+
+# Pre-warmed answers (python manage.py warm_answers); pinned in the answer cache until the KB changes
+WARM_ANSWER_QUESTIONS = [  # "|"-separated in the environment
+    question.strip() for question in os.environ.get('WARM_ANSWER_QUESTIONS', '|'.join([
+        "Tell me about yourself",
+        "What is your work experience?",
+    ])).split('|') if question.strip()
+]
+WARM_ANSWERS_CONCURRENCY = int(os.environ.get('WARM_ANSWERS_CONCURRENCY', 2))  # questions generated at once
+WARM_ANSWERS_PER_MINUTE = float(os.environ.get('WARM_ANSWERS_PER_MINUTE', 20))  # questions started per minute
+
+# Skills/projects questions answered from the knowledge base without a provider (api/fast_path.py)
+FAST_PATH_ENABLED = os.environ.get('FAST_PATH_ENABLED', '1') == '1'
+
+# Intent router (api/router.py): model tier and reply length per kind of question
+ROUTER_ENABLED = os.environ.get('ROUTER_ENABLED', '1') == '1'
+ROUTER_SMALL_MODEL = os.environ.get('ROUTER_SMALL_MODEL', 'llama-3.1-8b-instant')  # Groq model of the small tier
+ROUTER_MAX_WORDS = int(os.environ.get('ROUTER_MAX_WORDS', 12))  # longer questions always go to the large tier
+ROUTER_MAX_TOKENS = {  # reply limit per intent, "intent=tokens,..."
+    intent.strip(): int(tokens)
+    for intent, tokens in (
+        item.split('=') for item in os.environ.get('ROUTER_MAX_TOKENS', 'greeting=150,factual=400,open=2048').split(',')
+        if '=' in item
+    )
+}
+
+# Identical chats in flight at the same time share one provider cascade (api/singleflight.py)
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', '1') == '1'
+
+# Server-side conversation sessions (api/sessions.py)
+CHAT_SESSION_TTL = int(os.environ.get('CHAT_SESSION_TTL', 24 * 3600))  # seconds after the last question
+CHAT_SESSION_MEMORY_SIZE = int(os.environ.get('CHAT_SESSION_MEMORY_SIZE', 5000))  # sessions kept in memory per process
+CHAT_SESSION_MAX_TURNS = int(os.environ.get('CHAT_SESSION_MAX_TURNS', 50))  # turns stored per session
+CHAT_SESSION_PURGE_SECONDS = int(os.environ.get('CHAT_SESSION_PURGE_SECONDS', 3600))  # how often expired rows are deleted
+
+# Adaptive provider order (api/ranking.py): try providers by expected time to success
+PROVIDER_RANKING_ENABLED = os.environ.get('PROVIDER_RANKING_ENABLED', '1') == '1'
+PROVIDER_RANKING_ALPHA = float(os.environ.get('PROVIDER_RANKING_ALPHA', 0.2))  # weight of the newest attempt
+PROVIDER_RANKING_PRIOR_SECONDS = float(os.environ.get('PROVIDER_RANKING_PRIOR_SECONDS', 3))  # score with no samples
+PROVIDER_RANKING_EXPLORE_RATE = float(os.environ.get('PROVIDER_RANKING_EXPLORE_RATE', 0.05))  # share of chats
+PROVIDER_RANKING_EXPLORE_AFTER = int(os.environ.get('PROVIDER_RANKING_EXPLORE_AFTER', 60))  # seconds since last sample
+
+# Hedged provider calls (api/hedging.py): race a slow call against the next provider
+HEDGING_ENABLED = os.environ.get('HEDGING_ENABLED', '0') == '1'
+HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', 95))  # of recent successful call times
+HEDGE_DELAY_SECONDS = float(os.environ.get('HEDGE_DELAY_SECONDS', 5))  # until HEDGE_MIN_SAMPLES are seen
+HEDGE_MIN_SAMPLES = int(os.environ.get('HEDGE_MIN_SAMPLES', 20))
+HEDGE_WINDOW = int(os.environ.get('HEDGE_WINDOW', 200))  # call times kept per provider
+HEDGE_BUDGET_RATIO = float(os.environ.get('HEDGE_BUDGET_RATIO', 0.1))  # hedges earned per provider call
+HEDGE_BUDGET_BURST = float(os.environ.get('HEDGE_BUDGET_BURST', 5))
+HEDGE_MAX_THREADS = int(os.environ.get('HEDGE_MAX_THREADS', 32))  # sync views: calls running per process (> 2x the server's request threads)
+
+# Provider rate limits (api/quota.py): honor 429/Retry-After and skip providers whose quota is spent
+QUOTA_ENABLED = os.environ.get('QUOTA_ENABLED', '1') == '1'
+QUOTA_RESERVE_REQUESTS = int(os.environ.get('QUOTA_RESERVE_REQUESTS', 1))  # requests left to other workers
+QUOTA_REPLY_TOKENS = int(os.environ.get('QUOTA_REPLY_TOKENS', 500))  # reply estimate when the route sets no limit
+QUOTA_DEFAULT_RETRY_AFTER = float(os.environ.get('QUOTA_DEFAULT_RETRY_AFTER', 10))  # seconds, 429 without Retry-After
+QUOTA_DEFAULT_WINDOW = float(os.environ.get('QUOTA_DEFAULT_WINDOW', 60))  # seconds, remaining count without a reset
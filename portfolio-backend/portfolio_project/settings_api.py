@@ -0,0 +1,34 @@
+"""
+API-only settings: the chat backend without the admin site.
+
+Vercel starts a new Python process on every cold start, and the full profile
+sets up admin, auth, contenttypes, sessions, messages and staticfiles, and
+runs their middleware, before the first visitor gets a reply. Nothing under
+/api/ uses them. This profile keeps only the ``api`` app, CORS and the
+middleware the API needs; the admin site (and ``X-Profile`` captures, which
+need an admin login) stay with ``portfolio_project.settings``.
+
+    DJANGO_SETTINGS_MODULE=portfolio_project.settings_api
+
+``python -m benchmarks.bench_import_time`` compares the two profiles.
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'corsheaders',
+    'api',
+]
+
+MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'api.middleware.TimingMiddleware',
+]
+
+ROOT_URLCONF = 'portfolio_project.urls_api'
+
+TEMPLATES = []
+
+WSGI_APPLICATION = 'portfolio_project.wsgi_api.app'
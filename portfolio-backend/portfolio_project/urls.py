@@ -17,10 +17,8 @@ Including another URLconf
 # portfolio_project/urls.py
 from django.contrib import admin
 from django.urls import path, include
-from django.http import HttpResponse   # ✅ Make sure this import is there
 
-def home(request):
-    return HttpResponse("Backend is working on Vercel!")   
+from .urls_api import home
 
 urlpatterns = [
     path('admin/', admin.site.urls),
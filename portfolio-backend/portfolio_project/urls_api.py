@@ -0,0 +1,15 @@
+"""
+URL configuration of the API-only profile (``portfolio_project.settings_api``): no admin site.
+"""
+from django.http import HttpResponse
+from django.urls import include, path
+
+
+def home(request):
+    return HttpResponse("Backend is working on Vercel!")
+
+
+urlpatterns = [
+    path('api/', include('api.urls')),
+    path("", home),
+]
@@ -0,0 +1,14 @@
+"""
+WSGI entry point of the API-only profile (``portfolio_project.settings_api``).
+
+This is the function Vercel deploys; ``wsgi.py`` serves the full profile
+with the admin site.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'portfolio_project.settings_api')
+
+app = get_wsgi_application()
@@ -6,6 +6,7 @@ import contactData from './data/contact.js';
 let conversationCount = 0;
 let typewriterTimeoutId = null;
 let conversationHistory = [];
+let sessionId = null; // the server keeps the turns once it has handed out an id
 let isLoading = false;
 
 // DOM Elements
@@ -158,11 +159,6 @@ function typewriterEffect(text, container) {
 
 // === DISPLAY FUNCTIONS ===
 
-function displayAboutMe(text, bubble) {
-    bubble.innerHTML = '';
-    typewriterEffect(text, bubble);
-}
-
 function displayContactInfo(bubble) {
     bubble.innerHTML = `
         <p class="mb-3">I'd love to connect! You can reach me through any of the platforms below. I'm actively looking for new opportunities and typically respond within 24 hours.</p>
@@ -272,6 +268,40 @@ function displayProjects(projectData, bubble) {
     scrollToBottom();
 }
 
+// === STREAMED REPLIES (Server-Sent Events) ===
+
+// Reads the chat/stream/ event stream, calling onToken with the reply so far. Resolves with the full reply.
+async function readReplyStream(response, onToken) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let reply = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            const event = (block.match(/^event: (.*)$/m) || [])[1];
+            const data = JSON.parse((block.match(/^data: (.*)$/m) || [])[1] || '{}');
+
+            if (event === 'token') {
+                reply += data.text;
+                onToken(reply);
+            } else if (event === 'done') {
+                if (data.session_id) sessionId = data.session_id;
+            } else if (event === 'error') {
+                throw new Error(data.error);
+            }
+        }
+    }
+    return reply;
+}
+
 // === MAIN QUERY HANDLER ===
 
 async function handleQuery(question) {
@@ -300,28 +330,41 @@ async function handleQuery(question) {
     showThinking(aiBubble);
 
     try {
-        const apiUrl = 'https://ai-portfolio-fullstack.vercel.app/api/chat/';
+        const apiUrl = 'https://ai-portfolio-fullstack.vercel.app/api/chat/stream/';
 
-        const response = await fetch(apiUrl, {
+        const send = () => fetch(apiUrl, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
                 question: trimmedQuestion,
-                history: conversationHistory
+                session_id: sessionId,
+                // Only needed until the server has a session
+                history: sessionId ? [] : conversationHistory
             })
         });
 
+        let response = await send();
+        if (response.status === 409) {
+            // The server lost our session (expired, or another instance): start a new one from the full history
+            sessionId = null;
+            response = await send();
+        }
+
         if (!response.ok) {
             const errorBody = await response.json().catch(() => ({ error: 'Could not parse error response.' }));
             throw new Error(errorBody.error || response.statusText);
         }
 
-        const result = await response.json();
+        // Plain answers render as tokens arrive; structured ones (cards, contact) wait for the full reply
+        const rendersAsText = !needsWide && !lowerCaseQuestion.includes('contact');
+        const responseText = await readReplyStream(response, (textSoFar) => {
+            if (!rendersAsText) return;
+            aiBubble.innerHTML = markdownToHtml(textSoFar);
+            scrollToBottom();
+        });
         aiBubble.innerHTML = '';
 
-        if (result.reply) {
-            const responseText = result.reply;
-
+        if (responseText) {
             conversationHistory.push({ role: 'user', content: trimmedQuestion });
             conversationHistory.push({ role: 'assistant', content: responseText });
 
@@ -333,8 +376,9 @@ async function handleQuery(question) {
             } else if (responseText.includes('::') && (lowerCaseQuestion.includes('skill') || lowerCaseQuestion.includes('tech'))) {
                 aiBubble.classList.add('wide');
                 displaySkills(responseText, aiBubble);
-            } else if (lowerCaseQuestion.includes('about yourself') || lowerCaseQuestion.includes('who are you')) {
-                displayAboutMe(responseText, aiBubble);
+            } else if (rendersAsText) {
+                aiBubble.innerHTML = markdownToHtml(responseText);
+                scrollToBottom();
             } else {
                 typewriterEffect(responseText, aiBubble);
             }
@@ -350,7 +394,7 @@ async function handleQuery(question) {
                 }, 3000);
             }
         } else {
-            aiBubble.textContent = result.error || "I'm sorry, an unknown error occurred.";
+            aiBubble.textContent = "I'm sorry, an unknown error occurred.";
         }
     } catch (err) {
         console.error('Error:', err);
@@ -426,6 +470,9 @@ function closeModal() {
 // === INIT ON DOM READY ===
 
 document.addEventListener('DOMContentLoaded', () => {
+    // Count the page view; the backend batches these, and a failure doesn't matter
+    fetch('https://ai-portfolio-fullstack.vercel.app/api/views/', { method: 'POST', keepalive: true }).catch(() => {});
+
     // Home button
     const homeAvatarButton = document.getElementById('home-avatar-button');
     if (homeAvatarButton) {